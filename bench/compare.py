@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of openmediavault.
+#
+# @license   https://www.gnu.org/licenses/gpl.html GPL Version 3
+# @author    Volker Theile <volker.theile@openmediavault.org>
+# @copyright Copyright (c) 2025 Volker Theile
+#
+# openmediavault is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# openmediavault is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with openmediavault. If not, see <https://www.gnu.org/licenses/>.
+"""
+Compare two result files of `loadgen.py`, e.g. of two commits.
+
+Usage:
+    python3 bench/compare.py bench/results/old.json bench/results/new.json
+
+The exit code is 1 if the p95 latency or the throughput of any operation
+got worse by more than the given threshold.
+"""
+
+import argparse
+import json
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+# The metrics to compare and whether a higher value is better.
+METRICS: List[Tuple[str, bool]] = [
+    ("throughput", True),
+    ("p50_ms", False),
+    ("p95_ms", False),
+    ("p99_ms", False),
+]
+GATED = ("throughput", "p95_ms")
+
+
+def change(old: float, new: float) -> Optional[float]:
+    if not old:
+        return None
+    return (new - old) / old * 100
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any], threshold: float) -> List[str]:
+    regressions = []
+    for transport, new_run in new["runs"].items():
+        old_run = old["runs"].get(transport)
+        if old_run is None:
+            continue
+        print(f"\n== {transport} ==")
+        print(f"{'operation':<28}" + "".join(f" {name:>22}" for name, _ in METRICS))
+        rows = [(name, s) for name, s in new_run["operations"].items()]
+        rows.append(("TOTAL", new_run["total"]))
+        for name, new_stats in rows:
+            old_stats = (
+                old_run["total"] if name == "TOTAL" else old_run["operations"].get(name)
+            )
+            if old_stats is None:
+                continue
+            line = f"{name:<28}"
+            for metric, higher_is_better in METRICS:
+                a, b = old_stats[metric], new_stats[metric]
+                delta = change(a, b)
+                if delta is None:
+                    line += f" {a:>9.1f} -> {b:>9.1f}  "
+                    continue
+                worse = -delta if higher_is_better else delta
+                marker = "!" if worse > threshold else " "
+                line += f" {b:>10.1f} ({delta:>+6.1f}%){marker}"
+                if metric in GATED and worse > threshold:
+                    regressions.append(f"{transport}/{name}: {metric} {delta:+.1f}%")
+            print(line)
+        old_rss, new_rss = (
+            old_run.get("server_peak_rss"),
+            new_run.get("server_peak_rss"),
+        )
+        if old_rss and new_rss:
+            print(
+                f"server peak RSS: {old_rss / 1024**2:.1f} MiB -> "
+                f"{new_rss / 1024**2:.1f} MiB ({change(old_rss, new_rss):+.1f}%)"
+            )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=10.0,
+        help="the regression threshold in percent",
+    )
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    print(f"old: {old['git']['commit'][:10]} {old['git']['subject']}")
+    print(f"new: {new['git']['commit'][:10]} {new['git']['subject']}")
+
+    regressions = compare(old, new, args.threshold)
+    if regressions:
+        print("\nRegressions:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,738 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of openmediavault.
+#
+# @license   https://www.gnu.org/licenses/gpl.html GPL Version 3
+# @author    Volker Theile <volker.theile@openmediavault.org>
+# @copyright Copyright (c) 2025 Volker Theile
+#
+# openmediavault is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# openmediavault is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with openmediavault. If not, see <https://www.gnu.org/licenses/>.
+"""
+A local stand-in for the openmediavault rpc.php, which is used to
+benchmark the MCP server without a real NAS. It implements the RPCs
+that are used by the MCP server with synthetic data. The latency,
+jitter, error rate and the size of the lists are configurable.
+
+Like PHP, requests that share a session are processed one after the
+other.
+
+Usage:
+    python3 bench/fake_rpc.py --port 8600 --latency 0.05 --users 10000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import string
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+SESSION_COOKIE = "X-OPENMEDIAVAULT-SESSIONID"
+E_SESSION_NOT_AUTHENTICATED = 5001
+
+
+class RPCError(Exception):
+    def __init__(self, message: str, code: int = 0, status: int = 500):
+        super().__init__(message)
+        self.code = code
+        self.status = status
+
+
+def _device_name(index: int) -> str:
+    letters = string.ascii_lowercase
+    name = ""
+    index += 1
+    while index > 0:
+        index, rest = divmod(index - 1, 26)
+        name = letters[rest] + name
+    return f"/dev/sd{name}"
+
+
+def apply_filter(records: List[Dict[str, Any]], params: Dict[str, Any]) -> Dict:
+    """
+    Sort and page the records like openmediavault does for all the
+    `getList` RPCs.
+    """
+    params = params or {}
+    sortfield = params.get("sortfield")
+    if sortfield:
+        records = sorted(
+            records,
+            key=lambda record: str(record.get(sortfield, "")),
+            reverse=params.get("sortdir", "ASC").upper() == "DESC",
+        )
+    start = int(params.get("start", 0) or 0)
+    limit = int(params.get("limit", -1) if params.get("limit") is not None else -1)
+    data = records[start:] if limit < 0 else records[start : start + limit]
+    return {"total": len(records), "data": data}
+
+
+class Database:
+    def __init__(
+        self,
+        users: int,
+        groups: int,
+        disks: int,
+        filesystems: int,
+        shares: int,
+        seed: int,
+    ):
+        rnd = random.Random(seed)
+        models = [
+            ("ST4000VN008-2DR166", "Seagate"),
+            ("WDC WD40EFRX-68N32N0", "Western Digital"),
+            ("Samsung SSD 870 EVO 1TB", "Samsung"),
+            ("TOSHIBA MG08ACA16TE", "Toshiba"),
+        ]
+        self.disks: List[Dict[str, Any]] = []
+        self.smart: List[Dict[str, Any]] = []
+        for i in range(disks):
+            model, vendor = rnd.choice(models)
+            devicefile = _device_name(i)
+            serial = "".join(rnd.choices(string.ascii_uppercase + string.digits, k=8))
+            wwn = f"0x5000c500{rnd.getrandbits(32):08x}"
+            size = str(rnd.choice([1, 4, 8, 16]) * 1000**4)
+            self.disks.append(
+                {
+                    "devicename": devicefile[5:],
+                    "devicefile": devicefile,
+                    "devicelinks": [f"/dev/disk/by-id/ata-{model}_{serial}"],
+                    "canonicaldevicefile": devicefile,
+                    "model": model,
+                    "size": size,
+                    "description": f"{model} [{devicefile}, {size}]",
+                    "vendor": vendor,
+                    "serialnumber": serial,
+                    "wwn": wwn,
+                    "israid": False,
+                    "isroot": i == 0,
+                    "isreadonly": False,
+                    "isrotational": "SSD" not in model,
+                    "hotpluggable": False,
+                }
+            )
+            self.smart.append(
+                {
+                    "devicename": devicefile[5:],
+                    "devicefile": devicefile,
+                    "devicelinks": [],
+                    "model": model,
+                    "size": size,
+                    "temperature": rnd.randint(25, 45),
+                    "description": f"{model} [{devicefile}, {size}]",
+                    "vendor": vendor,
+                    "serialnumber": serial,
+                    "wwn": wwn,
+                    "overallstatus": rnd.choices(
+                        ["GOOD", "BAD_ATTRIBUTE_IN_THE_PAST", "BAD_SECTOR"],
+                        [90, 7, 3],
+                    )[0],
+                    "monitor": True,
+                }
+            )
+        self.filesystems: List[Dict[str, Any]] = []
+        for i in range(filesystems):
+            fsuuid = str(uuid.UUID(int=rnd.getrandbits(128)))
+            size = rnd.choice([1, 4, 8, 16]) * 1000**4
+            used = rnd.randint(0, size)
+            self.filesystems.append(
+                {
+                    "devicefile": f"{_device_name(i % max(disks, 1))}1",
+                    "parentdevicefile": _device_name(i % max(disks, 1)),
+                    "uuid": fsuuid,
+                    "label": f"data{i}",
+                    "type": rnd.choice(["ext4", "xfs", "btrfs"]),
+                    "blocks": str(size // 1024),
+                    "mounted": True,
+                    "mountpoint": f"/srv/dev-disk-by-uuid-{fsuuid}",
+                    "used": str(used),
+                    "available": str(size - used),
+                    "size": str(size),
+                    "percentage": round(used * 100 / size),
+                    "description": f"data{i} [{size}]",
+                    "propreadonly": False,
+                    "propfstab": True,
+                }
+            )
+        self.groups: Dict[str, Dict[str, Any]] = {}
+        for i in range(groups):
+            name = f"group{i:04d}"
+            self.groups[name] = {
+                "name": name,
+                "gid": 2000 + i,
+                "members": [],
+                "comment": "",
+                "system": False,
+            }
+        self.users: Dict[str, Dict[str, Any]] = {}
+        group_names = list(self.groups.keys())
+        for i in range(users):
+            name = f"user{i:05d}"
+            groups_of_user = ["users"] + rnd.sample(
+                group_names, k=min(len(group_names), rnd.randint(0, 3))
+            )
+            for group in groups_of_user[1:]:
+                self.groups[group]["members"].append(name)
+            self.users[name] = {
+                "name": name,
+                "uid": 1000 + i,
+                "gid": 100,
+                "comment": f"User {i}",
+                "dir": f"/home/{name}",
+                "shell": "/bin/bash",
+                "lastchanged": "19000",
+                "minimum": "0",
+                "maximum": "99999",
+                "warn": "7",
+                "inactive": "",
+                "expire": "",
+                "reserved": "",
+                "email": f"{name}@example.com",
+                "disallowusermod": False,
+                "sshpubkeys": [],
+                "groups": groups_of_user,
+                "system": False,
+            }
+        self.shares: List[Dict[str, Any]] = []
+        for i in range(shares):
+            fs = self.filesystems[i % len(self.filesystems)] if filesystems else {}
+            # Like openmediavault, a share references the mount point
+            # configuration object of its filesystem, which has its own
+            # UUID, and contains it as `mntent`.
+            mntent = {
+                "uuid": str(uuid.uuid5(uuid.NAMESPACE_URL, fs.get("mountpoint", ""))),
+                "fsname": f"/dev/disk/by-uuid/{fs.get('uuid', '')}",
+                "dir": fs.get("mountpoint", ""),
+                "type": fs.get("type", ""),
+                "opts": "defaults,nofail",
+                "freq": 0,
+                "passno": 2,
+                "hidden": False,
+                "usagewarnthreshold": 85,
+                "comment": "",
+            }
+            self.shares.append(
+                {
+                    "uuid": str(uuid.UUID(int=rnd.getrandbits(128))),
+                    "name": f"share{i:03d}",
+                    "mntentref": mntent["uuid"],
+                    "reldirpath": f"share{i:03d}/",
+                    "comment": "",
+                    "privileges": {"privilege": []},
+                    "mntent": mntent,
+                    "device": fs.get("devicefile", ""),
+                    "_used": False,
+                }
+            )
+        self.boot = time.time()
+
+
+class BackgroundProcess:
+    """
+    A background process like the ones openmediavault starts for long
+    operations. Its output appears line by line, a process that fails
+    reports its error when the output is read after it finished.
+    """
+
+    def __init__(self, lines: List[str], interval: float, error: Optional[str] = None):
+        self.lines = lines
+        self.interval = interval
+        self.error = error
+        self.started = time.monotonic()
+        self.stopped: Optional[float] = None
+
+    def output(self) -> Tuple[str, bool]:
+        now = self.stopped or time.monotonic()
+        count = len(self.lines)
+        if self.interval > 0:
+            count = min(int((now - self.started) / self.interval), count)
+        running = self.stopped is None and count < len(self.lines)
+        return "".join(self.lines[:count]), running
+
+
+class FakeRPC:
+    def __init__(
+        self,
+        database: Database,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        session_lock: bool = True,
+        seed: Optional[int] = None,
+        fill_rate: float = 0.0,
+        standby: float = 0.0,
+        time_scale: float = 1.0,
+        job_interval: float = 0.2,
+    ):
+        self.db = database
+        # The seconds between two output lines of a background process.
+        self.job_interval = job_interval
+        self.processes: Dict[str, BackgroundProcess] = {}
+        self.fill_rate = fill_rate
+        self.time_scale = time_scale
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.session_lock = session_lock
+        self.sessions: Dict[str, asyncio.Lock] = {}
+        self.random = random.Random(seed)
+        self.calls = 0
+        # The number of executed RPCs per method, see `Debug.getCalls`.
+        self.counts: Dict[str, int] = {}
+        # The disks in standby, they are woken up by reading their SMART
+        # attributes or information.
+        rnd = random.Random(seed)
+        self.standby = {
+            device["devicefile"] for device in self.db.smart if rnd.random() < standby
+        }
+        self.wakeups = 0
+        self.attributes = {
+            device["devicefile"]: self._initial_attributes(rnd, device)
+            for device in self.db.smart
+        }
+        self.methods: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+            "System.getInformation": self.get_information,
+            "System.reboot": lambda params: None,
+            "System.shutdown": lambda params: None,
+            "System.standby": lambda params: None,
+            "DiskMgmt.getList": lambda params: apply_filter(self.db.disks, params),
+            "FileSystemMgmt.getList": lambda params: apply_filter(
+                self.get_filesystems(), params
+            ),
+            "Smart.getList": lambda params: apply_filter(self.get_smart_list(), params),
+            "Smart.getInformation": self.get_smart_information,
+            "Smart.getAttributes": self.get_smart_attributes,
+            "ShareMgmt.getList": lambda params: apply_filter(self.db.shares, params),
+            "UserMgmt.getUserList": lambda params: apply_filter(
+                list(self.db.users.values()), params
+            ),
+            "UserMgmt.getUser": lambda params: self._get(self.db.users, params),
+            "UserMgmt.deleteUser": lambda params: self._delete(self.db.users, params),
+            "UserMgmt.getGroupList": lambda params: apply_filter(
+                list(self.db.groups.values()), params
+            ),
+            "UserMgmt.getGroup": lambda params: self._get(self.db.groups, params),
+            "UserMgmt.setGroup": self.set_group,
+            "UserMgmt.deleteGroup": lambda params: self._delete(self.db.groups, params),
+            "Apt.update": self.apt_update,
+            "Apt.upgrade": self.apt_upgrade,
+            "Smart.executeTest": self.execute_smart_test,
+            "FileSystemMgmt.create": self.create_filesystem,
+            "Exec.getOutput": self.get_output,
+            "Exec.isRunning": lambda params: self._process(params).output()[1],
+            "Exec.stop": self.stop_process,
+            "Debug.getWakeups": lambda params: {
+                "wakeups": self.wakeups,
+                "standby": sorted(self.standby),
+            },
+            "Debug.getCalls": lambda params: {
+                "calls": self.calls,
+                "methods": dict(self.counts),
+            },
+        }
+
+    @staticmethod
+    def _get(objects: Dict[str, Any], params: Dict[str, Any]) -> Any:
+        name = params.get("name")
+        if name not in objects:
+            raise RPCError(f"The object '{name}' does not exist.")
+        return objects[name]
+
+    @staticmethod
+    def _delete(objects: Dict[str, Any], params: Dict[str, Any]) -> Any:
+        name = params.get("name")
+        if name not in objects:
+            raise RPCError(f"The object '{name}' does not exist.")
+        return objects.pop(name)
+
+    def get_information(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "ts": int(now),
+            "time": time.strftime("%c", time.localtime(now)),
+            "hostname": "omv.local",
+            "version": "8.0.0-1 (Synchrony)",
+            "cpuModelName": "Intel(R) Xeon(R) CPU E3-1230 v6 @ 3.50GHz",
+            "cpuCores": 8,
+            "cpuUtilization": round(self.random.uniform(0, 100), 1),
+            "memTotal": 32 * 1024**3,
+            "memUsed": self.random.randint(4, 28) * 1024**3,
+            "memAvailable": 8 * 1024**3,
+            "loadAverage": {
+                "1min": round(self.random.uniform(0, 4), 2),
+                "5min": round(self.random.uniform(0, 4), 2),
+                "15min": round(self.random.uniform(0, 4), 2),
+            },
+            "uptime": now - self.db.boot,
+            "kernel": "Linux 6.12.0-amd64",
+            "rebootRequired": False,
+            "availablePkgUpdates": 0,
+            "configDirty": False,
+            "dockerVersion": "",
+        }
+
+    def get_filesystems(self) -> List[Dict[str, Any]]:
+        if self.fill_rate <= 0:
+            return self.db.filesystems
+        # The n-th filesystem grows n times as fast as the first one.
+        elapsed = time.time() - self.db.boot
+        result = []
+        for i, fs in enumerate(self.db.filesystems, 1):
+            size = int(fs["size"])
+            used = min(int(fs["used"]) + int(self.fill_rate * i * elapsed), size)
+            result.append(
+                fs
+                | {
+                    "used": str(used),
+                    "available": str(size - used),
+                    "percentage": round(used * 100 / size),
+                }
+            )
+        return result
+
+    @staticmethod
+    def _initial_attributes(
+        rnd: random.Random, device: Dict[str, Any]
+    ) -> Dict[str, float]:
+        # Disks with a bad SMART status have defects that keep growing.
+        bad = device["overallstatus"] != "GOOD"
+        return {
+            "reallocated": rnd.randint(1, 50) if bad else 0,
+            "reallocated_rate": rnd.uniform(0.5, 5) if bad else 0,
+            "pending": rnd.randint(0, 8) if bad else 0,
+            "crc": rnd.choice([0, 0, 0, 0, 3]),
+            "hours": rnd.randint(100, 40000),
+        }
+
+    def _wake(self, devicefile: str) -> None:
+        if devicefile in self.standby:
+            self.standby.discard(devicefile)
+            self.wakeups += 1
+
+    def get_smart_list(self) -> List[Dict[str, Any]]:
+        # smartctl does not read the temperature of disks in standby.
+        return [
+            device | {"temperature": ""}
+            if device["devicefile"] in self.standby
+            else device
+            for device in self.db.smart
+        ]
+
+    def get_smart_attributes(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        devicefile = params.get("devicefile")
+        device = next((d for d in self.db.smart if d["devicefile"] == devicefile), None)
+        if device is None:
+            raise RPCError(f"Device '{devicefile}' not found.")
+        self._wake(devicefile)
+        state = self.attributes[devicefile]
+        hours = (time.time() - self.db.boot) * self.time_scale / 3600
+        raw = {
+            5: (
+                "Reallocated_Sector_Ct",
+                state["reallocated"] + int(state["reallocated_rate"] * hours),
+            ),
+            9: ("Power_On_Hours", int(state["hours"] + hours)),
+            194: (
+                "Temperature_Celsius",
+                f"{device['temperature']} (Min/Max 20/{device['temperature'] + 5})",
+            ),
+            197: ("Current_Pending_Sector", state["pending"]),
+            198: ("Offline_Uncorrectable", 0),
+            199: ("UDMA_CRC_Error_Count", state["crc"]),
+        }
+        return [
+            {
+                "id": id,
+                "attrname": name,
+                "flag": "0x0032",
+                "value": 100,
+                "worst": 100,
+                "threshold": 0,
+                "whenfailed": "-",
+                "rawvalue": str(value),
+                "prefailure": id == 5,
+                "assessment": "good",
+            }
+            for id, (name, value) in raw.items()
+        ]
+
+    def get_smart_information(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        devicefile = params.get("devicefile")
+        self._wake(devicefile)
+        for device in self.db.smart:
+            if device["devicefile"] == devicefile:
+                return device | {
+                    "devicemodel": device["model"],
+                    "firmwareversion": "SC60",
+                    "usercapacity": device["size"],
+                    "sectorsizes": "512 bytes logical, 4096 bytes physical",
+                    "rotationrate": "5900 rpm",
+                    "smartsupportavailable": True,
+                    "smartsupportenabled": True,
+                }
+        raise RPCError(f"Device '{devicefile}' not found.")
+
+    def _start(self, lines: List[str], error: Optional[str] = None) -> str:
+        filename = f"/tmp/bgstatus{uuid.uuid4().hex[:8]}"
+        self.processes[filename] = BackgroundProcess(
+            [f"{line}\n" for line in lines], self.job_interval, error
+        )
+        return filename
+
+    def _process(self, params: Dict[str, Any]) -> BackgroundProcess:
+        process = self.processes.get(params.get("filename"))
+        if process is None:
+            raise RPCError(
+                f"The background process '{params.get('filename')}' does not exist."
+            )
+        return process
+
+    def apt_update(self, params: Dict[str, Any]) -> str:
+        lines = [
+            f"Get:{i} http://deb.debian.org/debian trixie/main amd64 Packages [{i * 731} kB]"
+            for i in range(1, 11)
+        ]
+        return self._start([*lines, "Reading package lists... Done"])
+
+    def apt_upgrade(self, params: Dict[str, Any]) -> str:
+        packages = params.get("packages") or []
+        lines = [f"Unpacking {name} ..." for name in packages]
+        lines += [f"Setting up {name} ..." for name in packages]
+        return self._start(lines or ["0 upgraded, 0 newly installed."])
+
+    def execute_smart_test(self, params: Dict[str, Any]) -> None:
+        # Like openmediavault, smartctl is run synchronously, the test
+        # itself runs on the drive.
+        devicefile = params.get("devicefile")
+        if not any(d["devicefile"] == devicefile for d in self.db.smart):
+            raise RPCError(f"Device '{devicefile}' not found.")
+        self._wake(devicefile)
+        return None
+
+    def create_filesystem(self, params: Dict[str, Any]) -> str:
+        devicefile = params.get("devicefile")
+        lines = [
+            f"Creating filesystem with 244190646 4k blocks on {devicefile}",
+            "Allocating group tables: done",
+            "Writing inode tables: done",
+            "Creating journal (262144 blocks): done",
+            "Writing superblocks and filesystem accounting information: done",
+        ]
+        # Creating a filesystem on an unknown device fails, but only at
+        # the end, like mkfs does.
+        known = any(d["devicefile"] == devicefile for d in self.db.disks)
+        error = None if known else f"Failed to create the filesystem on '{devicefile}'."
+        return self._start(lines, error)
+
+    def get_output(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        filename = params.get("filename")
+        process = self._process(params)
+        output, running = process.output()
+        pos = int(params.get("pos") or 0)
+        if not running:
+            # The status of a finished process is removed once it is read.
+            del self.processes[filename]
+            if process.error is not None:
+                raise RPCError(process.error)
+        return {
+            "filename": filename,
+            "running": running,
+            "outputPending": False,
+            "output": output[pos:],
+            "pos": len(output),
+        }
+
+    def stop_process(self, params: Dict[str, Any]) -> None:
+        process = self._process(params)
+        if process.stopped is None:
+            process.stopped = time.monotonic()
+            process.error = "The background process has been terminated."
+
+    def set_group(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        group = {
+            "name": params["name"],
+            "gid": params.get("gid", 2000 + len(self.db.groups)),
+            "members": params.get("members", []),
+            "comment": params.get("comment", ""),
+            "system": False,
+        }
+        self.db.groups[group["name"]] = group
+        return group
+
+    async def handle(self, request: Request) -> Response:
+        self.calls += 1
+        try:
+            body = json.loads(await request.body())
+            service, method = body["service"], body["method"]
+            params = body.get("params") or {}
+        except (ValueError, KeyError):
+            return self._error(RPCError("Invalid RPC request.", status=400))
+
+        if service == "session":
+            return self._session(request, method)
+
+        sid = request.cookies.get(SESSION_COOKIE)
+        lock = self.sessions.get(sid)
+        if lock is None:
+            return self._error(
+                RPCError("Session not authenticated.", E_SESSION_NOT_AUTHENTICATED, 401)
+            )
+
+        if self.session_lock:
+            async with lock:
+                return await self._execute(service, method, params)
+        return await self._execute(service, method, params)
+
+    async def _execute(self, service: str, method: str, params: Dict) -> Response:
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            if self.random.random() < self.error_rate:
+                raise RPCError("Injected failure.")
+            name = f"{service}.{method}"
+            self.counts[name] = self.counts.get(name, 0) + 1
+            handler = self.methods.get(name)
+            if handler is None:
+                raise RPCError(
+                    f"The method '{method}' does not exist for the RPC service '{service}'."
+                )
+            return JSONResponse({"response": handler(params), "error": None})
+        except RPCError as e:
+            return self._error(e)
+
+    def _session(self, request: Request, method: str) -> Response:
+        if method == "login":
+            sid = uuid.uuid4().hex
+            self.sessions[sid] = asyncio.Lock()
+            resp = JSONResponse(
+                {
+                    "response": {"authenticated": True, "username": "admin"},
+                    "error": None,
+                }
+            )
+            resp.set_cookie(SESSION_COOKIE, sid)
+            return resp
+        if method == "logout":
+            self.sessions.pop(request.cookies.get(SESSION_COOKIE), None)
+            return JSONResponse({"response": None, "error": None})
+        return self._error(RPCError(f"Unknown method '{method}'."))
+
+    @staticmethod
+    def _error(e: RPCError) -> Response:
+        return JSONResponse(
+            {
+                "response": None,
+                "error": {"code": e.code, "message": str(e), "trace": ""},
+            },
+            status_code=e.status,
+        )
+
+
+def create_app(args: argparse.Namespace) -> Starlette:
+    database = Database(
+        args.users, args.groups, args.disks, args.filesystems, args.shares, args.seed
+    )
+    fake = FakeRPC(
+        database,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        session_lock=not args.no_session_lock,
+        seed=args.seed,
+        fill_rate=args.fill_rate,
+        standby=args.standby,
+        time_scale=args.time_scale,
+        job_interval=args.job_interval,
+    )
+    middleware = []
+    if args.gzip:
+        middleware.append(Middleware(GZipMiddleware, minimum_size=1024))
+    return Starlette(
+        routes=[Route("/rpc.php", fake.handle, methods=["POST"])],
+        middleware=middleware,
+    )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="base latency in seconds"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.01, help="additional random latency"
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="fraction of failing RPCs"
+    )
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--disks", type=int, default=8)
+    parser.add_argument("--filesystems", type=int, default=8)
+    parser.add_argument("--shares", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--fill-rate",
+        type=float,
+        default=0.0,
+        help="bytes per second the filesystems grow by",
+    )
+    parser.add_argument(
+        "--standby",
+        type=float,
+        default=0.0,
+        help="fraction of disks in standby until their SMART data is read",
+    )
+    parser.add_argument(
+        "--time-scale",
+        type=float,
+        default=1.0,
+        help="speed up the aging of the SMART attributes",
+    )
+    parser.add_argument(
+        "--job-interval",
+        type=float,
+        default=0.2,
+        help="seconds between two output lines of a background process",
+    )
+    parser.add_argument(
+        "--gzip", action="store_true", help="compress responses like nginx does"
+    )
+    parser.add_argument(
+        "--no-session-lock",
+        action="store_true",
+        help="do not serialize the requests of a session like PHP does",
+    )
+    return parser.parse_args(argv)
+
+
+def main() -> None:
+    args = parse_args()
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,547 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of openmediavault.
+#
+# @license   https://www.gnu.org/licenses/gpl.html GPL Version 3
+# @author    Volker Theile <volker.theile@openmediavault.org>
+# @copyright Copyright (c) 2025 Volker Theile
+#
+# openmediavault is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# openmediavault is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with openmediavault. If not, see <https://www.gnu.org/licenses/>.
+"""
+A load generator that drives all tools and resources of the MCP server
+over streamable-HTTP and/or stdio at a configurable concurrency. The
+server is started with a generated configuration that points to the
+fake rpc.php (see `fake_rpc.py`).
+
+It reports the p50/p95/p99 latency and the throughput of every
+operation and the peak RSS of the server, and stores the results as
+JSON so that they can be compared between commits with `compare.py`.
+
+Usage:
+    python3 bench/fake_rpc.py --users 10000 --disks 200 &
+    python3 bench/loadgen.py --transport http,stdio --concurrency 16
+"""
+
+import argparse
+import asyncio
+import fnmatch
+import itertools
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from urllib.parse import quote
+
+import yaml
+from fastmcp import Client
+from fastmcp.client.transports import StdioTransport, StreamableHttpTransport
+
+ROOT = Path(__file__).resolve().parent.parent
+MAIN = ROOT / "src" / "main.py"
+
+# The tools that modify the system. They are only executed if requested.
+MUTATING = [
+    "reboot",
+    "shutdown",
+    "standby",
+    "create_group",
+    "update_group",
+    "delete_group",
+    "delete_user",
+]
+
+
+@dataclass
+class Operation:
+    name: str
+    call: Callable[[Client, int], Awaitable[Any]]
+    prepare: Optional[Callable[[Client, int], Awaitable[Any]]] = None
+
+
+@dataclass
+class Fixtures:
+    users: List[str] = field(default_factory=list)
+    # The users that may be deleted by `delete_user`.
+    spare_users: List[str] = field(default_factory=list)
+    groups: List[str] = field(default_factory=list)
+    devices: List[str] = field(default_factory=list)
+
+
+@dataclass
+class Stats:
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+    last_error: Optional[str] = None
+
+
+def percentile(values: List[float], p: float) -> float:
+    """
+    Get the percentile of the given values using linear interpolation.
+
+    Args:
+        values: The sorted values.
+        p: The percentile, e.g. 95.
+
+    Returns:
+        The percentile or 0.0 if there are no values.
+    """
+    if not values:
+        return 0.0
+    k = (len(values) - 1) * p / 100
+    lower = int(k)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (k - lower)
+
+
+def summarize(stats: Stats, elapsed: float) -> Dict[str, Any]:
+    values = sorted(stats.latencies)
+    result = {
+        "requests": len(values),
+        "errors": stats.errors,
+        "throughput": round(len(values) / elapsed, 2) if elapsed > 0 else 0.0,
+        "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+    }
+    if stats.last_error:
+        result["last_error"] = stats.last_error
+    return result
+
+
+def peak_rss(pid: int) -> Optional[int]:
+    """
+    Get the peak resident set size of a process in bytes.
+
+    Args:
+        pid: The process ID.
+
+    Returns:
+        The peak RSS or `None` if it is not available on this platform.
+    """
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def find_child(cmdline: str) -> Optional[int]:
+    """
+    Find a child process of this process by its command line.
+
+    Args:
+        cmdline: A string that must be part of the command line.
+
+    Returns:
+        The process ID or `None` if no such process exists.
+    """
+    me = os.getpid()
+    for entry in Path("/proc").glob("[0-9]*"):
+        try:
+            stat = (entry / "stat").read_text()
+            ppid = int(stat.rsplit(")", 1)[1].split()[1])
+            if ppid != me:
+                continue
+            args = (entry / "cmdline").read_bytes().replace(b"\0", b" ").decode()
+            if cmdline in args:
+                return int(entry.name)
+        except (OSError, ValueError, IndexError):
+            continue
+    return None
+
+
+def git_revision() -> Dict[str, Any]:
+    def git(*args: str) -> str:
+        return subprocess.run(
+            ["git", *args], cwd=ROOT, capture_output=True, text=True, check=False
+        ).stdout.strip()
+
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "subject": git("log", "-1", "--format=%s"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def write_config(path: Path, args: argparse.Namespace, port: int, transport: str):
+    config: Dict[str, Any] = {}
+    if args.config:
+        with open(args.config) as f:
+            config = yaml.safe_load(f) or {}
+    config["server"] = {
+        "host": "127.0.0.1",
+        "port": port,
+        "transport": transport,
+        "workers": getattr(args, "workers", 1),
+    }
+    config["rpc"] = (config.get("rpc") or {}) | {
+        "url": args.rpc_url,
+        "auth": {"username": "admin", "password": "openmediavault"},
+    }
+    with open(path / "config.yaml", "w") as f:
+        yaml.safe_dump(config, f)
+
+
+def build_operations(fixtures: Fixtures, mutating: bool) -> List[Operation]:
+    def pick(values: List[str], i: int) -> str:
+        return values[i % len(values)] if values else ""
+
+    def tool(name: str, args: Callable[[int], Dict[str, Any]] = lambda i: {}):
+        return Operation(name, lambda c, i: c.call_tool(name, args(i)))
+
+    def read(uri: Callable[[int], str], name: str):
+        return Operation(name, lambda c, i: c.read_resource(uri(i)))
+
+    operations = [
+        tool("list_hosts"),
+        tool("get_system_information"),
+        tool("list_disks"),
+        tool("list_disks", lambda i: {"limit": 25, "sort": "-size"}),
+        tool("list_filesystems"),
+        tool("list_smart"),
+        tool(
+            "get_smart_identity", lambda i: {"device_file": pick(fixtures.devices, i)}
+        ),
+        tool("get_smart_identities"),
+        tool("list_users", lambda i: {"start": i % 100, "limit": 50}),
+        tool(
+            "list_users",
+            lambda i: {"filter": {"shell": "bash"}, "fields": ["name", "uid"]},
+        ),
+        tool("get_user", lambda i: {"name": pick(fixtures.users, i)}),
+        tool("list_groups"),
+        tool("get_group", lambda i: {"name": pick(fixtures.groups, i)}),
+        tool("list_shared_folders"),
+        read(lambda i: "data://diagnostics/system-information", "system-information"),
+        read(lambda i: "data://storage/disks", "disks"),
+        read(lambda i: "data://storage/disks?limit=10&sort=devicefile", "disks_query"),
+        read(lambda i: "data://storage/filesystems", "filesystems"),
+        read(lambda i: "data://storage/smart/devices", "smart/devices"),
+        read(
+            lambda i: (
+                "data://storage/smart/devices/details/"
+                + quote(pick(fixtures.devices, i), safe="")
+            ),
+            "smart/devices/details",
+        ),
+        read(lambda i: "data://server/cache", "server/cache"),
+    ]
+    # Give operations that occur more than once a distinct name.
+    for name, ops in itertools.groupby(operations, key=lambda op: op.name):
+        ops = list(ops)
+        if len(ops) > 1:
+            for n, op in enumerate(ops[1:], start=2):
+                op.name = f"{name}#{n}"
+
+    if mutating:
+        users = list(fixtures.spare_users)
+
+        async def delete_user(c: Client, i: int) -> Any:
+            return await c.call_tool("delete_user", {"name": users.pop()})
+
+        async def create_group(c: Client, i: int) -> Any:
+            return await c.call_tool("create_group", {"name": f"bench{i}"})
+
+        operations += [
+            tool("reboot"),
+            tool("shutdown"),
+            tool("standby"),
+            Operation("create_group", create_group),
+            tool(
+                "update_group",
+                lambda i: {"name": pick(fixtures.groups, i), "comment": f"bench {i}"},
+            ),
+            Operation(
+                "delete_group",
+                lambda c, i: c.call_tool("delete_group", {"name": f"bench-del{i}"}),
+                prepare=lambda c, i: c.call_tool(
+                    "create_group", {"name": f"bench-del{i}"}
+                ),
+            ),
+        ]
+        if users:
+            operations.append(Operation("delete_user", delete_user))
+    return operations
+
+
+async def discover(client: Client) -> Fixtures:
+    async def names(tool: str, key: str, **args: Any) -> List[str]:
+        result = await client.call_tool(tool, args)
+        return [item[key] for item in (result.structured_content or {}).get("data", [])]
+
+    # The read operations use the first half of the users, `delete_user`
+    # deletes the second half.
+    users = await names("list_users", "name", fields=["name"])
+    half = max(1, len(users) // 2)
+    return Fixtures(
+        users=users[:half],
+        spare_users=users[half:],
+        groups=await names("list_groups", "name", fields=["name"]),
+        devices=await names("list_smart", "devicefile", fields=["devicefile"]),
+    )
+
+
+async def drive(
+    client: Client, args: argparse.Namespace, pid: Optional[int]
+) -> Dict[str, Any]:
+    fixtures = await discover(client)
+    operations = [
+        op
+        for op in build_operations(fixtures, args.mutating)
+        if not args.ops
+        or any(fnmatch.fnmatch(op.name, pattern) for pattern in args.ops)
+    ]
+    if not operations:
+        raise SystemExit("No operations selected.")
+
+    stats: Dict[str, Stats] = {op.name: Stats() for op in operations}
+    schedule = itertools.cycle(operations)
+    counter = itertools.count()
+    stop = False
+
+    async def worker(record: bool) -> None:
+        while not stop:
+            op, i = next(schedule), next(counter)
+            if args.requests and i >= args.requests:
+                return
+            try:
+                if op.prepare is not None:
+                    await op.prepare(client, i)
+                start = time.perf_counter()
+                await op.call(client, i)
+                if record:
+                    stats[op.name].latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                if record:
+                    stats[op.name].errors += 1
+                    stats[op.name].last_error = f"{type(e).__name__}: {e}"
+
+    if args.warmup > 0:
+        tasks = [asyncio.create_task(worker(False)) for _ in range(args.concurrency)]
+        await asyncio.sleep(args.warmup)
+        stop = True
+        await asyncio.gather(*tasks)
+        stop = False
+        counter = itertools.count()
+
+    start = time.perf_counter()
+    tasks = [asyncio.create_task(worker(True)) for _ in range(args.concurrency)]
+    if args.requests:
+        await asyncio.gather(*tasks)
+    else:
+        await asyncio.sleep(args.duration)
+        stop = True
+        await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    total = Stats()
+    for s in stats.values():
+        total.latencies += s.latencies
+        total.errors += s.errors
+    return {
+        "elapsed": round(elapsed, 3),
+        "total": summarize(total, elapsed),
+        "operations": {name: summarize(s, elapsed) for name, s in stats.items()},
+        "server_peak_rss": peak_rss(pid) if pid else None,
+    }
+
+
+async def wait_for_port(port: int, process: subprocess.Popen, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise TimeoutError(f"Server did not listen on port {port} in time")
+
+
+async def run_http(args: argparse.Namespace) -> Dict[str, Any]:
+    if args.url:
+        async with Client(StreamableHttpTransport(args.url)) as client:
+            return await drive(client, args, args.server_pid)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        port = free_port()
+        write_config(Path(tmp), args, port, "streamable-http")
+        process = subprocess.Popen(
+            [sys.executable, str(MAIN)],
+            cwd=tmp,
+            stdout=subprocess.DEVNULL,
+            stderr=None if args.verbose else subprocess.DEVNULL,
+        )
+        try:
+            await wait_for_port(port, process, args.startup_timeout)
+            transport = StreamableHttpTransport(f"http://127.0.0.1:{port}/mcp")
+            async with Client(transport, timeout=args.timeout) as client:
+                return await drive(client, args, process.pid)
+        finally:
+            process.terminate()
+            process.wait(10)
+
+
+async def run_stdio(args: argparse.Namespace) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        write_config(Path(tmp), args, 0, "stdio")
+        transport = StdioTransport(
+            command=sys.executable,
+            args=[str(MAIN)],
+            cwd=tmp,
+            keep_alive=False,
+            log_file=None if args.verbose else Path(os.devnull),
+        )
+        async with Client(transport, timeout=args.timeout) as client:
+            return await drive(client, args, find_child(str(MAIN)))
+
+
+def print_report(transport: str, result: Dict[str, Any]) -> None:
+    header = f"{'operation':<28} {'req':>7} {'err':>5} {'req/s':>9} {'p50':>9} {'p95':>9} {'p99':>9}"
+    print(f"\n== {transport} ({result['elapsed']}s) ==")
+    print(header)
+    print("-" * len(header))
+    rows = list(result["operations"].items()) + [("TOTAL", result["total"])]
+    for name, s in rows:
+        print(
+            f"{name:<28} {s['requests']:>7} {s['errors']:>5} {s['throughput']:>9.1f}"
+            f" {s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} {s['p99_ms']:>9.2f}"
+        )
+        if "last_error" in s:
+            print(f"    {s['last_error'][:100]}")
+    if result["server_peak_rss"]:
+        print(f"server peak RSS: {result['server_peak_rss'] / 1024**2:.1f} MiB")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--transport",
+        default="http,stdio",
+        help="comma separated list of transports, e.g. `http,stdio`",
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--duration", type=float, default=10.0, help="seconds per transport"
+    )
+    parser.add_argument(
+        "--requests",
+        type=int,
+        default=0,
+        help="run a fixed number of requests instead of a fixed duration",
+    )
+    parser.add_argument("--warmup", type=float, default=1.0, help="seconds")
+    parser.add_argument(
+        "--ops", type=lambda s: s.split(","), help="glob patterns of operations"
+    )
+    parser.add_argument(
+        "--mutating",
+        action="store_true",
+        help="also run the tools that modify the system",
+    )
+    parser.add_argument("--rpc-url", default="http://127.0.0.1:8600/rpc.php")
+    parser.add_argument(
+        "--config", help="configuration that is merged into the generated one"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="worker processes of the HTTP server"
+    )
+    parser.add_argument(
+        "--url", help="use an already running server instead, e.g. http://host/mcp"
+    )
+    parser.add_argument(
+        "--server-pid", type=int, help="process ID of the server given by --url"
+    )
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--startup-timeout", type=float, default=30.0)
+    parser.add_argument(
+        "--output",
+        help="the JSON file to write, defaults to bench/results/<date>-<commit>.json",
+    )
+    parser.add_argument("--label", help="a free text label stored in the results")
+    parser.add_argument("--verbose", action="store_true")
+    return parser.parse_args(argv)
+
+
+async def main() -> None:
+    args = parse_args()
+    runners = {"http": run_http, "streamable-http": run_http, "stdio": run_stdio}
+    revision = git_revision()
+    results: Dict[str, Any] = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "label": args.label,
+        "git": revision,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": {
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "ops": args.ops,
+            "mutating": args.mutating,
+            "rpc_url": args.rpc_url,
+            "workers": args.workers,
+        },
+        "runs": {},
+    }
+    for transport in args.transport.split(","):
+        transport = transport.strip()
+        if transport not in runners:
+            raise SystemExit(f"Unknown transport '{transport}'")
+        result = await runners[transport](args)
+        results["runs"][transport] = result
+        print_report(transport, result)
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    results["loadgen_peak_rss"] = usage.ru_maxrss * (
+        1 if sys.platform == "darwin" else 1024
+    )
+
+    output = Path(
+        args.output
+        or ROOT
+        / "bench"
+        / "results"
+        / f"{time.strftime('%Y%m%d-%H%M%S')}-{revision['commit'][:10] or 'unknown'}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of openmediavault.
+#
+# @license   https://www.gnu.org/licenses/gpl.html GPL Version 3
+# @author    Volker Theile <volker.theile@openmediavault.org>
+# @copyright Copyright (c) 2025 Volker Theile
+#
+# openmediavault is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# openmediavault is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with openmediavault. If not, see <https://www.gnu.org/licenses/>.
+"""
+Measure how the throughput of the MCP server scales with the number of
+worker processes. For every worker count the server is started with a
+generated configuration that points to the fake rpc.php (see
+`fake_rpc.py`) and driven by several load generator processes at once,
+so that the load generator itself is not the bottleneck. The number
+of RPCs the fake rpc.php received per MCP request tells whether the
+shared cache keeps the load on rpc.php independent of the workers.
+
+Usage:
+    python3 bench/fake_rpc.py --users 10000 --disks 200 --latency 0.01 &
+    python3 bench/scaling.py --workers 1,2,4 --clients 4 --duration 20
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from loadgen import MAIN, ROOT, free_port, write_config
+from startup import wait_for
+
+
+def rpc_calls(url: str) -> Optional[int]:
+    """
+    Get the number of RPCs the fake rpc.php has executed so far.
+
+    Returns:
+        The number of RPCs or `None` if the server is not the fake.
+    """
+    try:
+        with httpx.Client(timeout=5.0) as client:
+            client.post(url, json={"service": "session", "method": "login"})
+            resp = client.post(url, json={"service": "Debug", "method": "getCalls"})
+            return sum(resp.json()["response"]["methods"].values())
+    except (httpx.HTTPError, KeyError, TypeError, ValueError):
+        return None
+
+
+def run(args: argparse.Namespace, workers: int) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        port = free_port()
+        config = argparse.Namespace(
+            config=args.config, rpc_url=args.rpc_url, workers=workers
+        )
+        write_config(Path(tmp), config, port, "streamable-http")
+        start = time.monotonic()
+        server = subprocess.Popen(
+            [sys.executable, str(MAIN)],
+            cwd=tmp,
+            stdout=subprocess.DEVNULL,
+            stderr=None if args.verbose else subprocess.DEVNULL,
+        )
+        try:
+            if wait_for(f"http://127.0.0.1:{port}/readyz", server, start, 60) is None:
+                raise RuntimeError("The server did not get ready in time")
+            before = rpc_calls(args.rpc_url)
+            clients = [
+                subprocess.Popen(
+                    [
+                        sys.executable,
+                        str(ROOT / "bench" / "loadgen.py"),
+                        "--url",
+                        f"http://127.0.0.1:{port}/mcp",
+                        "--transport",
+                        "http",
+                        "--concurrency",
+                        str(args.concurrency),
+                        "--duration",
+                        str(args.duration),
+                        "--output",
+                        os.path.join(tmp, f"client-{i}.json"),
+                        *(["--ops", args.ops] if args.ops else []),
+                    ],
+                    stdout=subprocess.DEVNULL,
+                    stderr=None if args.verbose else subprocess.DEVNULL,
+                )
+                for i in range(args.clients)
+            ]
+            for client in clients:
+                client.wait()
+            after = rpc_calls(args.rpc_url)
+            totals = []
+            for i in range(args.clients):
+                with open(os.path.join(tmp, f"client-{i}.json")) as f:
+                    totals.append(json.load(f)["runs"]["http"]["total"])
+        finally:
+            server.terminate()
+            server.wait(30)
+    requests = sum(t["requests"] for t in totals)
+    return {
+        "workers": workers,
+        "requests": requests,
+        "errors": sum(t["errors"] for t in totals),
+        "throughput": round(sum(t["throughput"] for t in totals), 2),
+        "p95_ms": max(t["p95_ms"] for t in totals),
+        "rpc_per_request": round((after - before) / requests, 4)
+        if requests and before is not None and after is not None
+        else None,
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--workers", default="1,2,4", help="comma separated list of worker counts"
+    )
+    parser.add_argument(
+        "--clients", type=int, default=4, help="number of load generator processes"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=8, help="concurrency per client"
+    )
+    parser.add_argument(
+        "--duration", type=float, default=10.0, help="seconds per worker count"
+    )
+    parser.add_argument("--ops", help="comma separated glob patterns of operations")
+    parser.add_argument("--rpc-url", default="http://127.0.0.1:8600/rpc.php")
+    parser.add_argument(
+        "--config", help="configuration that is merged into the generated one"
+    )
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--verbose", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main() -> None:
+    args = parse_args()
+    results = [run(args, int(n)) for n in args.workers.split(",")]
+    header = f"{'workers':>7} {'req':>8} {'err':>5} {'req/s':>9} {'speedup':>8} {'p95':>9} {'rpc/req':>8}"
+    print(f"{os.cpu_count()} CPUs\n")
+    print(header)
+    print("-" * len(header))
+    base = results[0]["throughput"] or 1.0
+    for r in results:
+        rpc = "-" if r["rpc_per_request"] is None else f"{r['rpc_per_request']:.3f}"
+        print(
+            f"{r['workers']:>7} {r['requests']:>8} {r['errors']:>5}"
+            f" {r['throughput']:>9.1f} {r['throughput'] / base:>7.2f}x"
+            f" {r['p95_ms']:>9.2f} {rpc:>8}"
+        )
+    if args.output:
+        Path(args.output).write_text(
+            json.dumps({"cpus": os.cpu_count(), "runs": results}, indent=2)
+        )
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of openmediavault.
+#
+# @license   https://www.gnu.org/licenses/gpl.html GPL Version 3
+# @author    Volker Theile <volker.theile@openmediavault.org>
+# @copyright Copyright (c) 2025 Volker Theile
+#
+# openmediavault is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# openmediavault is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with openmediavault. If not, see <https://www.gnu.org/licenses/>.
+"""
+Measure the startup time of the MCP server. The server is started
+several times with a generated configuration that points to the fake
+rpc.php (see `fake_rpc.py`), and the time until `/healthz` and
+`/readyz` answer is taken. Point `--rpc-url` to a port nobody listens
+on to check that an unreachable host does not delay the startup.
+
+Usage:
+    python3 bench/fake_rpc.py &
+    python3 bench/startup.py --runs 10
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from loadgen import MAIN, free_port, percentile, write_config
+
+
+def wait_for(
+    url: str, process: subprocess.Popen, start: float, timeout: float
+) -> Optional[float]:
+    """
+    Poll the URL until it answers with 200.
+
+    Returns:
+        The seconds since `start`, or `None` on timeout.
+    """
+    deadline = start + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return time.monotonic() - start
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.01)
+    return None
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmp:
+        port = free_port()
+        write_config(Path(tmp), args, port, "streamable-http")
+        start = time.monotonic()
+        process = subprocess.Popen(
+            [sys.executable, str(MAIN)],
+            cwd=tmp,
+            stdout=subprocess.DEVNULL,
+            stderr=None if args.verbose else subprocess.DEVNULL,
+        )
+        try:
+            base = f"http://127.0.0.1:{port}"
+            live = wait_for(f"{base}/healthz", process, start, args.timeout)
+            ready = wait_for(f"{base}/readyz", process, start, args.timeout)
+            phases = httpx.get(f"{base}/healthz", timeout=5.0).json()["startup"]
+        finally:
+            process.terminate()
+            process.wait(10)
+    return {"live": live, "ready": ready, "phases": phases}
+
+
+def summarize(values: List[Optional[float]]) -> Dict[str, Any]:
+    measured = sorted(v for v in values if v is not None)
+    return {
+        "runs": len(values),
+        "timeouts": len(values) - len(measured),
+        "p50_ms": round(percentile(measured, 50) * 1000, 1),
+        "p95_ms": round(percentile(measured, 95) * 1000, 1),
+        "max_ms": round(measured[-1] * 1000, 1) if measured else 0.0,
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--rpc-url", default="http://127.0.0.1:8600/rpc.php")
+    parser.add_argument(
+        "--config", help="configuration that is merged into the generated one"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=30.0, help="seconds per endpoint"
+    )
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--verbose", action="store_true")
+    return parser.parse_args(argv)
+
+
+def main() -> None:
+    args = parse_args()
+    runs = [run(args) for _ in range(args.runs)]
+    results: Dict[str, Any] = {
+        "rpc_url": args.rpc_url,
+        "live": summarize([r["live"] for r in runs]),
+        "ready": summarize([r["ready"] for r in runs]),
+        # The phases as measured by the server itself, from the start
+        # of the process.
+        "phases": {
+            phase: summarize([r["phases"].get(phase) for r in runs])
+            for phase in sorted({p for r in runs for p in r["phases"]})
+        },
+    }
+    header = f"{'':<16} {'runs':>5} {'timeouts':>8} {'p50':>9} {'p95':>9} {'max':>9}"
+    print(header)
+    print("-" * len(header))
+    rows = [("healthz", results["live"]), ("readyz", results["ready"])]
+    rows += [(f"phase {name}", s) for name, s in results["phases"].items()]
+    for name, s in rows:
+        print(
+            f"{name:<16} {s['runs']:>5} {s['timeouts']:>8}"
+            f" {s['p50_ms']:>9.1f} {s['p95_ms']:>9.1f} {s['max_ms']:>9.1f}"
+        )
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of openmediavault.
+#
+# @license   https://www.gnu.org/licenses/gpl.html GPL Version 3
+# @author    Volker Theile <volker.theile@openmediavault.org>
+# @copyright Copyright (c) 2025 Volker Theile
+#
+# openmediavault is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# openmediavault is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with openmediavault. If not, see <https://www.gnu.org/licenses/>.
+import logging
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+
+from config import config
+from server import server
+
+# After the server has been initialized, import the resource and tools.
+import prompts  # noqa: F401, isort: skip
+import resources  # noqa: F401, isort: skip
+import tools  # noqa: F401, isort: skip
+
+logger = logging.getLogger(__name__)
+
+
+def workers() -> int:
+    return max(int(config.get("server.workers", 1)), 1)
+
+
+def stateless() -> bool:
+    """
+    Whether the HTTP transport does not keep MCP sessions. The workers
+    do not share the sessions, so this is implied by more than one
+    worker, as a client may reach a different worker with every request.
+    """
+    return workers() > 1 or bool(config.get("server.stateless", False))
+
+
+def create_app() -> Starlette:
+    """
+    Create the ASGI application of the HTTP transport. It is called by
+    every worker process, see `uvicorn.run(factory=True)`.
+    """
+    return server.http_app(
+        middleware=[
+            Middleware(
+                CORSMiddleware,
+                allow_credentials=True,
+                allow_headers=["*"],
+                allow_methods=["*"],
+                allow_origins=["*"],
+                expose_headers=["mcp-session-id"],
+            )
+        ],
+        transport=config.get("server.transport"),
+        stateless_http=stateless(),
+    )
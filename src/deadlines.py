@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of openmediavault.
+#
+# @license   https://www.gnu.org/licenses/gpl.html GPL Version 3
+# @author    Volker Theile <volker.theile@openmediavault.org>
+# @copyright Copyright (c) 2025 Volker Theile
+#
+# openmediavault is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# openmediavault is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with openmediavault. If not, see <https://www.gnu.org/licenses/>.
+import asyncio
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+from fastmcp.server.middleware import CallNext, Middleware, MiddlewareContext
+from mcp.server.lowlevel.server import request_ctx
+
+import tracing
+from config import config
+
+# The point in time, see `time.monotonic`, the MCP request that is
+# currently processed must be answered by.
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+def remaining() -> Optional[float]:
+    """
+    Get the seconds that are left until the deadline of the current
+    MCP request, or `None` if it has none.
+    """
+    value = _deadline.get()
+    return None if value is None else value - time.monotonic()
+
+
+def clamp(timeout: Optional[float]) -> Optional[float]:
+    """
+    Limit a timeout in seconds to the time that is left until the
+    deadline of the current MCP request.
+    """
+    left = remaining()
+    if left is None:
+        return timeout
+    left = max(left, 0.0)
+    return left if timeout is None else min(timeout, left)
+
+
+@contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[None]:
+    """
+    Run the code within the context with a time budget in seconds.
+    A nested budget can only shorten the budget of the outer context,
+    tasks that are created within the context inherit it.
+    """
+    if seconds is None:
+        yield
+        return
+    value = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        value = min(value, current)
+    token = _deadline.set(value)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@asynccontextmanager
+async def enforce(what: str) -> AsyncIterator[None]:
+    """
+    Abort the code within the context when the deadline of the current
+    MCP request passes, e.g. a queued or in-flight RPC.
+
+    Raises:
+        DeadlineExceeded: The deadline passed before or while the code
+            was run.
+    """
+    left = remaining()
+    if left is None:
+        yield
+        return
+    if left <= 0:
+        raise DeadlineExceeded(f"Deadline exceeded before {what}")
+    timeout = asyncio.timeout(left)
+    try:
+        async with timeout:
+            yield
+    except TimeoutError as e:
+        if timeout.expired() and not isinstance(e, DeadlineExceeded):
+            raise DeadlineExceeded(
+                f"Deadline exceeded while waiting for {what}"
+            ) from None
+        raise
+
+
+class DeadlineMiddleware(Middleware):
+    """
+    Bound every MCP tool call and resource read by the time budget the
+    client sent in the `_meta` of the request, either as `timeout` in
+    seconds or as `deadline` in seconds since the epoch. The budget is
+    shared by all RPCs that are issued on behalf of the request, an RPC
+    that is still queued or in flight when it is used up is aborted.
+    """
+
+    def __init__(self, default: float = 0, maximum: float = 0):
+        # The budget of requests without one, and the upper limit of
+        # the budgets, 0 means none.
+        self.default = default
+        self.maximum = maximum
+
+    async def on_call_tool(self, context: MiddlewareContext, call_next: CallNext):
+        return await self._bound(context, call_next)
+
+    async def on_read_resource(self, context: MiddlewareContext, call_next: CallNext):
+        return await self._bound(context, call_next)
+
+    async def _bound(self, context: MiddlewareContext, call_next: CallNext):
+        seconds = self.budget()
+        if seconds is None:
+            return await call_next(context)
+        if seconds <= 0:
+            raise DeadlineExceeded("The deadline of the request has already passed")
+        span = tracing.current()
+        if span is not None:
+            span.set(budget_ms=round(seconds * 1000, 3))
+        with deadline(seconds):
+            return await call_next(context)
+
+    def budget(self) -> Optional[float]:
+        """
+        Get the time budget in seconds of the current MCP request.
+        """
+        seconds = self._requested(_meta())
+        if seconds is None and self.default > 0:
+            seconds = self.default
+        if self.maximum > 0:
+            seconds = self.maximum if seconds is None else min(seconds, self.maximum)
+        return seconds
+
+    @staticmethod
+    def _requested(meta: Dict[str, Any]) -> Optional[float]:
+        try:
+            if meta.get("timeout") is not None:
+                return float(meta["timeout"])
+            if meta.get("deadline") is not None:
+                return float(meta["deadline"]) - time.time()
+        except (TypeError, ValueError):
+            pass
+        return None
+
+
+def _meta() -> Dict[str, Any]:
+    context = request_ctx.get(None)
+    meta = getattr(context, "meta", None)
+    return (meta.model_extra or {}) if meta is not None else {}
+
+
+def create_middleware() -> DeadlineMiddleware:
+    return DeadlineMiddleware(
+        default=float(config.get("deadlines.default", 0)),
+        maximum=float(config.get("deadlines.max", 0)),
+    )
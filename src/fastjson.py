@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of openmediavault.
+#
+# @license   https://www.gnu.org/licenses/gpl.html GPL Version 3
+# @author    Volker Theile <volker.theile@openmediavault.org>
+# @copyright Copyright (c) 2025 Volker Theile
+#
+# openmediavault is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# openmediavault is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with openmediavault. If not, see <https://www.gnu.org/licenses/>.
+import codecs
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+from config import config
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# A function that is applied to every record of a streamed list. It
+# returns the record to keep, which may be a projection of it, or
+# `None` to drop the record.
+RecordTransform = Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]
+
+_backend = config.get("json.backend", "auto")
+if _backend == "orjson" and orjson is None:
+    raise ImportError("The JSON backend 'orjson' is configured but not installed")
+if _backend not in ("auto", "orjson", "json"):
+    raise ValueError(f"Unknown JSON backend '{_backend}'")
+
+BACKEND = "orjson" if orjson is not None and _backend != "json" else "json"
+
+
+if BACKEND == "orjson":
+
+    def dumps(data: Any, sort_keys: bool = False) -> bytes:
+        """
+        Serialize data to compact JSON.
+
+        Args:
+            data: The data to serialize.
+            sort_keys: Sort the keys of dictionaries, e.g. to get a
+                stable representation for hashing.
+
+        Returns:
+            The UTF-8 encoded JSON document.
+        """
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(data, default=str, option=option)
+
+    def loads(data: Any) -> Any:
+        """
+        Deserialize a JSON document given as bytes or str.
+        """
+        return orjson.loads(data)
+
+else:
+
+    def dumps(data: Any, sort_keys: bool = False) -> bytes:
+        """
+        Serialize data to compact JSON.
+
+        Args:
+            data: The data to serialize.
+            sort_keys: Sort the keys of dictionaries, e.g. to get a
+                stable representation for hashing.
+
+        Returns:
+            The UTF-8 encoded JSON document.
+        """
+        return json.dumps(
+            data,
+            default=str,
+            sort_keys=sort_keys,
+            separators=(",", ":"),
+            ensure_ascii=False,
+        ).encode()
+
+    def loads(data: Any) -> Any:
+        """
+        Deserialize a JSON document given as bytes or str.
+        """
+        return json.loads(data)
+
+
+def dumps_text(data: Any) -> str:
+    """
+    Serialize data to compact JSON text, e.g. for MCP tool results.
+    """
+    return dumps(data).decode()
+
+
+class ListStreamDecoder:
+    """
+    Decode an openmediavault RPC response like
+
+        {"response": {"total": 2, "data": [{...}, {...}]}, "error": null}
+
+    incrementally while it is received. The records of the `data` array
+    are decoded one after the other as soon as they are complete and
+    passed through the optional transform, so the complete document
+    never has to be held in memory. Responses of a different shape are
+    buffered and decoded as a whole.
+
+    Usage:
+        decoder = ListStreamDecoder(transform)
+        for chunk in chunks:
+            decoder.feed(chunk)
+        result = decoder.close()
+    """
+
+    # The maximum size of the text in front of the `data` array. If it
+    # is not found within that range, the response is decoded as a whole.
+    MAX_PREFIX = 65536
+
+    def __init__(self, transform: Optional[RecordTransform] = None):
+        self._transform = transform
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._scanner = json.JSONDecoder()
+        self._buffer = ""
+        self._state = "prefix"
+        self._prefix = ""
+        self._suffix: List[str] = []
+        self._records: List[Any] = []
+
+    @property
+    def streaming(self) -> bool:
+        return self._state in ("records", "suffix")
+
+    def feed(self, chunk: bytes) -> None:
+        self._buffer += self._utf8.decode(chunk)
+        if self._state == "prefix":
+            self._find_records()
+        if self._state == "records":
+            self._decode_records(final=False)
+        if self._state == "suffix":
+            self._suffix.append(self._buffer)
+            self._buffer = ""
+
+    def close(self) -> Any:
+        """
+        Finish decoding.
+
+        Returns:
+            The decoded document. The `data` array contains the records
+            that were kept by the transform.
+        """
+        self._buffer += self._utf8.decode(b"", final=True)
+        if self._state in ("prefix", "buffer"):
+            document = loads(self._buffer)
+            response = document.get("response") if isinstance(document, dict) else None
+            if isinstance(response, dict) and isinstance(response.get("data"), list):
+                response["data"] = self._apply(response["data"])
+            return document
+        if self._state == "records":
+            self._decode_records(final=True)
+        document = loads(self._prefix + "[]" + "".join(self._suffix) + self._buffer)
+        document["response"]["data"] = self._records
+        return document
+
+    def _apply(self, records: List[Any]) -> List[Any]:
+        if self._transform is None:
+            return records
+        result = []
+        for record in records:
+            record = self._transform(record)
+            if record is not None:
+                result.append(record)
+        return result
+
+    def _skip(self, pos: int) -> int:
+        buffer = self._buffer
+        while pos < len(buffer) and buffer[pos] in " \t\r\n":
+            pos += 1
+        return pos
+
+    def _expect(self, pos: int, char: str) -> Optional[int]:
+        # Get the position behind the expected character, `None` if
+        # more data is required. Raises `ValueError` on a mismatch.
+        pos = self._skip(pos)
+        if pos >= len(self._buffer):
+            return None
+        if self._buffer[pos] != char:
+            raise ValueError(f"Expected '{char}' at position {pos}")
+        return pos + 1
+
+    def _find_records(self) -> None:
+        try:
+            pos = self._locate()
+        except ValueError:
+            # The response does not have the expected shape.
+            pos = None
+            self._state = "buffer"
+        if pos is None:
+            if self._state == "prefix" and len(self._buffer) > self.MAX_PREFIX:
+                self._state = "buffer"
+            return
+        # Keep the text in front of the array, the remainder of the
+        # document is decoded together with it at the end.
+        self._prefix = self._buffer[:pos]
+        self._buffer = self._buffer[pos + 1 :]
+        self._state = "records"
+
+    def _locate(self) -> Optional[int]:
+        # Find the position of the `[` of `response.data` by walking the
+        # keys of the two outer objects. Values that are skipped on the
+        # way, e.g. `total`, are small.
+        pos = self._expect(0, "{")
+        depth = 0
+        while pos is not None:
+            pos = self._skip(pos)
+            if pos >= len(self._buffer):
+                return None
+            if self._buffer[pos] == "}":
+                raise ValueError("The document has no `response.data` array")
+            try:
+                key, pos = self._scanner.raw_decode(self._buffer, pos)
+                pos = self._expect(pos, ":")
+                if pos is None:
+                    return None
+                pos = self._skip(pos)
+                if pos >= len(self._buffer):
+                    return None
+                if depth == 0 and key == "response":
+                    if self._buffer[pos] != "{":
+                        raise ValueError("The response is not an object")
+                    depth, pos = 1, pos + 1
+                    continue
+                if depth == 1 and key == "data":
+                    if self._buffer[pos] != "[":
+                        raise ValueError("The data is not an array")
+                    return pos
+                _, pos = self._scanner.raw_decode(self._buffer, pos)
+            except json.JSONDecodeError:
+                # The key or value is incomplete.
+                return None
+            pos = self._skip(pos)
+            if pos >= len(self._buffer):
+                return None
+            if self._buffer[pos] == ",":
+                pos += 1
+            elif self._buffer[pos] == "}":
+                raise ValueError("The document has no `response.data` array")
+        return None
+
+    def _decode_records(self, final: bool) -> None:
+        pos = 0
+        buffer = self._buffer
+        while True:
+            pos = self._skip(pos)
+            if pos >= len(buffer):
+                break
+            if buffer[pos] == ",":
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                self._state = "suffix"
+                pos += 1
+                break
+            try:
+                record, end = self._scanner.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if final:
+                    raise
+                # The record is not complete yet.
+                break
+            if not isinstance(record, (dict, list)) and (
+                end >= len(buffer) or buffer[end] not in ",] \t\r\n"
+            ):
+                # A number may be truncated at the end of the buffer.
+                if final:
+                    raise ValueError(f"Unexpected data at position {end}")
+                break
+            pos = end
+            if self._transform is not None:
+                record = self._transform(record)
+                if record is None:
+                    continue
+            self._records.append(record)
+        self._buffer = buffer[pos:]
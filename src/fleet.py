@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of openmediavault.
+#
+# @license   https://www.gnu.org/licenses/gpl.html GPL Version 3
+# @author    Volker Theile <volker.theile@openmediavault.org>
+# @copyright Copyright (c) 2025 Volker Theile
+#
+# openmediavault is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# openmediavault is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with openmediavault. If not, see <https://www.gnu.org/licenses/>.
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+import deadlines
+import metrics
+from config import config
+from rpc import RPC
+from scheduler import CircuitBreaker, Scheduler, scheduler_metrics
+from sharedcache import shared_cache
+
+logger = logging.getLogger(__name__)
+
+HostSelector = Optional[Union[str, List[str]]]
+
+
+def _setting(settings: Dict[str, Any], key: str, default: Any = None) -> Any:
+    """
+    Get a setting of a host. Settings that are not configured for the
+    host fall back to the `rpc` section of the configuration.
+    """
+    value: Any = settings
+    for k in key.split("."):
+        value = value.get(k) if isinstance(value, dict) else None
+        if value is None:
+            return config.get(f"rpc.{key}", default)
+    return value
+
+
+def create_scheduler(name: str, settings: Dict[str, Any]) -> Scheduler:
+    return Scheduler(
+        name,
+        max_concurrency=int(
+            _setting(
+                settings,
+                "scheduler.max_concurrency",
+                _setting(settings, "sessions", 4),
+            )
+        ),
+        service_limits=_setting(settings, "scheduler.services", {}),
+        queue_limits=_setting(settings, "scheduler.queues", {}),
+        reserved=int(_setting(settings, "scheduler.reserved", 1)),
+        method_priorities=_setting(settings, "scheduler.priorities", {}),
+        breaker=CircuitBreaker(
+            failure_threshold=int(
+                _setting(settings, "circuit_breaker.failure_threshold", 5)
+            ),
+            reset_timeout=float(
+                _setting(settings, "circuit_breaker.reset_timeout", 30)
+            ),
+        ),
+    )
+
+
+def create_rpc(name: str, settings: Dict[str, Any]) -> RPC:
+    return RPC(
+        _setting(settings, "url"),
+        timeout=float(_setting(settings, "timeout", 30)),
+        max_connections=int(_setting(settings, "pool.max_connections", 10)),
+        max_keepalive_connections=int(
+            _setting(settings, "pool.max_keepalive_connections", 10)
+        ),
+        keepalive_expiry=float(_setting(settings, "pool.keepalive_expiry", 30)),
+        cache_maxsize=int(_setting(settings, "cache.maxsize", 256)),
+        cache_ttls=_setting(settings, "cache.ttl", {}),
+        sessions=int(_setting(settings, "sessions", 4)),
+        name=name,
+        max_response_size=int(_setting(settings, "max_response_size", 0)),
+        connect_timeout=_setting(settings, "timeouts.connect"),
+        read_timeout=_setting(settings, "timeouts.read"),
+        compression=_setting(settings, "compression"),
+        http2=bool(_setting(settings, "http2", False)),
+        verify=_setting(settings, "verify", False),
+        login_retries=int(_setting(settings, "login.retries", 3)),
+        login_backoff=float(_setting(settings, "login.backoff", 0.5)),
+        shared=shared_cache,
+        scheduler=create_scheduler(name, settings),
+    )
+
+
+class Fleet:
+    """
+    The RPC clients of all openmediavault hosts this server is fronting.
+    Each host has its own connection pool, cache and session.
+    """
+
+    def __init__(self, default: Optional[str] = None, timeout: float = 30.0):
+        self._clients: Dict[str, RPC] = {}
+        self._credentials: Dict[str, Tuple[str, str]] = {}
+        self._default = default
+        self._timeout = timeout
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._clients.keys())
+
+    @property
+    def default(self) -> Optional[str]:
+        return self._default
+
+    def add(self, name: str, client: RPC, username: str, password: str) -> None:
+        self._clients[name] = client
+        self._credentials[name] = (username, password)
+        if self._default is None:
+            self._default = name
+
+    def get(self, host: Optional[str] = None) -> RPC:
+        """
+        Get the RPC client of the specified host. If no host is given,
+        the client of the default host is returned.
+        """
+        name = host or self._default
+        if name not in self._clients:
+            raise ValueError(
+                f"Unknown host '{host}', available hosts are: {', '.join(self.names)}"
+            )
+        return self._clients[name]
+
+    def collect_metrics(self) -> List[metrics.Metric]:
+        """
+        Create the metrics of the per-host state, e.g. the cache
+        statistics, the session pools and the schedulers.
+        """
+        cache = metrics.Counter(
+            "omv_mcp_rpc_cache_total",
+            "Number of RPC cache lookups, evictions and invalidations.",
+            ["host", "event"],
+        )
+        size = metrics.Gauge(
+            "omv_mcp_rpc_cache_entries", "Number of cached RPC responses.", ["host"]
+        )
+        coalesced = metrics.Counter(
+            "omv_mcp_rpc_coalesced_total",
+            "Number of RPCs that were coalesced with an identical in-flight RPC.",
+            ["host"],
+        )
+        sessions = metrics.Gauge(
+            "omv_mcp_rpc_sessions",
+            "Number of openmediavault sessions per state.",
+            ["host", "state"],
+        )
+        for name, client in self._clients.items():
+            stats = client.cache.stats()
+            for event in ("hits", "misses", "evictions", "invalidations"):
+                cache.inc(name, event, amount=stats[event])
+            size.inc(name, amount=stats["size"])
+            coalesced.inc(name, amount=client.flights.shared)
+            for state, value in client.session_stats().items():
+                sessions.inc(name, state, amount=value)
+        schedulers = [client.scheduler for client in self._clients.values()]
+        return [cache, size, coalesced, sessions, *scheduler_metrics(schedulers)]
+
+    def describe(self) -> List[Dict[str, Any]]:
+        return [
+            {"name": name, "url": client.url} for name, client in self._clients.items()
+        ]
+
+    async def login(self, lazy: bool = False) -> None:
+        """
+        Log in to all hosts concurrently. Hosts that fail are reported,
+        an exception is only raised if no host is reachable at all.
+
+        Args:
+            lazy: Only pass the credentials to the clients, they log in
+                on their first RPC. This never blocks or fails.
+        """
+        if lazy:
+            for name, (username, password) in self._credentials.items():
+                self._clients[name].set_credentials(username, password)
+            return
+
+        async def login(name: str) -> None:
+            username, password = self._credentials[name]
+            await self._clients[name].alogin(username, password)
+
+        results = await asyncio.gather(
+            *(login(name) for name in self._clients), return_exceptions=True
+        )
+        errors = [r for r in results if isinstance(r, BaseException)]
+        for name, result in zip(self._clients, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Failed to log in to host '{name}': {result}")
+        if errors and len(errors) == len(results):
+            raise errors[0]
+
+    async def logout(self) -> None:
+        await asyncio.gather(
+            *(client.alogout() for client in self._clients.values()),
+            return_exceptions=True,
+        )
+
+    async def run(
+        self,
+        host: HostSelector,
+        fn: Callable[[RPC], Awaitable[Any]],
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """
+        Run the specified function with the RPC client of the selected
+        host. If more than one host is selected, either as a list of
+        names or via `*`, the function is run for all of them
+        concurrently, see `fan_out`.
+        """
+        if host is None or (isinstance(host, str) and host != "*"):
+            return await fn(self.get(host))
+        return await self.fan_out(fn, None if host == "*" else host, timeout)
+
+    async def fan_out(
+        self,
+        fn: Callable[[RPC], Awaitable[Any]],
+        hosts: Optional[List[str]] = None,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Run the specified function for the given hosts, or all hosts,
+        concurrently. Every host has its own timeout, so the whole call
+        takes as long as the slowest host at most.
+
+        Returns:
+            A dictionary with the results of the succeeded hosts and the
+            errors of the failed hosts.
+        """
+        names = hosts or self.names
+        # The hosts do not get more time than the MCP request has left.
+        timeout = deadlines.clamp(timeout or self._timeout)
+
+        async def call(name: str) -> Any:
+            return await asyncio.wait_for(fn(self.get(name)), timeout)
+
+        results = await asyncio.gather(
+            *(call(name) for name in names), return_exceptions=True
+        )
+
+        succeeded: Dict[str, Any] = {}
+        failed: Dict[str, str] = {}
+        for name, result in zip(names, results):
+            if isinstance(result, asyncio.TimeoutError):
+                failed[name] = f"Timed out after {timeout:.1f} seconds"
+            elif isinstance(result, Exception):
+                failed[name] = str(result)
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                succeeded[name] = result
+        return {"hosts": succeeded, "errors": failed}
+
+
+def create_fleet() -> Fleet:
+    fleet = Fleet(
+        default=config.get("fleet.default"),
+        timeout=float(config.get("fleet.timeout", 30)),
+    )
+    # The host configured in the `rpc` section is always part of the fleet.
+    if config.has("rpc.url"):
+        name = config.get("rpc.name", "default")
+        fleet.add(
+            name,
+            create_rpc(name, {}),
+            config.get("rpc.auth.username"),
+            config.get("rpc.auth.password"),
+        )
+    for name, settings in (config.get("fleet.hosts", {}) or {}).items():
+        settings = settings or {}
+        # Falling back to the URL of the `rpc` section would silently
+        # send the RPCs of the host to another one.
+        if not settings.get("url"):
+            raise ValueError(f"The setting 'fleet.hosts.{name}.url' is missing")
+        fleet.add(
+            name,
+            create_rpc(name, settings),
+            _setting(settings, "auth.username"),
+            _setting(settings, "auth.password"),
+        )
+    return fleet
+
+
+fleet = create_fleet()
+metrics.registry.add_collector(fleet.collect_metrics)
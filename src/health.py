@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of openmediavault.
+#
+# @license   https://www.gnu.org/licenses/gpl.html GPL Version 3
+# @author    Volker Theile <volker.theile@openmediavault.org>
+# @copyright Copyright (c) 2025 Volker Theile
+#
+# openmediavault is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# openmediavault is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with openmediavault. If not, see <https://www.gnu.org/licenses/>.
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import metrics
+import scheduler
+from config import config
+from fleet import fleet
+from rpc import RPC, is_list_method
+
+logger = logging.getLogger(__name__)
+
+# The RPCs that are prefetched into the RPC cache of every host after
+# the startup. They are the lists most tools and the indexes start with.
+WARMUP = [
+    "System.getInformation",
+    "DiskMgmt.getList",
+    "FileSystemMgmt.getList",
+    "ShareMgmt.getList",
+    "Smart.getList",
+    "UserMgmt.getUserList",
+    "UserMgmt.getGroupList",
+]
+
+
+def process_start_time() -> float:
+    """
+    Get the time the process was started at as UNIX timestamp, so that
+    the startup time includes the time that is spent by the interpreter
+    and the imports. Falls back to the current time if the start time
+    can not be determined, e.g. on systems without `/proc`.
+    """
+    try:
+        with open("/proc/self/stat") as f:
+            # The command may contain spaces, the fields that follow it
+            # start after the closing parenthesis.
+            fields = f.read().rpartition(")")[2].split()
+        with open("/proc/stat") as f:
+            btime = next(
+                int(line.split()[1]) for line in f if line.startswith("btime ")
+            )
+        # `starttime` is the 22nd field, in clock ticks since the boot.
+        return btime + int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, StopIteration):
+        return time.time()
+
+
+class Health:
+    """
+    The liveness and readiness of the server. The server is alive as
+    soon as it serves requests, it is ready if at least one host is
+    reachable and the warm-up of the RPC caches is finished.
+    """
+
+    def __init__(
+        self,
+        methods: Optional[List[str]] = None,
+        probe_timeout: float = 2.0,
+    ):
+        self.methods = WARMUP if methods is None else methods
+        self.probe_timeout = probe_timeout
+        self.started = process_start_time()
+        # The seconds from the process start until the end of a phase.
+        self.phases: Dict[str, float] = {}
+        self.warmup = "disabled"
+        self.warmed: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def mark(self, phase: str) -> float:
+        """
+        Record the end of a startup phase.
+
+        Returns:
+            The seconds since the process has been started.
+        """
+        elapsed = max(time.time() - self.started, 0.0)
+        self.phases[phase] = elapsed
+        return elapsed
+
+    async def start(self) -> None:
+        if self.methods and self._task is None:
+            self.warmup = "running"
+            self._task = asyncio.create_task(self._warmup(), name="warmup")
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def warm(self, rpc: RPC) -> Dict[str, Any]:
+        """
+        Log in to the host and prefetch the warm-up RPCs into its cache.
+
+        Returns:
+            The number of prefetched RPCs, the errors and the duration.
+        """
+        start = time.perf_counter()
+
+        async def fetch(name: str) -> None:
+            service, _, method = name.partition(".")
+            params = {"start": 0, "limit": -1} if is_list_method(method) else None
+            await rpc.arequest(service, method, params)
+
+        results = await asyncio.gather(
+            *(fetch(name) for name in self.methods), return_exceptions=True
+        )
+        errors = {
+            name: str(result)
+            for name, result in zip(self.methods, results)
+            if isinstance(result, Exception)
+        }
+        for result in results:
+            if isinstance(result, BaseException) and not isinstance(result, Exception):
+                raise result
+        return {
+            "fetched": len(self.methods) - len(errors),
+            "errors": errors,
+            "duration": round(time.perf_counter() - start, 3),
+        }
+
+    async def _warmup(self) -> None:
+        names = fleet.names
+        with scheduler.priority("background"):
+            results = await asyncio.gather(
+                *(self.warm(fleet.get(name)) for name in names), return_exceptions=True
+            )
+        for name, result in zip(names, results):
+            if isinstance(result, BaseException):
+                result = {"fetched": 0, "errors": {"*": str(result)}}
+            if result["errors"]:
+                logger.warning(
+                    f"Warm-up of host '{name}' failed for: {', '.join(result['errors'])}"
+                )
+            self.warmed[name] = result
+        self.warmup = "done"
+        logger.info(f"Warm-up finished after {self.mark('warm'):.3f}s")
+
+    def liveness(self) -> Dict[str, Any]:
+        return {
+            "status": "ok",
+            "uptime": round(time.time() - self.started, 3),
+            "startup": {phase: round(value, 3) for phase, value in self.phases.items()},
+            "warmup": self.warmup,
+            "hosts": {name: fleet.get(name).state() for name in fleet.names},
+        }
+
+    async def _probe(self, rpc: RPC) -> None:
+        # The probe also logs in lazily, its response is cached briefly,
+        # so frequent probes do not reach the host every time.
+        try:
+            await asyncio.wait_for(
+                rpc.arequest("System", "getInformation"), self.probe_timeout
+            )
+        except Exception as e:
+            logger.debug(f"Readiness probe of host '{rpc.name}' failed: {e}")
+
+    async def readiness(self) -> Tuple[bool, Dict[str, Any]]:
+        """
+        Check whether the server is ready to serve requests. Hosts that
+        have not been reached yet, or not by their last RPC, are probed
+        with a short timeout first.
+
+        Returns:
+            Whether the server is ready and the details.
+        """
+        clients = [fleet.get(name) for name in fleet.names]
+        await asyncio.gather(
+            *(self._probe(rpc) for rpc in clients if rpc.reachable is not True)
+        )
+        hosts = {
+            rpc.name: {
+                "reachable": bool(rpc.reachable),
+                "error": None if rpc.reachable else rpc.last_error,
+                "cache_entries": rpc.cache.stats()["size"],
+                "warmup": self.warmed.get(rpc.name),
+            }
+            for rpc in clients
+        }
+        ready = self.warmup != "running" and any(
+            host["reachable"] for host in hosts.values()
+        )
+        return ready, {
+            "status": "ready" if ready else "not ready",
+            "warmup": self.warmup,
+            "hosts": hosts,
+        }
+
+    def collect_metrics(self) -> List[metrics.Metric]:
+        startup = metrics.Gauge(
+            "omv_mcp_startup_seconds",
+            "Seconds from the process start until the end of a startup phase.",
+            ["phase"],
+        )
+        reachable = metrics.Gauge(
+            "omv_mcp_rpc_reachable",
+            "Whether the last RPC reached the host, 1 if it did.",
+            ["host"],
+        )
+        for phase, value in self.phases.items():
+            startup.inc(phase, amount=value)
+        for name in fleet.names:
+            state = fleet.get(name).reachable
+            if state is not None:
+                reachable.inc(name, amount=int(state))
+        return [startup, reachable]
+
+
+health = Health(
+    methods=config.get("startup.warmup.methods"),
+    probe_timeout=float(config.get("startup.probe_timeout", 2)),
+)
+metrics.registry.add_collector(health.collect_metrics)
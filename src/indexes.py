@@ -0,0 +1,443 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of openmediavault.
+#
+# @license   https://www.gnu.org/licenses/gpl.html GPL Version 3
+# @author    Volker Theile <volker.theile@openmediavault.org>
+# @copyright Copyright (c) 2025 Volker Theile
+#
+# openmediavault is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# openmediavault is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with openmediavault. If not, see <https://www.gnu.org/licenses/>.
+import asyncio
+import logging
+import re
+import time
+import weakref
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Dict, List, Optional, Set, Tuple
+
+import metrics
+import scheduler
+from config import config
+from fleet import fleet
+from rpc import RPC
+from utils import content_hash
+from versioning import diff, record_key
+
+logger = logging.getLogger(__name__)
+
+# The indexed lists and the fields they can be looked up by. Every
+# field maps a value to the keys of the records having it, so values
+# do not need to be unique, e.g. the model of a disk. Fields of nested
+# objects are separated by dots, e.g. the mount point of the shared
+# folders.
+INDEXES: Dict[str, Tuple[str, str, List[str]]] = {
+    "users": ("UserMgmt", "getUserList", ["name", "uid", "email"]),
+    "groups": ("UserMgmt", "getGroupList", ["name", "gid"]),
+    "disks": ("DiskMgmt", "getList", ["devicefile", "serialnumber", "wwn", "model"]),
+    "smart": ("Smart", "getList", ["devicefile", "serialnumber", "wwn"]),
+    "filesystems": (
+        "FileSystemMgmt",
+        "getList",
+        ["uuid", "label", "mountpoint", "devicefile", "parentdevicefile"],
+    ),
+    "shares": ("ShareMgmt", "getList", ["uuid", "name", "mntentref", "mntent.dir"]),
+}
+
+# The fields of the indexed records that can be searched as full text
+# and their weight in the ranking of the search results, see `search`.
+TEXT_FIELDS: Dict[str, Dict[str, float]] = {
+    "users": {"name": 3, "email": 1, "comment": 1, "groups": 0.5},
+    "groups": {"name": 3, "comment": 1, "members": 0.5},
+    "disks": {
+        "devicefile": 2,
+        "serialnumber": 3,
+        "model": 2,
+        "vendor": 2,
+        "wwn": 1,
+        "description": 0.5,
+    },
+    "smart": {
+        "devicefile": 1,
+        "serialnumber": 1,
+        "model": 1,
+        "vendor": 1,
+        "overallstatus": 2,
+    },
+    "filesystems": {
+        "label": 3,
+        "uuid": 2,
+        "devicefile": 2,
+        "type": 1,
+        "mountpoint": 1,
+        "comment": 1,
+    },
+    "shares": {"name": 3, "uuid": 2, "reldirpath": 1, "comment": 1},
+}
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def field_value(record: Dict[str, Any], field: str) -> Any:
+    """
+    Get the value of a field, fields of nested objects are separated
+    by dots, e.g. `mntent.dir`.
+    """
+    value: Any = record
+    for name in field.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(name)
+    return value
+
+
+def normalize(value: Any) -> Optional[str]:
+    """
+    Normalize a field value for the lookup, so that e.g. the UID `1000`
+    matches `"1000"` and labels match regardless of their case.
+
+    Returns:
+        The normalized value or `None` if the value can not be indexed.
+    """
+    if value is None or isinstance(value, (dict, list)):
+        return None
+    value = str(value).strip().lower()
+    return value or None
+
+
+def tokenize(value: Any) -> List[str]:
+    """
+    Split a field value into lowercase alphanumeric tokens, e.g.
+    `BAD_SECTOR` into `bad` and `sector`. The tokens of lists are
+    concatenated, booleans and dictionaries have no tokens.
+    """
+    if value is None or isinstance(value, (bool, dict)):
+        return []
+    if isinstance(value, list):
+        return [token for item in value for token in tokenize(item)]
+    return TOKEN_RE.findall(str(value).lower())
+
+
+class EntityIndex:
+    """
+    The records of a list with a map per indexed field that resolves
+    a value to the keys of the matching records in O(1). The tokens of
+    the text fields are kept in an inverted index for the full text
+    search.
+    """
+
+    def __init__(
+        self,
+        service: str,
+        method: str,
+        fields: List[str],
+        text_fields: Optional[Dict[str, float]] = None,
+    ):
+        self.service = service
+        self.method = method
+        self.fields = fields
+        self.text_fields = text_fields or {}
+        # The keys of the records containing a token and the weight of
+        # the most relevant field the token occurs in.
+        self.postings: Dict[str, Dict[str, float]] = {}
+        self._vocabulary: Optional[List[str]] = None
+        self.records: Dict[str, Dict[str, Any]] = {}
+        self.digest: Optional[str] = None
+        self.generation: int = -1
+        self.updated: Optional[float] = None
+        self.error: Optional[str] = None
+        self.refreshes = 0
+        self.lock = asyncio.Lock()
+        self._maps: Dict[str, Dict[str, Set[str]]] = {field: {} for field in fields}
+
+    def meta(self) -> Dict[str, Any]:
+        age = None if self.updated is None else time.time() - self.updated
+        return {
+            "updated": None
+            if self.updated is None
+            else datetime.fromtimestamp(self.updated, timezone.utc).isoformat(),
+            "age": None if age is None else round(age, 3),
+            "size": len(self.records),
+            "version": self.digest,
+            "error": self.error,
+        }
+
+    def outdated(self, generation: int, max_age: float) -> bool:
+        if self.updated is None or self.generation != generation:
+            return True
+        return max_age > 0 and time.time() - self.updated > max_age
+
+    def update(self, records: List[Any]) -> Dict[str, int]:
+        """
+        Apply the differences between the indexed and the specified
+        records, only the maps of added, removed and modified records
+        are touched.
+
+        Returns:
+            The number of added, removed and modified records.
+        """
+        digest = content_hash(records)
+        if digest == self.digest:
+            return {"added": 0, "removed": 0, "modified": 0}
+        changes = diff(list(self.records.values()), records)
+        for key in changes["removed"]:
+            self._remove(key)
+        for record in changes["modified"]:
+            self._remove(record_key(record))
+            self._add(record)
+        for record in changes["added"]:
+            self._add(record)
+        self.digest = digest
+        return {name: len(value) for name, value in changes.items()}
+
+    def lookup(self, field: str, value: Any) -> List[Dict[str, Any]]:
+        keys = self._maps[field].get(normalize(value), ())
+        return [self.records[key] for key in sorted(keys)]
+
+    @property
+    def vocabulary(self) -> List[str]:
+        """
+        The sorted tokens of the inverted index, it is rebuilt lazily
+        after the records have changed.
+        """
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        return self._vocabulary
+
+    def _add(self, record: Any) -> None:
+        if not isinstance(record, dict):
+            return
+        key = record_key(record)
+        self.records[key] = record
+        for field, values in self._maps.items():
+            value = normalize(field_value(record, field))
+            if value is not None:
+                values.setdefault(value, set()).add(key)
+        for field, weight in self.text_fields.items():
+            for token in tokenize(record.get(field)):
+                keys = self.postings.setdefault(token, {})
+                keys[key] = max(keys.get(key, 0), weight)
+        self._vocabulary = None
+
+    def _remove(self, key: str) -> None:
+        record = self.records.pop(key, None)
+        if record is None:
+            return
+        for field, values in self._maps.items():
+            value = normalize(field_value(record, field))
+            keys = values.get(value)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del values[value]
+        for field in self.text_fields:
+            for token in tokenize(record.get(field)):
+                keys = self.postings.get(token)
+                if keys is not None:
+                    keys.pop(key, None)
+                    if not keys:
+                        del self.postings[token]
+        self._vocabulary = None
+
+
+class IndexStore:
+    """
+    Keep in-memory indexes of the users, groups, disks, filesystems and
+    shared folders of every host, so that entities can be looked up by
+    name, UID/GID, serial number or mount point without an RPC.
+
+    An index is refreshed in the background and whenever a mutating RPC
+    invalidated its service, see `RPC.generation`. A lookup only waits
+    for rpc.php if the index is outdated.
+    """
+
+    def __init__(self, max_age: float = 600, interval: float = 300):
+        self.max_age = max_age
+        self.interval = interval
+        self._indexes: weakref.WeakKeyDictionary[RPC, Dict[str, EntityIndex]] = (
+            weakref.WeakKeyDictionary()
+        )
+        self._task: Optional[asyncio.Task] = None
+
+    def index(self, rpc: RPC, kind: str) -> EntityIndex:
+        indexes = self._indexes.setdefault(rpc, {})
+        if kind not in indexes:
+            indexes[kind] = EntityIndex(*INDEXES[kind], TEXT_FIELDS.get(kind))
+        return indexes[kind]
+
+    async def get(self, rpc: RPC, kind: str) -> EntityIndex:
+        """
+        Get the index of the specified kind, it is refreshed first if
+        it is outdated.
+        """
+        index = self.index(rpc, kind)
+        if index.outdated(rpc.generation(index.service), self.max_age):
+            await self.refresh(rpc, kind)
+        return index
+
+    async def refresh(self, rpc: RPC, kind: str, force: bool = False) -> bool:
+        """
+        Fetch the list of the specified index and apply the changes.
+        If the index can not be refreshed, but has been built before,
+        the outdated index is kept.
+
+        Args:
+            force: Refresh the index even if it is up to date and do
+                not use cached RPC responses.
+
+        Returns:
+            `True` if the index has changed, otherwise `False`.
+        """
+        index = self.index(rpc, kind)
+        async with index.lock:
+            generation = rpc.generation(index.service)
+            # Another lookup may have refreshed the index in the meantime.
+            if not force and not index.outdated(generation, self.max_age):
+                return False
+
+            def fetch() -> Awaitable[Any]:
+                return rpc.arequest(
+                    index.service,
+                    index.method,
+                    {"start": 0, "limit": -1},
+                    use_cache=not force,
+                )
+
+            try:
+                if force and rpc.shared is not None:
+                    # The other workers refresh their indexes from the
+                    # list fetched by the first one. A list that was
+                    # fetched while a mutation invalidated the service is
+                    # not shared, like in `RPC._cache_update`.
+                    result = await rpc.shared.once(
+                        f"index:{rpc.name}:{kind}",
+                        fetch,
+                        self.interval,
+                        host=rpc.name,
+                        service=index.service,
+                        generation=generation,
+                    )
+                else:
+                    result = await fetch()
+            except Exception as e:
+                index.error = str(e)
+                if index.updated is None:
+                    raise
+                logger.warning(f"Failed to refresh the {kind} index: {e}")
+                return False
+            if (
+                rpc.generation(index.service) != generation
+                and index.updated is not None
+            ):
+                # The list may predate a mutation, keep the current index
+                # outdated so the next lookup refreshes it again.
+                logger.debug(f"Dropped the {kind} index refresh, it was invalidated")
+                return False
+            records = result.get("data", []) if isinstance(result, dict) else result
+            changes = index.update(records or [])
+            index.generation, index.updated, index.error = generation, time.time(), None
+            index.refreshes += 1
+        changed = any(changes.values())
+        if changed:
+            logger.debug(f"Refreshed the {kind} index of {rpc.url}: {changes}")
+        return changed
+
+    async def lookup(
+        self, rpc: RPC, kind: str, fields: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Look up the records of the specified index that match all of
+        the given field values.
+
+        Args:
+            rpc: The RPC client of the host.
+            kind: The name of the index, see `INDEXES`.
+            fields: The field values to match, `None` values are ignored.
+
+        Returns:
+            A dictionary with the matching records and the metadata of
+            the index, e.g. its age.
+        """
+        criteria = {
+            field: value for field, value in fields.items() if value is not None
+        }
+        if not criteria:
+            raise ValueError(
+                f"At least one of the fields {', '.join(fields)} must be given"
+            )
+        index = await self.get(rpc, kind)
+        result: Optional[List[Dict[str, Any]]] = None
+        for field, value in criteria.items():
+            records = index.lookup(field, value)
+            if result is None:
+                result = records
+            else:
+                keys = {record_key(record) for record in records}
+                result = [record for record in result if record_key(record) in keys]
+        return {"total": len(result), "data": result, "index": index.meta()}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._poll(), name="indexes")
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _poll(self) -> None:
+        with scheduler.priority("background"):
+            # The first pass may be served from the RPC cache, or be
+            # coalesced with the identical requests of the warm-up.
+            force = False
+            while True:
+                for name in fleet.names:
+                    rpc = fleet.get(name)
+                    for kind in INDEXES:
+                        try:
+                            await self.refresh(rpc, kind, force=force)
+                        except asyncio.CancelledError:
+                            raise
+                        except Exception as e:
+                            logger.warning(
+                                f"Failed to refresh the {kind} index of host '{name}': {e}"
+                            )
+                force = True
+                await asyncio.sleep(self.interval)
+
+    def collect_metrics(self) -> List[metrics.Metric]:
+        size = metrics.Gauge(
+            "omv_mcp_index_entries", "Number of indexed records.", ["host", "index"]
+        )
+        refreshes = metrics.Counter(
+            "omv_mcp_index_refreshes_total",
+            "Number of index refreshes.",
+            ["host", "index"],
+        )
+        for name in fleet.names:
+            for kind, index in self._indexes.get(fleet.get(name), {}).items():
+                size.inc(name, kind, amount=len(index.records))
+                refreshes.inc(name, kind, amount=index.refreshes)
+        return [size, refreshes]
+
+
+indexes = IndexStore(
+    max_age=float(config.get("indexes.max_age", 600)),
+    interval=float(config.get("indexes.interval", 300)),
+)
+metrics.registry.add_collector(indexes.collect_metrics)
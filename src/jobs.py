@@ -0,0 +1,431 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of openmediavault.
+#
+# @license   https://www.gnu.org/licenses/gpl.html GPL Version 3
+# @author    Volker Theile <volker.theile@openmediavault.org>
+# @copyright Copyright (c) 2025 Volker Theile
+#
+# openmediavault is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# openmediavault is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with openmediavault. If not, see <https://www.gnu.org/licenses/>.
+import asyncio
+import collections
+import contextvars
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+import metrics
+import scheduler
+from config import config
+from fleet import fleet
+from rpc import RPC, UNAVAILABLE_STATUS_CODES
+from sharedcache import SharedCache, shared_cache
+
+logger = logging.getLogger(__name__)
+
+# The openmediavault RPCs that run as a background process, by the
+# name of the operation, and the parameters they require. The output of
+# the process is read incrementally via `Exec.getOutput`.
+OPERATIONS: Dict[str, Dict[str, Any]] = {
+    "apt_update": {"service": "Apt", "method": "update", "required": []},
+    "apt_upgrade": {"service": "Apt", "method": "upgrade", "required": ["packages"]},
+    "create_filesystem": {
+        "service": "FileSystemMgmt",
+        "method": "create",
+        "required": ["devicefile", "type"],
+    },
+}
+
+STATES = ["running", "succeeded", "failed", "cancelled"]
+
+
+class Job:
+    """
+    A background process on openmediavault. Only the tail of its output
+    is kept, `size` is the number of characters received so far, which
+    is the offset of the next output.
+    """
+
+    def __init__(
+        self,
+        id: str,
+        host: str,
+        operation: str,
+        params: Dict[str, Any],
+        filename: str,
+        max_output: int,
+    ):
+        self.id = id
+        self.host = host
+        self.operation = operation
+        self.params = params
+        # The status file of the background process on openmediavault.
+        self.filename = filename
+        self.max_output = max_output
+        self.state = "running"
+        self.error: Optional[str] = None
+        self.started = time.time()
+        self.finished: Optional[float] = None
+        # The position in the output file on openmediavault.
+        self.pos = 0
+        self.size = 0
+        self.output = ""
+        self.polls = 0
+        self.cancelled = False
+        self.followers = 0
+        self.task: Optional[asyncio.Task] = None
+        # Set when new output arrived or the job finished, it is replaced
+        # after every update.
+        self.updated = asyncio.Event()
+        # Set to poll right away, e.g. when a client starts to follow.
+        self.wakeup = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.state != "running"
+
+    def append(self, output: str) -> None:
+        self.size += len(output)
+        self.output += output
+        if self.max_output > 0 and len(self.output) > self.max_output:
+            self.output = self.output[-self.max_output :]
+
+    def notify(self) -> None:
+        self.updated.set()
+        self.updated = asyncio.Event()
+
+    def record(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "host": self.host,
+            "operation": self.operation,
+            "params": self.params,
+            "filename": self.filename,
+            "state": self.state,
+            "error": self.error,
+            "started": self.started,
+            "finished": self.finished,
+            "polls": self.polls,
+            "size": self.size,
+            "output": self.output,
+        }
+
+
+def view(record: Dict[str, Any], since: int = 0) -> Dict[str, Any]:
+    """
+    Get the job record with the output from the offset `since` on. The
+    output before the retained tail is gone, which is indicated by
+    `truncated`. The offset of the next output is `next`.
+    """
+    start = record["size"] - len(record["output"])
+    since = max(int(since), 0)
+    result = {key: value for key, value in record.items() if key != "output"}
+    result["offset"] = max(since, start)
+    result["truncated"] = since < start
+    result["output"] = record["output"][max(since - start, 0) :]
+    result["next"] = record["size"]
+    return result
+
+
+class JobManager:
+    """
+    Start long-running openmediavault operations, e.g. an `apt update`,
+    and track them by ID. The output of every job is polled in the
+    background with an adaptive interval: it is reset to the minimum
+    when new output arrived, and backs off to the maximum while the job
+    is silent. Only new bytes are fetched, starting at the position of
+    the previous poll.
+
+    The records of the jobs are published to the shared cache, so that
+    every worker can report and cancel them, even though only the
+    worker that started a job polls it.
+    """
+
+    def __init__(
+        self,
+        shared: Optional[SharedCache] = None,
+        max_jobs: int = 50,
+        max_output: int = 65536,
+        retention: float = 3600,
+        min_interval: float = 0.5,
+        max_interval: float = 10,
+        backoff: float = 2.0,
+    ):
+        self.shared = shared
+        # The number of finished jobs that are kept, and the number of
+        # output characters that are kept per job.
+        self.max_jobs = max_jobs
+        self.max_output = max_output
+        self.retention = retention
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.backoff = max(backoff, 1.0)
+        self._jobs: collections.OrderedDict[str, Job] = collections.OrderedDict()
+
+    async def start(self, rpc: RPC, operation: str, params: Dict[str, Any]) -> Job:
+        """
+        Start the operation on the host of the RPC client.
+
+        Raises:
+            ValueError: The operation is unknown, a required parameter
+                is missing or the RPC did not start a background process.
+        """
+        spec = OPERATIONS.get(operation)
+        if spec is None:
+            raise ValueError(
+                f"Unknown operation '{operation}', use {', '.join(OPERATIONS)}."
+            )
+        missing = [name for name in spec["required"] if params.get(name) is None]
+        if missing:
+            raise ValueError(
+                f"The operation '{operation}' requires the parameters "
+                f"{', '.join(missing)}."
+            )
+        filename = await rpc.arequest(spec["service"], spec["method"], params)
+        if not isinstance(filename, str) or not filename:
+            raise ValueError(
+                f"{spec['service']}.{spec['method']} did not start a background "
+                f"process on host '{rpc.name}'."
+            )
+        job = Job(
+            uuid.uuid4().hex[:12],
+            rpc.name,
+            operation,
+            params,
+            filename,
+            self.max_output,
+        )
+        self._jobs[job.id] = job
+        self._prune()
+        self._publish(job)
+        # The job outlives the MCP request that started it, so it must
+        # not inherit its deadline, priority or trace.
+        job.task = asyncio.create_task(
+            self._poll(rpc, job), name=f"job-{job.id}", context=contextvars.Context()
+        )
+        logger.info(f"Started job {job.id} ({operation}) on host '{rpc.name}'")
+        return job
+
+    async def get(self, id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the record of a job, it might have been started by another
+        worker.
+        """
+        job = self._jobs.get(id)
+        if job is not None:
+            return job.record()
+        if self.shared is not None:
+            found, record, _ = await self.shared.aget(f"job:{id}")
+            if found:
+                return record
+        return None
+
+    async def records(self) -> List[Dict[str, Any]]:
+        records = {id: job.record() for id, job in self._jobs.items()}
+        if self.shared is not None:
+            for _, record in await self.shared.aitems("job:"):
+                records.setdefault(record["id"], record)
+        return sorted(records.values(), key=lambda record: record["started"])
+
+    async def wait(
+        self,
+        id: str,
+        since: int = 0,
+        timeout: float = 0,
+        on_output: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Wait at most `timeout` seconds for the job to finish. New output
+        is passed to `on_output` as soon as it arrives.
+
+        Returns:
+            The record of the job with the output since `since`, see
+            `view`, or `None` if the job does not exist.
+        """
+        record = await self.get(id)
+        if record is None:
+            return None
+        first = since
+        until = time.monotonic() + timeout
+        job = self._jobs.get(id)
+        if job is not None:
+            # A followed job is polled at the minimum interval.
+            job.followers += 1
+            job.wakeup.set()
+        try:
+            while True:
+                updated = job.updated if job is not None else None
+                if job is not None:
+                    record = job.record()
+                else:
+                    record = await self.get(id) or record
+                current = view(record, since)
+                if on_output is not None and current["output"]:
+                    await on_output(current)
+                since = current["next"]
+                left = until - time.monotonic()
+                if record["state"] != "running" or left <= 0:
+                    break
+                if updated is not None:
+                    try:
+                        await asyncio.wait_for(updated.wait(), left)
+                    except TimeoutError:
+                        pass
+                else:
+                    # The job is polled by another worker.
+                    await asyncio.sleep(min(self.min_interval, left))
+        finally:
+            if job is not None:
+                job.followers -= 1
+        return view(record, first)
+
+    async def cancel(self, id: str) -> Optional[Dict[str, Any]]:
+        """
+        Stop the background process of a job.
+
+        Returns:
+            The record of the job, or `None` if it does not exist.
+        """
+        record = await self.get(id)
+        if record is None or record["state"] != "running":
+            return record
+        rpc = fleet.get(record["host"])
+        await rpc.arequest("Exec", "stop", {"filename": record["filename"]})
+        job = self._jobs.get(id)
+        if job is not None:
+            job.cancelled = True
+            job.wakeup.set()
+        elif self.shared is not None:
+            # Tell the worker that polls the job.
+            self.shared.aset(f"job-cancelled:{id}", True, self.retention)
+        return record
+
+    async def stop(self) -> None:
+        """
+        Stop polling the jobs, the background processes on
+        openmediavault keep running.
+        """
+        tasks = [job.task for job in self._jobs.values() if job.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _poll(self, rpc: RPC, job: Job) -> None:
+        interval = self.min_interval
+        while not job.done:
+            priority = "interactive" if job.followers else "background"
+            result = "idle"
+            try:
+                with scheduler.priority(priority):
+                    resp = await rpc.arequest(
+                        "Exec",
+                        "getOutput",
+                        {"filename": job.filename, "pos": job.pos},
+                        use_cache=False,
+                    )
+            except asyncio.CancelledError:
+                raise
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code in UNAVAILABLE_STATUS_CODES:
+                    result = "error"
+                else:
+                    # The process failed, openmediavault reports its
+                    # error when the output is read.
+                    await self._finish(job, "failed", str(e))
+                    result = "failed"
+            except Exception as e:
+                logger.warning(f"Failed to poll job {job.id}: {e}")
+                result = "error"
+            else:
+                output = resp.get("output") or ""
+                job.pos = resp.get("pos", job.pos)
+                if output:
+                    job.append(output)
+                    result = "output"
+                if not resp.get("running") and not resp.get("outputPending"):
+                    await self._finish(job, "succeeded")
+                elif output:
+                    self._publish(job)
+                    job.notify()
+            job.polls += 1
+            metrics.JOB_POLLS.inc(job.host, result)
+            if job.done:
+                break
+            if result == "output" or job.followers:
+                interval = self.min_interval
+            else:
+                interval = min(interval * self.backoff, self.max_interval)
+            try:
+                await asyncio.wait_for(job.wakeup.wait(), interval)
+            except TimeoutError:
+                pass
+            job.wakeup.clear()
+
+    async def _finish(self, job: Job, state: str, error: Optional[str] = None) -> None:
+        if job.cancelled or await self._cancelled_remotely(job):
+            state, error = "cancelled", None
+        job.state, job.error, job.finished = state, error, time.time()
+        self._publish(job)
+        job.notify()
+        self._prune()
+        logger.info(
+            f"Job {job.id} ({job.operation}) on host '{job.host}' {state}"
+            + (f": {error}" if error else "")
+        )
+
+    async def _cancelled_remotely(self, job: Job) -> bool:
+        if self.shared is None:
+            return False
+        return (await self.shared.aget(f"job-cancelled:{job.id}"))[0]
+
+    def _publish(self, job: Job) -> None:
+        if self.shared is not None:
+            self.shared.aset(f"job:{job.id}", job.record(), self.retention)
+
+    def _prune(self) -> None:
+        # Drop the oldest finished jobs, running jobs are always kept.
+        now = time.time()
+        finished = [job for job in self._jobs.values() if job.done]
+        for index, job in enumerate(finished):
+            if (
+                len(finished) - index > self.max_jobs
+                or now - job.finished > self.retention
+            ):
+                del self._jobs[job.id]
+
+    def collect_metrics(self) -> List[metrics.Metric]:
+        jobs = metrics.Gauge(
+            "omv_mcp_jobs",
+            "Number of tracked background jobs per state.",
+            ["state"],
+        )
+        counts = collections.Counter(job.state for job in self._jobs.values())
+        for state in STATES:
+            jobs.inc(state, amount=counts[state])
+        return [jobs]
+
+
+jobs = JobManager(
+    shared=shared_cache,
+    max_jobs=int(config.get("jobs.max_jobs", 50)),
+    max_output=int(config.get("jobs.max_output", 65536)),
+    retention=float(config.get("jobs.retention", 3600)),
+    min_interval=float(config.get("jobs.poll.min_interval", 0.5)),
+    max_interval=float(config.get("jobs.poll.max_interval", 10)),
+    backoff=float(config.get("jobs.poll.backoff", 2.0)),
+)
+metrics.registry.add_collector(jobs.collect_metrics)
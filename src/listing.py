@@ -0,0 +1,312 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of openmediavault.
+#
+# @license   https://www.gnu.org/licenses/gpl.html GPL Version 3
+# @author    Volker Theile <volker.theile@openmediavault.org>
+# @copyright Copyright (c) 2025 Volker Theile
+#
+# openmediavault is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# openmediavault is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with openmediavault. If not, see <https://www.gnu.org/licenses/>.
+from typing import Any, Dict, List, Optional, Tuple
+
+from versioning import versions
+
+_MISSING = object()
+
+# The fields that contain a size in bytes. They are converted to a
+# human-readable size if unit normalization is requested.
+SIZE_FIELDS = frozenset(["size", "used", "available", "usercapacity"])
+
+SIZE_UNITS = ("B", "KiB", "MiB", "GiB", "TiB", "PiB", "EiB")
+
+
+def get_value(record: Dict[str, Any], path: str) -> Any:
+    """
+    Get the value of the specified field of a record. Nested fields
+    are addressed by a dotted path, e.g. `loadAverage.1min`.
+    """
+    value: Any = record
+    for key in path.split("."):
+        if not isinstance(value, dict) or key not in value:
+            return _MISSING
+        value = value[key]
+    return value
+
+
+def parse_sort(sort: Optional[str]) -> Tuple[Optional[str], str]:
+    """
+    Parse a sort expression like `name` or `-size` into the field name
+    and the openmediavault sort direction.
+    """
+    if not sort:
+        return None, "ASC"
+    if sort.startswith("-"):
+        return sort[1:], "DESC"
+    return sort.lstrip("+"), "ASC"
+
+
+def parse_filter(filter: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Parse a filter expression like `name=foo,shell=/bin/bash` as used
+    in resource URI query strings.
+    """
+    if not filter:
+        return None
+    result = {}
+    for expr in filter.split(","):
+        key, sep, value = expr.partition("=")
+        if sep and key.strip():
+            result[key.strip()] = value.strip()
+    return result or None
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Parse a comma separated list of field names.
+    """
+    if not fields:
+        return None
+    return [field.strip() for field in fields.split(",") if field.strip()]
+
+
+def matches(record: Dict[str, Any], filter: Dict[str, Any]) -> bool:
+    """
+    Check whether a record matches all conditions of the filter. Strings
+    match case-insensitively as substring, lists match if they contain
+    the value, everything else must be equal.
+    """
+    for path, expected in filter.items():
+        value = get_value(record, path)
+        if value is _MISSING:
+            return False
+        if isinstance(value, list):
+            if expected not in value:
+                return False
+        elif isinstance(value, str):
+            if str(expected).lower() not in value.lower():
+                return False
+        elif isinstance(value, bool) and isinstance(expected, str):
+            if expected.lower() not in (str(value).lower(), str(int(value))):
+                return False
+        elif value != expected and str(value) != str(expected):
+            return False
+    return True
+
+
+def project(record: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """
+    Reduce a record to the specified fields. Fields that do not exist
+    are omitted.
+    """
+    result = {}
+    for path in fields:
+        value = get_value(record, path)
+        if value is not _MISSING:
+            result[path] = value
+    return result
+
+
+def format_size(value: Any) -> Any:
+    """
+    Convert a size in bytes, given as number or numeric string, into a
+    human-readable size like `3.64 TiB`. Other values are returned as is.
+    """
+    if isinstance(value, bool):
+        return value
+    try:
+        size = float(value)
+    except (TypeError, ValueError):
+        return value
+    unit = 0
+    while abs(size) >= 1024 and unit < len(SIZE_UNITS) - 1:
+        size /= 1024
+        unit += 1
+    return (
+        f"{size:.0f} {SIZE_UNITS[unit]}"
+        if unit == 0
+        else f"{size:.2f} {SIZE_UNITS[unit]}"
+    )
+
+
+def tabulate(
+    records: List[Any],
+    columns: Optional[List[str]] = None,
+    human_readable: bool = False,
+) -> Dict[str, Any]:
+    """
+    Encode records as a table, i.e. the column names once plus a row of
+    values per record, instead of repeating the keys in every record.
+
+    Args:
+        records: The records to encode.
+        columns: The columns of the table, nested fields are addressed by
+            a dotted path. Defaults to all fields of the records.
+        human_readable: Convert sizes in bytes into human-readable sizes,
+            see `SIZE_FIELDS`.
+
+    Returns:
+        A dictionary with the `columns` and the `rows`. Missing values
+        are `None`.
+    """
+    if not columns:
+        columns = list(
+            dict.fromkeys(
+                key for record in records if isinstance(record, dict) for key in record
+            )
+        )
+    convert = [
+        format_size
+        if human_readable and path.rpartition(".")[2] in SIZE_FIELDS
+        else None
+        for path in columns
+    ]
+    rows = []
+    for record in records:
+        row = []
+        for path, fn in zip(columns, convert):
+            value = get_value(record, path) if isinstance(record, dict) else _MISSING
+            if value is _MISSING:
+                value = None
+            elif fn is not None:
+                value = fn(value)
+            row.append(value)
+        rows.append(row)
+    return {"columns": columns, "rows": rows}
+
+
+def to_table(
+    result: Dict[str, Any],
+    columns: Optional[List[str]] = None,
+    human_readable: bool = False,
+) -> Dict[str, Any]:
+    """
+    Encode the records of a list result, or of its delta, as tables.
+    See `tabulate`.
+    """
+    result = dict(result)
+    if "data" in result:
+        result["data"] = tabulate(result["data"], columns, human_readable)
+    if "delta" in result:
+        delta = dict(result["delta"])
+        for key in ("added", "modified"):
+            delta[key] = tabulate(delta[key], columns, human_readable)
+        result["delta"] = delta
+    return result
+
+
+async def query_list(
+    client: Any,
+    service: str,
+    method: str,
+    start: int = 0,
+    limit: Optional[int] = None,
+    sort: Optional[str] = None,
+    filter: Optional[Dict[str, Any]] = None,
+    fields: Optional[List[str]] = None,
+    params: Optional[Dict[str, Any]] = None,
+    if_changed_since: Optional[str] = None,
+    output: str = "records",
+    columns: Optional[List[str]] = None,
+    human_readable: bool = False,
+) -> Dict[str, Any]:
+    """
+    Query an openmediavault list RPC. Paging and sorting are mapped onto
+    the native `start`, `limit`, `sortfield` and `sortdir` parameters of
+    the RPC. If a filter is given, the whole list is fetched and paging
+    is done locally after the records have been filtered. Filtering and
+    projection are applied to the records of the cached full list.
+
+    Args:
+        client: The RPC client to use.
+        service: The name of the RPC service.
+        method: The name of the RPC method.
+        start: The index of the first record to return.
+        limit: The maximum number of records to return, `None` or a
+            negative value return all records.
+        sort: The field to sort by, prefix with `-` to sort descending.
+        filter: The conditions the records must match, see `matches`.
+        fields: The fields to return for each record.
+        params: Additional RPC parameters.
+        if_changed_since: The version of a previous result of the
+            same query, see `VersionStore.apply`.
+        output: `records` to return the records as they are, `table`
+            to encode them as table, see `tabulate`.
+        columns: The default columns in `table` output mode if no
+            fields are given.
+        human_readable: Convert sizes into human-readable sizes in
+            `table` output mode.
+
+    Returns:
+        A dictionary with the `total` number of matching records, the
+        requested page of records as `data` and the content `version`.
+        If `if_changed_since` is given, either only the information that
+        nothing has changed or the delta to that version is returned.
+    """
+    if output not in ("records", "table"):
+        raise ValueError(f"Unknown output mode '{output}'")
+    if output == "table" and not fields:
+        fields = columns
+
+    start = max(int(start or 0), 0)
+    limit = -1 if limit is None or limit < 0 else int(limit)
+    sortfield, sortdir = parse_sort(sort)
+
+    def transform(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if filter and not matches(record, filter):
+            return None
+        return project(record, fields) if fields else record
+
+    rpc_params: Dict[str, Any] = dict(params or {})
+    if sortfield:
+        rpc_params |= {"sortfield": sortfield, "sortdir": sortdir}
+    if filter:
+        rpc_params |= {"start": 0, "limit": -1}
+    else:
+        rpc_params |= {"start": start, "limit": limit}
+
+    # The records are filtered and projected by the RPC client, the
+    # full list is cached and shared by identical concurrent requests.
+    resp = await client.arequest(
+        service,
+        method,
+        rpc_params,
+        transform=transform if filter or fields else None,
+    )
+    if isinstance(resp, dict):
+        data, total = resp.get("data") or [], resp.get("total")
+    else:
+        data, total = resp or [], None
+        if filter or fields:
+            data = [r for r in map(transform, data) if r is not None]
+
+    if filter:
+        total = len(data)
+        data = data[start:] if limit < 0 else data[start : start + limit]
+    if total is None:
+        total = len(data)
+
+    query = {
+        "host": client.name,
+        "service": service,
+        "method": method,
+        "params": rpc_params,
+        "filter": filter,
+        "fields": fields,
+        "start": start,
+        "limit": limit,
+    }
+    result = versions.apply({"total": total, "data": data}, if_changed_since, query)
+    if output == "table":
+        result = to_table(result, fields, human_readable)
+    return result
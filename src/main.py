@@ -21,23 +21,23 @@
 import logging
 import sys
 
-import uvicorn
-from starlette.middleware import Middleware
-from starlette.middleware.cors import CORSMiddleware
-
+import tracing
 from config import config
+from health import health
 from server import server
+from sharedcache import shared_cache
 
 # After the server has been initialized, import the resource and tools.
 import prompts  # noqa: F401, isort: skip
 import resources  # noqa: F401, isort: skip
 import tools  # noqa: F401, isort: skip
 
-logging.basicConfig(
+tracing.setup_logging(
     level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    fmt="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
 )
 logger = logging.getLogger(__name__)
+health.mark("imports")
 
 
 def main():
@@ -49,20 +49,30 @@ def main():
         transport: str = config.get("server.transport")
 
         if transport in ["http", "streamable-http"]:
-            server_app = server.http_app(
-                middleware=[
-                    Middleware(
-                        CORSMiddleware,
-                        allow_credentials=True,
-                        allow_headers=["*"],
-                        allow_methods=["*"],
-                        allow_origins=["*"],
-                        expose_headers=["mcp-session-id"],
-                    )
-                ],
-                transport=transport,
-            )
-            uvicorn.run(server_app, host=host, port=port)
+            # Only needed by the HTTP transport, imported here to keep
+            # the startup of the stdio transport fast.
+            import uvicorn
+
+            from app import create_app, stateless, workers
+
+            if workers() > 1:
+                if shared_cache is not None:
+                    shared_cache.reset()
+                logger.info(
+                    f"Starting {workers()} workers, stateless={stateless()},"
+                    f" shared cache={shared_cache.path if shared_cache else None}"
+                )
+                # The workers are started as new processes, each of them
+                # imports the application and has its own sessions.
+                uvicorn.run(
+                    "app:create_app",
+                    factory=True,
+                    host=host,
+                    port=port,
+                    workers=workers(),
+                )
+            else:
+                uvicorn.run(create_app(), host=host, port=port)
         else:
             server.run(transport="stdio")
 
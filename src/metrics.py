@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of openmediavault.
+#
+# @license   https://www.gnu.org/licenses/gpl.html GPL Version 3
+# @author    Volker Theile <volker.theile@openmediavault.org>
+# @copyright Copyright (c) 2025 Volker Theile
+#
+# openmediavault is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# openmediavault is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with openmediavault. If not, see <https://www.gnu.org/licenses/>.
+import bisect
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from fastmcp.resources.template import build_regex
+from fastmcp.server.middleware import CallNext, Middleware, MiddlewareContext
+
+LabelValues = Tuple[str, ...]
+
+DURATION_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """
+    The base class of all metrics. The values are recorded in a shard
+    per thread, so recording a value never needs a lock. The shards
+    are only merged when the metrics are collected.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+            return shard
+
+    def _merged(self) -> Dict[LabelValues, float]:
+        result: Dict[LabelValues, float] = {}
+        for shard in list(self._shards):
+            for key, value in list(shard.items()):
+                result[key] = result.get(key, 0) + value
+        return result
+
+    def _header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+
+    def expose(self) -> List[str]:
+        lines = self._header()
+        for key, value in sorted(self._merged().items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Iterable[str] = (),
+        buckets: Iterable[float] = DURATION_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labels: str) -> None:
+        shard = self._shard()
+        entry = shard.get(labels)
+        if entry is None:
+            # The bucket counters, followed by the sum and the count.
+            entry = shard[labels] = [0] * (len(self.buckets) + 2)
+        entry[bisect.bisect_left(self.buckets, value)] += 1
+        entry[-2] += value
+        entry[-1] += 1
+
+    def expose(self) -> List[str]:
+        merged: Dict[LabelValues, List[float]] = {}
+        for shard in list(self._shards):
+            for key, entry in list(shard.items()):
+                total = merged.setdefault(key, [0] * len(entry))
+                for i, value in enumerate(entry):
+                    total[i] += value
+        lines = self._header()
+        names = (*self.labels, "le")
+        for key, entry in sorted(merged.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), entry[:-2]):
+                cumulative += count
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(names, (*key, bound))} {cumulative}"
+                )
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {entry[-2]}")
+            lines.append(f"{self.name}_count{labels} {entry[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        self._collectors: List[Callable[[], Iterable[Metric]]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labels=()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels=()) -> Gauge:
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labels=(),
+        buckets: Optional[Iterable[float]] = None,
+    ) -> Histogram:
+        return self.register(
+            Histogram(name, documentation, labels, buckets or DURATION_BUCKETS)
+        )
+
+    def add_collector(self, collector: Callable[[], Iterable[Metric]]) -> None:
+        """
+        Add a function that is called on every scrape to create metrics
+        from state that is maintained elsewhere, e.g. cache statistics.
+        """
+        self._collectors.append(collector)
+
+    def expose(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.expose())
+        for collector in self._collectors:
+            for metric in collector():
+                lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+TOOL_DURATION = registry.histogram(
+    "omv_mcp_tool_duration_seconds", "Duration of MCP tool calls.", ["tool"]
+)
+TOOL_ERRORS = registry.counter(
+    "omv_mcp_tool_errors_total", "Number of failed MCP tool calls.", ["tool"]
+)
+RESOURCE_DURATION = registry.histogram(
+    "omv_mcp_resource_duration_seconds",
+    "Duration of MCP resource reads.",
+    ["resource"],
+)
+RESOURCE_ERRORS = registry.counter(
+    "omv_mcp_resource_errors_total",
+    "Number of failed MCP resource reads.",
+    ["resource"],
+)
+IN_FLIGHT = registry.gauge(
+    "omv_mcp_in_flight",
+    "Number of MCP requests and RPCs that are currently processed.",
+    ["kind"],
+)
+RPC_DURATION = registry.histogram(
+    "omv_mcp_rpc_duration_seconds",
+    "Duration of the RPCs to openmediavault.",
+    ["host", "service", "method"],
+)
+RPC_ERRORS = registry.counter(
+    "omv_mcp_rpc_errors_total",
+    "Number of failed RPCs to openmediavault.",
+    ["host", "service", "method"],
+)
+RPC_REQUEST_SIZE = registry.histogram(
+    "omv_mcp_rpc_request_size_bytes",
+    "Size of the RPC request bodies.",
+    ["host", "service", "method"],
+    SIZE_BUCKETS,
+)
+RPC_RESPONSE_SIZE = registry.histogram(
+    "omv_mcp_rpc_response_size_bytes",
+    "Size of the RPC response bodies.",
+    ["host", "service", "method"],
+    SIZE_BUCKETS,
+)
+RPC_BYTES = registry.counter(
+    "omv_mcp_rpc_bytes_total",
+    "Number of bytes sent to and received from openmediavault on the wire, "
+    "i.e. before the response is decompressed.",
+    ["host", "direction", "encoding"],
+)
+RPC_CONNECTIONS = registry.counter(
+    "omv_mcp_rpc_connections_total",
+    "Number of HTTP connections that were opened to openmediavault.",
+    ["host"],
+)
+RPC_LOGINS = registry.counter(
+    "omv_mcp_rpc_logins_total",
+    "Number of openmediavault session logins.",
+    ["host", "type"],
+)
+SCHEDULER_WAIT = registry.histogram(
+    "omv_mcp_scheduler_wait_seconds",
+    "Time the RPCs waited for a slot of the scheduler.",
+    ["host", "priority"],
+)
+SCHEDULER_REJECTED = registry.counter(
+    "omv_mcp_scheduler_rejected_total",
+    "Number of RPCs that were rejected because the queue was full or the "
+    "circuit breaker was open.",
+    ["host", "priority", "reason"],
+)
+RPC_ABANDONED = registry.counter(
+    "omv_mcp_rpc_abandoned_total",
+    "Number of RPCs that were dropped from the queue or aborted in flight "
+    "because the MCP request was cancelled or its deadline passed.",
+    ["host", "reason", "stage"],
+)
+JOB_POLLS = registry.counter(
+    "omv_mcp_job_polls_total",
+    "Number of times the output of a background job was polled, by whether "
+    "there was new output, none, an error or the job failed.",
+    ["host", "result"],
+)
+
+
+class MetricsMiddleware(Middleware):
+    """
+    Record the duration and errors of the MCP tool calls and resource
+    reads. Resource reads are labeled with the URI of the resource, or
+    the URI template it matched, e.g. `data://storage/smart/{devicefile}`,
+    so that the number of time series stays bounded.
+    """
+
+    def __init__(self):
+        self._resources: Set[str] = set()
+        self._templates: Optional[List[Tuple[str, re.Pattern]]] = None
+
+    async def on_call_tool(self, context: MiddlewareContext, call_next: CallNext):
+        return await self._observe(
+            TOOL_DURATION, TOOL_ERRORS, context.message.name, context, call_next
+        )
+
+    async def on_read_resource(self, context: MiddlewareContext, call_next: CallNext):
+        return await self._observe(
+            RESOURCE_DURATION,
+            RESOURCE_ERRORS,
+            await self._resource_label(context),
+            context,
+            call_next,
+        )
+
+    async def _resource_label(self, context: MiddlewareContext) -> str:
+        # The resources are registered when the server is imported, so
+        # they are only looked up once.
+        if self._templates is None and context.fastmcp_context is not None:
+            server = context.fastmcp_context.fastmcp
+            self._resources = set(await server.get_resources())
+            self._templates = [
+                (template, build_regex(template))
+                for template in await server.get_resource_templates()
+            ]
+        uri = str(context.message.uri).partition("?")[0]
+        if uri in self._resources:
+            return uri
+        for template, regex in self._templates or ():
+            if regex.match(uri):
+                return template
+        return "unknown"
+
+    @staticmethod
+    async def _observe(
+        duration: Histogram,
+        errors: Counter,
+        label: str,
+        context: MiddlewareContext,
+        call_next: CallNext,
+    ):
+        start = time.perf_counter()
+        IN_FLIGHT.inc("mcp")
+        try:
+            return await call_next(context)
+        except BaseException:
+            errors.inc(label)
+            raise
+        finally:
+            IN_FLIGHT.dec("mcp")
+            duration.observe(time.perf_counter() - start, label)
@@ -18,48 +18,151 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with openmediavault. If not, see <https://www.gnu.org/licenses/>.
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
-from rpc import rpc
+from config import config
+from fleet import fleet
+from listing import parse_fields, parse_filter, query_list
 from server import server
+from snapshots import poller
+
+# The default refresh intervals in seconds of the resource snapshots,
+# they can be overridden via `snapshots.intervals` in the configuration.
+SNAPSHOT_INTERVALS: Dict[str, float] = {
+    "data://diagnostics/system-information": 10,
+    "data://storage/disks": 60,
+    "data://storage/filesystems": 30,
+    "data://storage/smart/devices": 300,
+}
+
+
+def _register_snapshot(uri: str, service: str, method: str, params: dict = None):
+    intervals = SNAPSHOT_INTERVALS | (config.get("snapshots.intervals", {}) or {})
+    poller.register(
+        uri,
+        lambda: fleet.get().arequest(service, method, params, use_cache=False),
+        float(intervals.get(uri, 0)),
+    )
+
+
+_register_snapshot("data://diagnostics/system-information", "System", "getInformation")
+_register_snapshot(
+    "data://storage/disks", "DiskMgmt", "getList", {"start": 0, "limit": -1}
+)
+_register_snapshot(
+    "data://storage/filesystems", "FileSystemMgmt", "getList", {"start": 0, "limit": -1}
+)
+_register_snapshot(
+    "data://storage/smart/devices", "Smart", "getList", {"start": 0, "limit": -1}
+)
 
 
 @server.resource("data://diagnostics/system-information", mime_type="application/json")
-def get_system_information() -> Dict[str, Any]:
+async def get_system_information() -> Dict[str, Any]:
     """
     Get system information, e.g. hostname, CPU model, CPU usage,
     memory usage, load average, date and time, version, uptime, etc.
 
     Returns:
         A dictionary containing the system information.
+        The `snapshot` entry tells when the data was refreshed the last
+        time and whether it is stale.
     """
-    return rpc.request("System", "getInformation")
+    return await poller.get("data://diagnostics/system-information")
 
 
 @server.resource("data://storage/disks", mime_type="application/json")
-def list_disks() -> Dict[str, Any]:
+async def list_disks() -> Dict[str, Any]:
     """
     List all available disks in the system.
 
     Returns:
         A dictionary containing the list of all available disks.
+        The `snapshot` entry tells when the data was refreshed the last
+        time and whether it is stale.
     """
-    return rpc.request("DiskMgmt", "getList", {"start": 0, "limit": -1})
+    return await poller.get("data://storage/disks")
+
+
+@server.resource(
+    "data://storage/disks{?start,limit,sort,filter,fields}",
+    mime_type="application/json",
+)
+async def list_disks_query(
+    start: int = 0,
+    limit: int = -1,
+    sort: Optional[str] = None,
+    filter: Optional[str] = None,
+    fields: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Query a page of the available disks, optionally sorted,
+    filtered and reduced to the given fields, e.g.
+    `data://storage/disks?limit=10&sort=-size&filter=model=Seagate&fields=devicefile,size`.
+
+    Returns:
+        A dictionary containing the total number of matching entries and
+        the requested page of entries.
+    """
+    return await query_list(
+        fleet.get(),
+        "DiskMgmt",
+        "getList",
+        start,
+        limit,
+        sort,
+        parse_filter(filter),
+        parse_fields(fields),
+    )
 
 
 @server.resource("data://storage/filesystems", mime_type="application/json")
-def list_filesystems() -> Dict[str, Any]:
+async def list_filesystems() -> Dict[str, Any]:
     """
     List all available filesystems in the system.
 
     Returns:
         A dictionary containing the list of all available filesystems.
+        The `snapshot` entry tells when the data was refreshed the last
+        time and whether it is stale.
     """
-    return rpc.request("FileSystemMgmt", "getList", {"start": 0, "limit": -1})
+    return await poller.get("data://storage/filesystems")
+
+
+@server.resource(
+    "data://storage/filesystems{?start,limit,sort,filter,fields}",
+    mime_type="application/json",
+)
+async def list_filesystems_query(
+    start: int = 0,
+    limit: int = -1,
+    sort: Optional[str] = None,
+    filter: Optional[str] = None,
+    fields: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Query a page of the available filesystems, optionally sorted,
+    filtered and reduced to the given fields, e.g.
+    `data://storage/filesystems?limit=10&sort=-percentage&filter=type=ext4&fields=devicefile,label,percentage`.
+
+    Returns:
+        A dictionary containing the total number of matching entries and
+        the requested page of entries.
+    """
+    return await query_list(
+        fleet.get(),
+        "FileSystemMgmt",
+        "getList",
+        start,
+        limit,
+        sort,
+        parse_filter(filter),
+        parse_fields(fields),
+    )
 
 
 @server.resource("data://storage/smart/devices", mime_type="application/json")
-def list_smart() -> Dict[str, Any]:
+async def list_smart() -> Dict[str, Any]:
     """
     List the SMART information and status of all available disks in
     the system.
@@ -67,14 +170,48 @@ def list_smart() -> Dict[str, Any]:
     Returns:
         A dictionary containing the list of all available disks and their
         SMART status and information.
+        The `snapshot` entry tells when the data was refreshed the last
+        time and whether it is stale.
+    """
+    return await poller.get("data://storage/smart/devices")
+
+
+@server.resource(
+    "data://storage/smart/devices{?start,limit,sort,filter,fields}",
+    mime_type="application/json",
+)
+async def list_smart_query(
+    start: int = 0,
+    limit: int = -1,
+    sort: Optional[str] = None,
+    filter: Optional[str] = None,
+    fields: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Query a page of the available disks and their SMART status, optionally sorted,
+    filtered and reduced to the given fields, e.g.
+    `data://storage/smart/devices?limit=10&sort=-temperature&filter=overallstatus=GOOD&fields=devicefile,model,temperature`.
+
+    Returns:
+        A dictionary containing the total number of matching entries and
+        the requested page of entries.
     """
-    return rpc.request("Smart", "getList", {"start": 0, "limit": -1})
+    return await query_list(
+        fleet.get(),
+        "Smart",
+        "getList",
+        start,
+        limit,
+        sort,
+        parse_filter(filter),
+        parse_fields(fields),
+    )
 
 
 @server.resource(
     "data://storage/smart/devices/details/{device_file}", mime_type="application/json"
 )
-def get_smart_identity(device_file: str) -> Dict[str, Any]:
+async def get_smart_identity(device_file: str) -> Dict[str, Any]:
     """
     Get the SMART information of the specified disk.
 
@@ -84,4 +221,23 @@ def get_smart_identity(device_file: str) -> Dict[str, Any]:
     Returns:
         A dictionary containing the SMART information.
     """
-    return rpc.request("Smart", "getInformation", {"devicefile": device_file})
+    return await fleet.get().arequest(
+        "Smart", "getInformation", {"devicefile": device_file}
+    )
+
+
+@server.resource("data://server/cache", mime_type="application/json")
+def get_cache_statistics() -> Dict[str, Any]:
+    """
+    Get the statistics of the RPC response cache of each host, e.g. the
+    number of cached entries, hits, misses and evictions, and the number
+    of RPCs that were coalesced with an identical in-flight request.
+
+    Returns:
+        A dictionary containing the cache statistics per host.
+    """
+    return {
+        name: fleet.get(name).cache.stats()
+        | {"coalesced": fleet.get(name).flights.shared}
+        for name in fleet.names
+    }
@@ -18,21 +18,528 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with openmediavault. If not, see <https://www.gnu.org/licenses/>.
-import json
+import asyncio
 import logging
+import random
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-import requests
+import httpx
 
-from config import config
-from utils import obfuscate
+import deadlines
+import fastjson
+import metrics
+import tracing
+from cache import TTLCache
+from scheduler import FlightPriority, Scheduler
+from sharedcache import SharedCache
+from singleflight import SingleFlight
+
+try:
+    import h2
+except ImportError:  # pragma: no cover
+    h2 = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
 
 logger = logging.getLogger(__name__)
 
+# The response encodings that are negotiated by default, in the order
+# of preference. Encodings whose decoder is not installed are skipped.
+COMPRESSION = ["br", "gzip"]
+
+# The default time-to-live in seconds of the cached responses of
+# read-only RPCs. Methods that are not listed here are never cached.
+# The values can be overridden via `rpc.cache.ttl` in the configuration.
+CACHE_TTLS: Dict[str, float] = {
+    "System.getInformation": 5,
+    "DiskMgmt.getList": 60,
+    "FileSystemMgmt.getList": 30,
+    "Smart.getList": 60,
+    "Smart.getInformation": 300,
+    "UserMgmt.getUserList": 60,
+    "UserMgmt.getUser": 60,
+    "UserMgmt.getGroupList": 60,
+    "UserMgmt.getGroup": 60,
+    "ShareMgmt.getList": 60,
+}
+
+# The services whose cached responses are dropped after a mutating
+# RPC of the given service succeeded. Services that are not listed
+# here only invalidate themselves, `None` invalidates everything.
+CACHE_INVALIDATES: Dict[str, Optional[List[str]]] = {
+    "System": None,
+    "DiskMgmt": ["DiskMgmt", "Smart", "FileSystemMgmt"],
+    "FileSystemMgmt": ["FileSystemMgmt", "DiskMgmt", "ShareMgmt"],
+    "UserMgmt": ["UserMgmt", "ShareMgmt"],
+    "ShareMgmt": ["ShareMgmt", "FileSystemMgmt"],
+}
+
+
+# The openmediavault error codes that tell that the session is not
+# valid (anymore), e.g. because it has expired.
+SESSION_ERROR_CODES = (5001, 5002)
+
+# The HTTP status codes that tell that rpc.php is not available, e.g.
+# while the web server is restarting. Other errors are RPC errors that
+# are reported by rpc.php itself.
+UNAVAILABLE_STATUS_CODES = (502, 503, 504)
+
+
+class ResponseTooLargeError(Exception):
+    pass
+
+
+class RPCError(httpx.HTTPStatusError):
+    """
+    An error that is reported by rpc.php itself, e.g. an invalid
+    parameter or a background process that failed.
+    """
+
+    def __init__(
+        self,
+        message: str,
+        code: Optional[int],
+        request: httpx.Request,
+        response: httpx.Response,
+    ):
+        super().__init__(message, request=request, response=response)
+        self.code = code
+
+
+def accept_encoding(encodings: Optional[List[str]] = None) -> str:
+    """
+    Build the `Accept-Encoding` header for the specified response
+    encodings. Encodings that can not be decoded because the required
+    package is not installed, e.g. `brotli` for `br`, are skipped.
+
+    Args:
+        encodings: The encodings in the order of preference, `None`
+            uses the defaults. An empty list disables compression.
+
+    Returns:
+        The value of the header.
+    """
+    available = {
+        "gzip": True,
+        "deflate": True,
+        "br": brotli is not None,
+        "zstd": zstandard is not None,
+    }
+    result = []
+    for encoding in COMPRESSION if encodings is None else encodings:
+        if available.get(encoding):
+            result.append(encoding)
+        elif encoding not in available:
+            raise ValueError(f"Unknown response encoding '{encoding}'")
+        elif encodings is not None:
+            logger.warning(
+                f"The response encoding '{encoding}' is not supported, the required package is not installed"
+            )
+    return ", ".join(result) or "identity"
+
+
+def is_list_method(method: str) -> bool:
+    """
+    Check whether the specified RPC method returns a list of records
+    like `{"total": 2, "data": [...]}`, e.g. `getList`, `getUserList`.
+    """
+    return method.startswith("get") and method.endswith("List")
+
+
+def is_read_only(service: str, method: str) -> bool:
+    """
+    Check whether the specified RPC does not modify the system. This
+    is derived from the naming conventions of the openmediavault RPC
+    services, e.g. `getList`, `enumerateDevices` or `isRunning`.
+    """
+    return service == "session" or method.startswith(("get", "enumerate", "is"))
+
+
+class RPCSession:
+    """
+    An openmediavault session. Each session has its own cookie jar, but
+    all sessions of a host share the same HTTP connection pool.
+    """
+
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport,
+        timeout: httpx.Timeout,
+        headers: Dict[str, str],
+    ):
+        self.client = httpx.AsyncClient(
+            transport=transport, timeout=timeout, headers=headers
+        )
+        self.authenticated = False
+
 
 class RPC:
-    def __init__(self, url: str):
-        self._url = url.rstrip("/")
-        self._session = requests.Session()
+    def __init__(
+        self,
+        url: str,
+        timeout: float = 30.0,
+        max_connections: int = 10,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 30.0,
+        cache_maxsize: int = 256,
+        cache_ttls: Optional[Dict[str, float]] = None,
+        sessions: int = 4,
+        name: str = "default",
+        max_response_size: int = 0,
+        connect_timeout: Optional[float] = None,
+        read_timeout: Optional[float] = None,
+        compression: Optional[List[str]] = None,
+        http2: bool = False,
+        verify: Union[bool, str] = False,
+        login_retries: int = 3,
+        login_backoff: float = 0.5,
+        shared: Optional[SharedCache] = None,
+        scheduler: Optional[Scheduler] = None,
+    ):
+        self.name = name
+        # The maximum size of a response body in bytes, 0 means unlimited.
+        self._max_response_size = max(int(max_response_size), 0)
+        self._url = (url or "").rstrip("/")
+        self._timeout = httpx.Timeout(
+            timeout, connect=connect_timeout or timeout, read=read_timeout or timeout
+        )
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._headers = {"Accept-Encoding": accept_encoding(compression)}
+        if http2 and h2 is None:
+            logger.warning("HTTP/2 requires the 'h2' package, falling back to HTTP/1.1")
+        self._http2 = http2 and h2 is not None
+        self._verify = verify
+        # The synchronous session is kept for callers that do not run
+        # inside an event loop, e.g. scripts or the stdio transport. It
+        # is created on first use, `requests` is not imported otherwise.
+        self._session = None
+        # The pool of asynchronous sessions is created lazily, so that it
+        # is bound to the event loop of the caller. rpc.php serializes
+        # the requests of a session, so several independent sessions are
+        # used to process concurrent requests in parallel.
+        self._transport: Optional[httpx.AsyncHTTPTransport] = None
+        self._num_sessions = max(int(sessions), 1)
+        # Decides which RPC is sent next, by default at most one per
+        # session is sent at a time.
+        self.scheduler = scheduler or Scheduler(name, self._num_sessions)
+        self._sessions: List[RPCSession] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self._credentials: Optional[Tuple[str, str]] = None
+        self._login_lock = asyncio.Lock()
+        self._login_retries = max(int(login_retries), 0)
+        self._login_backoff = max(float(login_backoff), 0.0)
+        self.logins = 0
+        self.relogins = 0
+        # The outcome of the last RPCs, to tell whether the host is
+        # reachable without sending a request.
+        self.last_success: Optional[float] = None
+        self.last_failure: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.cache = TTLCache(cache_maxsize)
+        self.flights = SingleFlight()
+        self._cache_ttls = CACHE_TTLS | (cache_ttls or {})
+        self._generations: Dict[str, int] = {}
+        # The cache that is shared with the other worker processes. The
+        # local cache is kept in front of it, the generations of the
+        # services are taken from it.
+        self.shared = shared
+
+    @property
+    def url(self) -> str:
+        return self._url
+
+    @property
+    def reachable(self) -> Optional[bool]:
+        """
+        Whether the last RPC reached the host, `None` if no RPC has been
+        sent yet.
+        """
+        if self.last_success is None and self.last_failure is None:
+            return None
+        return (self.last_success or 0) >= (self.last_failure or 0)
+
+    def session_stats(self) -> Dict[str, int]:
+        idle = 0 if self._idle is None else self._idle.qsize()
+        authenticated = sum(1 for session in self._sessions if session.authenticated)
+        return {
+            "idle": idle,
+            "busy": len(self._sessions) - idle,
+            "authenticated": authenticated,
+        }
+
+    def state(self) -> Dict[str, Any]:
+        """
+        Get the reachability, session and cache state of the host, e.g.
+        for the health endpoints.
+        """
+        return {
+            "url": self._url,
+            "reachable": self.reachable,
+            "last_success": self.last_success,
+            "last_failure": self.last_failure,
+            "last_error": self.last_error,
+            "sessions": self.session_stats(),
+            "scheduler": self.scheduler.stats(),
+            "logins": self.logins,
+            "cache_entries": self.cache.stats()["size"],
+        }
+
+    def _create_session(self):
+        # Imported here, the asynchronous client does not need it.
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        session.headers.update(self._headers)
+        session.verify = self._verify
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=self._limits.max_connections or 10
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _create_pool(self) -> None:
+        self._transport = httpx.AsyncHTTPTransport(
+            limits=self._limits, verify=self._verify, http2=self._http2
+        )
+        self._sessions = [
+            RPCSession(self._transport, self._timeout, self._headers)
+            for _ in range(self._num_sessions)
+        ]
+        self._idle = asyncio.Queue()
+        for session in self._sessions:
+            self._idle.put_nowait(session)
+
+    async def _acquire(self) -> RPCSession:
+        if self._idle is None:
+            self._create_pool()
+        return await self._idle.get()
+
+    def _release(self, session: RPCSession) -> None:
+        # Sessions of a pool that has been closed in the meantime are
+        # simply dropped.
+        if session in self._sessions:
+            self._idle.put_nowait(session)
+
+    @staticmethod
+    def _encode(service: str, method: str, params: dict = None) -> bytes:
+        return fastjson.dumps({"service": service, "method": method, "params": params})
+
+    @staticmethod
+    def _decode(resp: any) -> any:
+        if isinstance(resp, dict) and "response" in resp:
+            resp = resp["response"]
+        return resp
+
+    @staticmethod
+    def _transform(result: Any, transform: fastjson.RecordTransform) -> Any:
+        # Apply the transform to the records of a (cached) list result
+        # without modifying it.
+        if not isinstance(result, dict) or not isinstance(result.get("data"), list):
+            return result
+        data = []
+        for record in result["data"]:
+            record = transform(record)
+            if record is not None:
+                data.append(record)
+        return result | {"data": data}
+
+    def _timeout_for(self, timeout: Optional[float]) -> httpx.Timeout:
+        return self._timeout if timeout is None else httpx.Timeout(timeout)
+
+    def _count_bytes(self, sent: int, received: int, encoding: str) -> None:
+        metrics.RPC_BYTES.inc(self.name, "sent", "identity", amount=sent)
+        metrics.RPC_BYTES.inc(self.name, "received", encoding, amount=received)
+
+    async def _trace(self, event: str, info: Dict[str, Any]) -> None:
+        # Called by httpcore, new connections tell how well the
+        # keep-alive connections are reused.
+        if event == "connection.connect_tcp.complete":
+            metrics.RPC_CONNECTIONS.inc(self.name)
+
+    def _check_size(self, size: int) -> None:
+        if self._max_response_size and size > self._max_response_size:
+            raise ResponseTooLargeError(
+                f"The response exceeds the maximum size of {self._max_response_size} bytes"
+            )
+
+    @staticmethod
+    def _create_decoder(
+        status_code: int, transform: Optional[fastjson.RecordTransform]
+    ) -> Optional[fastjson.ListStreamDecoder]:
+        # Only a transformed list is decoded while it is received, so the
+        # full list is never materialized. Other responses are buffered
+        # and decoded at once, which is much faster with orjson.
+        if status_code < 400 and transform is not None:
+            return fastjson.ListStreamDecoder(transform)
+        return None
+
+    @staticmethod
+    def _finish(
+        decoder: Optional[fastjson.ListStreamDecoder],
+        chunks: List[bytes],
+        status_code: int,
+    ) -> Any:
+        try:
+            if decoder is not None:
+                return decoder.close()
+            return fastjson.loads(b"".join(chunks))
+        except ValueError:
+            # The body of an error response is not necessarily JSON.
+            if status_code < 400:
+                raise
+            return None
+
+    @staticmethod
+    def _cache_key(service: str, method: str, params: dict = None) -> tuple:
+        return (service, method, fastjson.dumps(params, sort_keys=True))
+
+    def _shared_key(self, key: tuple) -> str:
+        service, method, params = key
+        return f"rpc:{self.name}:{service}.{method}:{params.decode()}"
+
+    def _cache_lookup(self, service: str, method: str, params: dict = None) -> tuple:
+        if self._cache_ttls.get(f"{service}.{method}", 0) <= 0:
+            return False, None
+        self._sync_generations()
+        key = self._cache_key(service, method, params)
+        found, result = self.cache.get(key)
+        if found or self.shared is None:
+            return found, result
+        found, result, ttl = self.shared.get(self._shared_key(key))
+        if found:
+            self.cache.set(key, result, ttl)
+        return found, result
+
+    async def _acache_lookup(
+        self, service: str, method: str, params: dict = None
+    ) -> tuple:
+        # The shared cache is looked up without blocking the event loop.
+        if self._cache_ttls.get(f"{service}.{method}", 0) <= 0:
+            return False, None
+        self._sync_generations()
+        key = self._cache_key(service, method, params)
+        found, result = self.cache.get(key)
+        if found or self.shared is None:
+            return found, result
+        found, result, ttl = await self.shared.aget(self._shared_key(key))
+        if found:
+            self.cache.set(key, result, ttl)
+        return found, result
+
+    def _sync_generations(self) -> None:
+        """
+        Take over the generations of the shared cache. The local cache
+        entries of the services that have been invalidated by another
+        worker in the meantime are dropped.
+        """
+        if self.shared is None:
+            return
+        generations = self.shared.generations(self.name)
+        if generations == self._generations:
+            return
+        changed = {
+            name
+            for name in generations.keys() | self._generations.keys()
+            if generations.get(name, 0) != self._generations.get(name, 0)
+        }
+        self._generations = generations
+        self.cache.invalidate(lambda key: "*" in changed or key[0] in changed)
+
+    def generation(self, service: str) -> int:
+        """
+        Get the generation of the specified service. It is increased
+        whenever a mutating RPC succeeded that invalidates the service,
+        see `CACHE_INVALIDATES`, so state derived from the service can
+        tell whether it is outdated.
+        """
+        self._sync_generations()
+        return self._generations.get(service, 0) + self._generations.get("*", 0)
+
+    def _cache_update(
+        self,
+        service: str,
+        method: str,
+        params: dict,
+        result: any,
+        generation: Optional[int] = None,
+        background: bool = False,
+    ) -> None:
+        ttl = self._cache_ttls.get(f"{service}.{method}", 0)
+        if ttl > 0:
+            # A read that was sent before a mutation of its service
+            # finished might return the old state, it must not replace
+            # the entries the mutation dropped.
+            if generation is not None and self.generation(service) != generation:
+                logger.debug(
+                    f"RPC cache: not caching {service}.{method}, "
+                    "it was invalidated in the meantime"
+                )
+                return
+            key = self._cache_key(service, method, params)
+            self.cache.set(key, result, ttl)
+            if self.shared is None:
+                return
+            args = (self._shared_key(key), result, ttl, self.name, service, generation)
+            if background:
+                self.shared.aset(*args)
+            else:
+                self.shared.set(*args)
+        elif not is_read_only(service, method):
+            services = CACHE_INVALIDATES.get(service, [service])
+            if self.shared is not None:
+                self.shared.invalidate(self.name, services)
+                self._sync_generations()
+                return
+            for name in ["*"] if services is None else services:
+                self._generations[name] = self._generations.get(name, 0) + 1
+            dropped = self.cache.invalidate(
+                lambda key: services is None or key[0] in services
+            )
+            if dropped > 0:
+                logger.debug(
+                    f"RPC cache: {service}.{method} invalidated {dropped} entries"
+                )
+
+    async def _acache_update(
+        self,
+        service: str,
+        method: str,
+        params: dict,
+        result: any,
+        generation: Optional[int] = None,
+    ) -> None:
+        # Responses are stored in the shared cache in the background, a
+        # mutating RPC waits until the other workers can see that it
+        # invalidated their entries.
+        if (
+            self.shared is not None
+            and self._cache_ttls.get(f"{service}.{method}", 0) <= 0
+            and not is_read_only(service, method)
+        ):
+            await self.shared.ainvalidate(
+                self.name, CACHE_INVALIDATES.get(service, [service])
+            )
+            self._sync_generations()
+            return
+        self._cache_update(service, method, params, result, generation, background=True)
 
     def login(self, username: str, password: str) -> None:
         _ = self.request(
@@ -41,29 +548,481 @@ class RPC:
 
     def logout(self) -> None:
         _ = self.request("session", "logout", check_status=False)
-        self._session = requests.Session()
+        self._session = None
+        self.cache.clear()
 
     def request(
-        self, service: str, method: str, params: dict = None, check_status: bool = True
+        self,
+        service: str,
+        method: str,
+        params: dict = None,
+        check_status: bool = True,
+        timeout: Optional[float] = None,
+        use_cache: bool = True,
     ) -> any:
-        logger.info(
-            f"RPC request: Service={service}, Method={method}, Params={obfuscate(params, ['password', 'pwd'])}"
+        with tracing.span(
+            "rpc", host=self.name, service=service, method=method, params=params
+        ) as span:
+            if use_cache:
+                found, result = self._cache_lookup(service, method, params)
+                if found:
+                    span.set(cache="hit")
+                    return result
+
+            labels = (self.name, service, method)
+            generation = self.generation(service)
+            start = time.perf_counter()
+            try:
+                data = self._encode(service, method, params)
+                if self._session is None:
+                    self._session = self._create_session()
+                resp = self._session.post(
+                    self._url,
+                    data=data,
+                    timeout=timeout or (self._timeout.connect, self._timeout.read),
+                    stream=True,
+                )
+                with resp:
+                    self._check_size(int(resp.headers.get("content-length") or 0))
+                    decoder = self._create_decoder(resp.status_code, None)
+                    chunks: List[bytes] = []
+                    size = 0
+                    for chunk in resp.iter_content(65536):
+                        size += len(chunk)
+                        self._check_size(size)
+                        if decoder is not None:
+                            decoder.feed(chunk)
+                        else:
+                            chunks.append(chunk)
+                    # The raw stream tells the number of bytes that
+                    # were received before decompression.
+                    self._count_bytes(
+                        len(data),
+                        resp.raw.tell(),
+                        resp.headers.get("content-encoding", "identity"),
+                    )
+                span.set(
+                    status_code=resp.status_code,
+                    request_bytes=len(data),
+                    response_bytes=size,
+                )
+                metrics.RPC_REQUEST_SIZE.observe(len(data), *labels)
+                metrics.RPC_RESPONSE_SIZE.observe(size, *labels)
+                if check_status:
+                    resp.raise_for_status()
+            except BaseException:
+                metrics.RPC_ERRORS.inc(*labels)
+                raise
+            finally:
+                metrics.RPC_DURATION.observe(time.perf_counter() - start, *labels)
+
+            result = self._decode(self._finish(decoder, chunks, resp.status_code))
+            if resp.status_code < 400:
+                self._cache_update(service, method, params, result, generation)
+            return result
+
+    def set_credentials(self, username: str, password: str) -> None:
+        """
+        Remember the credentials without logging in. Every session is
+        logged in lazily before it sends its first RPC, so that an
+        unreachable host does not delay the startup.
+        """
+        self._credentials = (username, password)
+
+    async def alogin(self, username: str, password: str) -> None:
+        """
+        Log in all sessions of the pool. The credentials are remembered
+        to transparently log in again if a session has expired.
+        """
+        self.set_credentials(username, password)
+        if self._idle is None:
+            self._create_pool()
+        await asyncio.gather(*(self._login(session) for session in self._sessions))
+
+    async def alogout(self) -> None:
+        sessions, transport = self._sessions, self._transport
+        self._sessions, self._transport, self._idle = [], None, None
+        self._credentials = None
+        try:
+            await asyncio.gather(
+                *(
+                    self._post(session, "session", "logout")
+                    for session in sessions
+                    if session.authenticated
+                ),
+                return_exceptions=True,
+            )
+        finally:
+            # The sessions share the transport, so it is closed only once.
+            if transport is not None:
+                await transport.aclose()
+            self.cache.clear()
+
+    async def _login(self, session: RPCSession, kind: str = "login") -> None:
+        username, password = self._credentials
+        with tracing.span("login", host=self.name, kind=kind, username=username):
+            resp = await self._post(
+                session,
+                "session",
+                "login",
+                {"username": username, "password": password},
+            )
+            resp.raise_for_status()
+        session.authenticated = True
+        self.logins += 1
+        metrics.RPC_LOGINS.inc(self.name, kind)
+
+    @staticmethod
+    def _is_transient(error: Exception) -> bool:
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code in UNAVAILABLE_STATUS_CODES
+        return isinstance(error, httpx.TransportError)
+
+    async def _lazy_login(self, session: RPCSession) -> None:
+        """
+        Log in a session that has not been logged in yet. Transport
+        errors and the responses of an unavailable rpc.php are retried
+        with an exponential backoff, e.g. while it is restarting.
+        """
+        async with self._login_lock:
+            attempt = 0
+            while not session.authenticated:
+                try:
+                    await self._login(session, "lazy")
+                except Exception as e:
+                    if attempt >= self._login_retries or not self._is_transient(e):
+                        raise
+                    delay = self._login_backoff * 2**attempt
+                    attempt += 1
+                    logger.warning(
+                        f"Failed to log in to host '{self.name}', retrying in "
+                        f"{delay:.1f}s ({attempt}/{self._login_retries}): {e}"
+                    )
+                    await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+
+    async def _relogin(self, session: RPCSession) -> None:
+        # Log in one session after the other, so that a burst of
+        # expired sessions does not cause a login stampede.
+        async with self._login_lock:
+            session.authenticated = False
+            session.client.cookies.clear()
+            await self._login(session, "relogin")
+            self.relogins += 1
+
+    async def _post(
+        self,
+        session: RPCSession,
+        service: str,
+        method: str,
+        params: dict = None,
+        timeout: Optional[float] = None,
+    ) -> httpx.Response:
+        resp = await session.client.post(
+            self._url,
+            content=self._encode(service, method, params),
+            timeout=self._timeout_for(timeout),
+            extensions={"trace": self._trace},
+        )
+        self._count_bytes(
+            len(resp.request.content),
+            resp.num_bytes_downloaded,
+            resp.headers.get("content-encoding", "identity"),
         )
+        return resp
+
+    async def _exchange(
+        self,
+        session: RPCSession,
+        service: str,
+        method: str,
+        params: dict = None,
+        timeout: Optional[float] = None,
+        transform: Optional[fastjson.RecordTransform] = None,
+    ) -> Tuple[httpx.Response, Any, int]:
+        """
+        Post the RPC and decode the response. If a transform is given,
+        the records of a list response are decoded one by one and passed
+        through it as they arrive, so a large response is never held in
+        memory as a whole. Otherwise the body is buffered and decoded at
+        once. The maximum response size is enforced while receiving.
 
-        resp = self._session.post(
+        Returns:
+            The response, the decoded document and the size of the
+            response body in bytes.
+        """
+        request = session.client.build_request(
+            "POST",
             self._url,
-            data=json.dumps({"service": service, "method": method, "params": params}),
-            verify=False,
+            content=self._encode(service, method, params),
+            timeout=self._timeout_for(timeout),
+            extensions={"trace": self._trace},
         )
+        resp = await session.client.send(request, stream=True)
+        try:
+            self._check_size(int(resp.headers.get("content-length") or 0))
+            decoder = self._create_decoder(resp.status_code, transform)
+            chunks: List[bytes] = []
+            size = 0
+            async for chunk in resp.aiter_bytes():
+                size += len(chunk)
+                self._check_size(size)
+                if decoder is not None:
+                    decoder.feed(chunk)
+                else:
+                    chunks.append(chunk)
+        finally:
+            await resp.aclose()
+            self._count_bytes(
+                len(request.content),
+                resp.num_bytes_downloaded,
+                resp.headers.get("content-encoding", "identity"),
+            )
+        return resp, self._finish(decoder, chunks, resp.status_code), size
 
-        if check_status:
-            resp.raise_for_status()
+    @staticmethod
+    def _raise_for_status(resp: httpx.Response, document: Any) -> None:
+        # Prefer the error message of rpc.php over the HTTP status line.
+        error = document.get("error") if isinstance(document, dict) else None
+        if resp.status_code >= 400 and isinstance(error, dict) and error.get("message"):
+            raise RPCError(
+                error["message"], error.get("code"), request=resp.request, response=resp
+            )
+        resp.raise_for_status()
 
-        resp = resp.json()
-        if isinstance(resp, dict) and "response" in resp:
-            resp = resp["response"]
+    @staticmethod
+    def _is_session_error(status_code: int, document: Any) -> bool:
+        if status_code == 401:
+            return True
+        if status_code < 400 or not isinstance(document, dict):
+            return False
+        error = document.get("error") or {}
+        return isinstance(error, dict) and error.get("code") in SESSION_ERROR_CODES
 
-        return resp
+    async def arequest(
+        self,
+        service: str,
+        method: str,
+        params: dict = None,
+        check_status: bool = True,
+        timeout: Optional[float] = None,
+        use_cache: bool = True,
+        transform: Optional[fastjson.RecordTransform] = None,
+    ) -> any:
+        """
+        Execute the RPC without blocking the event loop. Each request
+        is executed with a session of the pool, the HTTP connections are
+        taken from a bounded keep-alive pool that is shared by all
+        sessions. Expired sessions are logged in again transparently.
+
+        The responses of read-only RPCs are served from the cache while
+        they are fresh, successful mutating RPCs drop the cached
+        responses of the affected services. Set `use_cache` to `False`
+        to always query the server.
+
+        Identical read-only RPCs that are issued concurrently are
+        coalesced into a single request, all callers get the same
+        result or exception. Mutating RPCs are never coalesced.
 
+        If a `transform` is given, it is applied to every record of a
+        list response, e.g. to filter and project the records of a huge
+        list. The full list is fetched, cached and coalesced as usual,
+        the transform is applied to the records of the shared result.
+        Only with `use_cache` set to `False` it is applied while the
+        response is received, so the full list is never materialized.
+
+        Every call opens an `rpc` span, which is a child of the span of
+        the tool invocation that issued it.
+        """
+        with tracing.span(
+            "rpc", host=self.name, service=service, method=method, params=params
+        ) as span:
+            if use_cache:
+                found, result = await self._acache_lookup(service, method, params)
+                if found:
+                    span.set(cache="hit")
+                    if transform is not None:
+                        return self._transform(result, transform)
+                    return result
+
+            # The RPC is abandoned when the deadline of the MCP request
+            # passes, no matter whether it is queued or in flight.
+            async with deadlines.enforce(f"{service}.{method} on host '{self.name}'"):
+                if transform is not None and not use_cache:
+                    return await self._apost(
+                        service, method, params, check_status, timeout, transform
+                    )
+
+                if service == "session" or not is_read_only(service, method):
+                    return await self._apost(
+                        service, method, params, check_status, timeout
+                    )
+
+                # Identical concurrent read-only RPCs share one in-flight
+                # request. The HTTP details are recorded in the span of the
+                # caller that actually executes it. It is cancelled when
+                # all of its callers are gone. A read that is issued after
+                # a mutation of its service does not join a request that
+                # was sent before, the generation is part of the key. The
+                # request takes the highest priority class of its callers.
+                flight = FlightPriority(self.scheduler.classify(service, method, True))
+                result = await self.flights.do(
+                    (
+                        check_status,
+                        self.generation(service),
+                        *self._cache_key(service, method, params),
+                    ),
+                    lambda: self._afetch(
+                        service,
+                        method,
+                        params,
+                        check_status,
+                        timeout,
+                        use_cache,
+                        flight,
+                    ),
+                    flight,
+                )
+                if transform is not None:
+                    return self._transform(result, transform)
+                return result
+
+    async def _afetch(
+        self,
+        service: str,
+        method: str,
+        params: dict = None,
+        check_status: bool = True,
+        timeout: Optional[float] = None,
+        use_cache: bool = True,
+        flight: Optional[FlightPriority] = None,
+    ) -> any:
+        # A response that is missing in the shared cache is fetched by
+        # one worker only, the others wait for it to be stored.
+        if (
+            self.shared is None
+            or not use_cache
+            or self._cache_ttls.get(f"{service}.{method}", 0) <= 0
+        ):
+            return await self._apost(
+                service, method, params, check_status, timeout, flight=flight
+            )
+        return await self.shared.once(
+            self._shared_key(self._cache_key(service, method, params)),
+            lambda: self._apost(
+                service, method, params, check_status, timeout, flight=flight
+            ),
+            timeout=timeout or self._timeout.read,
+        )
+
+    def _record(self, success: bool, error: str) -> None:
+        self.scheduler.breaker.record(success)
+        if success:
+            self.last_success = time.time()
+        else:
+            self.last_failure = time.time()
+            self.last_error = error
+
+    def _abandon(self, span: Optional[tracing.Span], stage: str) -> None:
+        # The MCP request was cancelled or its deadline passed while the
+        # RPC was queued or in flight, it is dropped or aborted.
+        left = deadlines.remaining()
+        reason = "deadline" if left is not None and left <= 0 else "cancelled"
+        metrics.RPC_ABANDONED.inc(self.name, reason, stage)
+        if span is not None:
+            span.set(abandoned=stage, reason=reason)
+
+    async def _apost(
+        self,
+        service: str,
+        method: str,
+        params: dict = None,
+        check_status: bool = True,
+        timeout: Optional[float] = None,
+        transform: Optional[fastjson.RecordTransform] = None,
+        flight: Optional[FlightPriority] = None,
+    ) -> any:
+        span = tracing.current()
+        labels = (self.name, service, method)
+        # The generation of the service when the RPC was issued, see
+        # `_cache_update`.
+        generation = self.generation(service)
+        if flight is not None:
+            priority = flight.name
+        else:
+            priority = self.scheduler.classify(
+                service, method, is_read_only(service, method)
+            )
+        try:
+            wait = await self.scheduler.acquire(service, priority, flight)
+        except asyncio.CancelledError:
+            self._abandon(span, "queued")
+            raise
+        if flight is not None:
+            # A caller of a higher class might have joined meanwhile.
+            priority = flight.name
+        if span is not None:
+            span.set(priority=priority, queue_wait_ms=round(wait * 1000, 3))
+        start = time.perf_counter()
+        metrics.IN_FLIGHT.inc("rpc")
+        recorded = False
+        try:
+            session = await self._acquire()
+            try:
+                if (
+                    service != "session"
+                    and self._credentials is not None
+                    and not session.authenticated
+                ):
+                    await self._lazy_login(session)
+                resp, document, size = await self._exchange(
+                    session, service, method, params, timeout, transform
+                )
+                if (
+                    service != "session"
+                    and self._credentials is not None
+                    and self._is_session_error(resp.status_code, document)
+                ):
+                    await self._relogin(session)
+                    resp, document, size = await self._exchange(
+                        session, service, method, params, timeout, transform
+                    )
+                    if span is not None:
+                        span.set(relogin=True)
+            finally:
+                self._release(session)
+            if span is not None:
+                span.set(
+                    status_code=resp.status_code,
+                    http_version=resp.http_version,
+                    request_bytes=len(resp.request.content),
+                    response_bytes=size,
+                    wire_bytes=resp.num_bytes_downloaded,
+                )
+            metrics.RPC_REQUEST_SIZE.observe(len(resp.request.content), *labels)
+            metrics.RPC_RESPONSE_SIZE.observe(size, *labels)
+            self._record(
+                resp.status_code not in UNAVAILABLE_STATUS_CODES,
+                f"HTTP {resp.status_code}",
+            )
+            recorded = True
+            if check_status:
+                self._raise_for_status(resp, document)
+        except BaseException as e:
+            metrics.RPC_ERRORS.inc(*labels)
+            if isinstance(e, asyncio.CancelledError):
+                self._abandon(span, "in_flight")
+            # E.g. connection errors, or a login that failed because
+            # rpc.php is unavailable.
+            if not recorded and isinstance(e, Exception) and self._is_transient(e):
+                self._record(False, str(e) or type(e).__name__)
+            raise
+        finally:
+            self.scheduler.release(service)
+            metrics.IN_FLIGHT.dec("rpc")
+            metrics.RPC_DURATION.observe(time.perf_counter() - start, *labels)
 
-rpc = RPC(config.get("rpc.url"))
+        result = self._decode(document)
+        # A transformed result is incomplete, it must not be cached.
+        if resp.status_code < 400 and transform is None:
+            await self._acache_update(service, method, params, result, generation)
+        return result
@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of openmediavault.
+#
+# @license   https://www.gnu.org/licenses/gpl.html GPL Version 3
+# @author    Volker Theile <volker.theile@openmediavault.org>
+# @copyright Copyright (c) 2025 Volker Theile
+#
+# openmediavault is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# openmediavault is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with openmediavault. If not, see <https://www.gnu.org/licenses/>.
+import asyncio
+import collections
+import fnmatch
+import math
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, Iterator, List, Optional
+
+import metrics
+
+# The priority classes in the order they are served. Mutating RPCs,
+# e.g. `shutdown`, are critical, reads of the tools are interactive.
+PRIORITIES = ["critical", "interactive", "bulk", "background"]
+
+# The priority classes of read-only RPCs, by `<service>.<method>`
+# pattern. Reads that are expensive for openmediavault, e.g. the SMART
+# data that is read via smartctl, are bulk reads.
+METHOD_PRIORITIES: Dict[str, str] = {
+    "Smart.*": "bulk",
+}
+
+# The default maximum number of queued RPCs per priority class.
+QUEUE_LIMITS: Dict[str, int] = {
+    "critical": 64,
+    "interactive": 128,
+    "bulk": 64,
+    "background": 32,
+}
+
+_priority: ContextVar[Optional[str]] = ContextVar("priority", default=None)
+
+
+class OverloadedError(Exception):
+    pass
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+@contextmanager
+def priority(name: str) -> Iterator[None]:
+    """
+    Run the RPCs that are issued within the context with the specified
+    priority class, e.g. `background` for the background tasks. Tasks
+    that are created within the context inherit it.
+    """
+    if name not in PRIORITIES:
+        raise ValueError(f"Unknown priority class '{name}'")
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class CircuitBreaker:
+    """
+    Fail fast while rpc.php is unhealthy. The circuit opens after a
+    number of consecutive failures, i.e. connection errors or responses
+    telling that rpc.php is unavailable. After the reset timeout a
+    single trial RPC is let through, the circuit closes again if it
+    succeeds.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half-open", "open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = max(int(failure_threshold), 0)
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened: Optional[float] = None
+        self._trial: Optional[float] = None
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened < self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def check(self) -> None:
+        """
+        Raise `CircuitOpenError` if no RPC may be sent right now.
+        """
+        state = self.state
+        if state == self.CLOSED:
+            return
+        now = time.monotonic()
+        if state == self.HALF_OPEN and (
+            self._trial is None or now - self._trial > self.reset_timeout
+        ):
+            self._trial = now
+            return
+        if state == self.HALF_OPEN:
+            raise CircuitOpenError(
+                "rpc.php is unavailable, waiting for the result of a trial RPC"
+            )
+        retry = self.opened + self.reset_timeout - now
+        raise CircuitOpenError(
+            f"rpc.php is unavailable after {self.failures} failures, "
+            f"not sending RPCs for {math.ceil(retry)} more seconds"
+        )
+
+    def record(self, success: bool) -> None:
+        if success:
+            self.failures, self.opened, self._trial = 0, None, None
+            return
+        self.failures += 1
+        if self.failure_threshold and (
+            self.opened is not None or self.failures >= self.failure_threshold
+        ):
+            if self.opened is None:
+                self.trips += 1
+            self.opened, self._trial = time.monotonic(), None
+
+
+class _Waiter:
+    __slots__ = ("service", "priority", "future")
+
+    def __init__(self, service: str, priority: str, future: asyncio.Future):
+        self.service = service
+        self.priority = priority
+        self.future = future
+
+
+class FlightPriority:
+    """
+    The priority class of a read that is shared by several callers, see
+    `SingleFlight`. It is the highest class of its callers, a queued
+    read moves up when a caller of a higher class joins it.
+    """
+
+    __slots__ = ("name", "_scheduler", "_waiter")
+
+    def __init__(self, name: str):
+        self.name = name
+        self._scheduler: Optional["Scheduler"] = None
+        self._waiter: Optional[_Waiter] = None
+
+    def join(self, other: "FlightPriority") -> None:
+        if PRIORITIES.index(other.name) >= PRIORITIES.index(self.name):
+            return
+        self.name = other.name
+        if self._scheduler is not None and self._waiter is not None:
+            self._scheduler._promote(self._waiter, other.name)
+
+
+class Scheduler:
+    """
+    Admission control in front of rpc.php of a host, which only has a
+    few PHP-FPM workers. At most `max_concurrency` RPCs run at the same
+    time, and at most the configured number per service. RPCs that
+    exceed the limits are queued per priority class and started in the
+    order of their class, then in the order of their arrival. The bulk
+    and background classes never take the last `reserved` slots, so
+    critical and interactive RPCs do not wait for a long bulk operation.
+    A full queue rejects an RPC immediately.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int = 4,
+        service_limits: Optional[Dict[str, int]] = None,
+        queue_limits: Optional[Dict[str, int]] = None,
+        reserved: int = 1,
+        method_priorities: Optional[Dict[str, str]] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.name = name
+        self.max_concurrency = max(int(max_concurrency), 1)
+        self.service_limits = service_limits or {}
+        self.queue_limits = QUEUE_LIMITS | (queue_limits or {})
+        self.reserved = min(max(int(reserved), 0), self.max_concurrency - 1)
+        self.method_priorities = METHOD_PRIORITIES | (method_priorities or {})
+        self.breaker = breaker or CircuitBreaker()
+        self.active = 0
+        self._active: Dict[str, int] = collections.defaultdict(int)
+        self._queues: Dict[str, Deque[_Waiter]] = {
+            name: collections.deque() for name in PRIORITIES
+        }
+        self._priorities: Dict[str, str] = {}
+        self.rejected: Dict[str, int] = collections.defaultdict(int)
+
+    def classify(self, service: str, method: str, read_only: bool) -> str:
+        """
+        Get the priority class of an RPC. Mutating RPCs are critical,
+        unless they are issued by a bulk operation. Reads take the class
+        of their context, or the class of their method.
+        """
+        context = _priority.get()
+        if not read_only:
+            return "bulk" if context == "bulk" else "critical"
+        if context is not None:
+            return context
+        key = f"{service}.{method}"
+        result = self._priorities.get(key)
+        if result is None:
+            result = next(
+                (
+                    name
+                    for pattern, name in self.method_priorities.items()
+                    if fnmatch.fnmatchcase(key, pattern)
+                ),
+                "interactive",
+            )
+            self._priorities[key] = result
+        return result
+
+    def depth(self) -> Dict[str, int]:
+        return {name: len(queue) for name, queue in self._queues.items()}
+
+    def _can_start(self, waiter: _Waiter) -> bool:
+        limit = self.max_concurrency
+        if PRIORITIES.index(waiter.priority) > 1:
+            limit -= self.reserved
+        if self.active >= limit:
+            return False
+        service_limit = self.service_limits.get(waiter.service)
+        return not service_limit or self._active[waiter.service] < service_limit
+
+    def _dispatch(self) -> None:
+        for name in PRIORITIES:
+            queue = self._queues[name]
+            # A waiter whose service is at its limit does not block the
+            # waiters of other services behind it.
+            for waiter in list(queue):
+                if self.active >= self.max_concurrency:
+                    return
+                if waiter.future.done():
+                    queue.remove(waiter)
+                elif self._can_start(waiter):
+                    queue.remove(waiter)
+                    self.active += 1
+                    self._active[waiter.service] += 1
+                    waiter.future.set_result(None)
+
+    async def acquire(
+        self, service: str, priority: str, flight: Optional[FlightPriority] = None
+    ) -> float:
+        """
+        Wait for a slot to send an RPC of the specified service. If the
+        RPC is shared by several callers, it is queued with the highest
+        priority class of its `flight`.
+
+        Returns:
+            The seconds spent waiting.
+
+        Raises:
+            CircuitOpenError: rpc.php is unhealthy.
+            OverloadedError: The queue of the priority class is full.
+        """
+        try:
+            self.breaker.check()
+        except CircuitOpenError:
+            self.rejected["circuit_open"] += 1
+            metrics.SCHEDULER_REJECTED.inc(self.name, priority, "circuit_open")
+            raise
+        queue = self._queues[priority]
+        if len(queue) >= self.queue_limits.get(priority, 0):
+            self.rejected["queue_full"] += 1
+            metrics.SCHEDULER_REJECTED.inc(self.name, priority, "queue_full")
+            raise OverloadedError(
+                f"Too many pending {priority} RPCs to host '{self.name}', "
+                "try again later"
+            )
+        start = time.perf_counter()
+        waiter = _Waiter(service, priority, asyncio.get_running_loop().create_future())
+        queue.append(waiter)
+        if flight is not None:
+            flight._scheduler, flight._waiter = self, waiter
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            queue = self._queues[waiter.priority]
+            if waiter.future.done() and not waiter.future.cancelled():
+                # The slot was granted in the meantime, pass it on.
+                self.release(service)
+            elif waiter in queue:
+                queue.remove(waiter)
+            raise
+        finally:
+            if flight is not None:
+                flight._scheduler = flight._waiter = None
+        wait = time.perf_counter() - start
+        metrics.SCHEDULER_WAIT.observe(wait, self.name, waiter.priority)
+        return wait
+
+    def _promote(self, waiter: _Waiter, priority: str) -> None:
+        queue = self._queues[waiter.priority]
+        if waiter.future.done() or waiter not in queue:
+            return
+        queue.remove(waiter)
+        waiter.priority = priority
+        self._queues[priority].append(waiter)
+        self._dispatch()
+
+    def release(self, service: str) -> None:
+        self.active -= 1
+        self._active[service] -= 1
+        self._dispatch()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "active": self.active,
+            "max_concurrency": self.max_concurrency,
+            "queued": self.depth(),
+            "rejected": dict(self.rejected),
+            "circuit": self.breaker.state,
+        }
+
+
+# The numeric value of the circuit states for the metrics.
+CIRCUIT_STATES = {
+    CircuitBreaker.CLOSED: 0,
+    CircuitBreaker.HALF_OPEN: 1,
+    CircuitBreaker.OPEN: 2,
+}
+
+
+def scheduler_metrics(schedulers: List[Scheduler]) -> List[metrics.Metric]:
+    depth = metrics.Gauge(
+        "omv_mcp_scheduler_queue_depth",
+        "Number of RPCs waiting for a slot per priority class.",
+        ["host", "priority"],
+    )
+    active = metrics.Gauge(
+        "omv_mcp_scheduler_active",
+        "Number of RPCs that are currently sent to rpc.php.",
+        ["host"],
+    )
+    circuit = metrics.Gauge(
+        "omv_mcp_circuit_state",
+        "State of the circuit breaker, 0 closed, 1 half-open, 2 open.",
+        ["host"],
+    )
+    trips = metrics.Counter(
+        "omv_mcp_circuit_trips_total",
+        "Number of times the circuit breaker opened.",
+        ["host"],
+    )
+    for scheduler in schedulers:
+        for name, value in scheduler.depth().items():
+            depth.inc(scheduler.name, name, amount=value)
+        active.inc(scheduler.name, amount=scheduler.active)
+        circuit.inc(scheduler.name, amount=CIRCUIT_STATES[scheduler.breaker.state])
+        trips.inc(scheduler.name, amount=scheduler.breaker.trips)
+    return [depth, active, circuit, trips]
@@ -0,0 +1,444 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of openmediavault.
+#
+# @license   https://www.gnu.org/licenses/gpl.html GPL Version 3
+# @author    Volker Theile <volker.theile@openmediavault.org>
+# @copyright Copyright (c) 2025 Volker Theile
+#
+# openmediavault is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# openmediavault is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with openmediavault. If not, see <https://www.gnu.org/licenses/>.
+import asyncio
+import math
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from indexes import INDEXES, EntityIndex, field_value, indexes, tokenize
+from rpc import RPC
+from versioning import record_key
+
+# The words of a query that name the type of the wanted entities,
+# e.g. `share` in "which share lives on the failing Seagate disk".
+# Only the first one counts, later ones like `disk` describe related
+# entities.
+TYPE_WORDS: Dict[str, str] = {
+    "user": "users",
+    "users": "users",
+    "account": "users",
+    "accounts": "users",
+    "group": "groups",
+    "groups": "groups",
+    "disk": "disks",
+    "disks": "disks",
+    "drive": "disks",
+    "drives": "disks",
+    "smart": "smart",
+    "filesystem": "filesystems",
+    "filesystems": "filesystems",
+    "volume": "filesystems",
+    "volumes": "filesystems",
+    "share": "shares",
+    "shares": "shares",
+    "folder": "shares",
+    "folders": "shares",
+}
+
+# Query words that are mapped onto the values used by openmediavault,
+# e.g. the SMART status `BAD_SECTOR`.
+SYNONYMS: Dict[str, str] = {
+    "failing": "bad",
+    "failed": "bad",
+    "faulty": "bad",
+    "broken": "bad",
+    "unhealthy": "bad",
+    "healthy": "good",
+}
+
+STOPWORDS = frozenset(
+    [
+        "a",
+        "all",
+        "an",
+        "and",
+        "any",
+        "are",
+        "by",
+        "find",
+        "for",
+        "has",
+        "have",
+        "in",
+        "is",
+        "list",
+        "live",
+        "lives",
+        "located",
+        "of",
+        "on",
+        "or",
+        "show",
+        "that",
+        "the",
+        "to",
+        "what",
+        "where",
+        "which",
+        "who",
+        "with",
+    ]
+)
+
+# The relevance of a token that matches a query term exactly, by
+# prefix or with a small edit distance.
+EXACT, PREFIX, FUZZY = 1.0, 0.6, 0.4
+# The maximum number of tokens a query term is expanded to by prefix.
+MAX_EXPANSIONS = 100
+MIN_PREFIX_LENGTH = 2
+MIN_FUZZY_LENGTH = 4
+# The relevance of an entity that is reached via a related entity
+# decays with every hop, e.g. share -> filesystem -> disk.
+DECAY = 0.8
+MAX_HOPS = 3
+# The number of best hits relevance is propagated from.
+MAX_SEEDS = 50
+
+# The fields that make up the title of a hit.
+TITLE_FIELDS: Dict[str, List[str]] = {
+    "users": ["name"],
+    "groups": ["name"],
+    "disks": ["devicefile", "model"],
+    "smart": ["devicefile", "model", "overallstatus"],
+    "filesystems": ["label", "mountpoint"],
+    "shares": ["name"],
+}
+
+Entity = Tuple[str, str]
+
+
+def parse_query(query: str) -> Tuple[List[str], List[str]]:
+    """
+    Split a query into the search terms and the type of the wanted
+    entities. Stop words and type words are dropped, synonyms are
+    replaced.
+
+    Returns:
+        The search terms and the entity type, if any.
+    """
+    terms: List[str] = []
+    kinds: List[str] = []
+    for token in tokenize(query):
+        if token in TYPE_WORDS:
+            if not kinds:
+                kinds.append(TYPE_WORDS[token])
+        elif token not in STOPWORDS:
+            token = SYNONYMS.get(token, token)
+            if token not in terms:
+                terms.append(token)
+    return terms, kinds
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Calculate the Levenshtein distance of two strings. The calculation
+    stops early once the distance exceeds the limit.
+
+    Returns:
+        The distance or `limit + 1` if it exceeds the limit.
+    """
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (char_a != char_b),
+                )
+            )
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return min(previous[-1], limit + 1)
+
+
+def has_prefix(index: EntityIndex, term: str) -> bool:
+    vocabulary = index.vocabulary
+    i = bisect_left(vocabulary, term)
+    return i < len(vocabulary) and vocabulary[i].startswith(term)
+
+
+def expand(index: EntityIndex, term: str, fuzzy: bool) -> List[Tuple[str, float]]:
+    """
+    Find the tokens of the index that match the specified term. If
+    fuzzy matching is enabled and neither an exact nor a prefix match
+    is found, tokens within a small edit distance are used, e.g.
+    `segate` matches `seagate`.
+
+    Returns:
+        The matching tokens and their relevance.
+    """
+    matches = [(term, EXACT)] if term in index.postings else []
+    if len(term) >= MIN_PREFIX_LENGTH:
+        vocabulary = index.vocabulary
+        i = bisect_left(vocabulary, term)
+        while (
+            i < len(vocabulary)
+            and vocabulary[i].startswith(term)
+            and len(matches) < MAX_EXPANSIONS
+        ):
+            if vocabulary[i] != term:
+                matches.append((vocabulary[i], PREFIX))
+            i += 1
+    if fuzzy and not matches and len(term) >= MIN_FUZZY_LENGTH:
+        limit = 1 if len(term) < 8 else 2
+        for token in index.vocabulary:
+            if (
+                abs(len(token) - len(term)) <= limit
+                and edit_distance(term, token, limit) <= limit
+            ):
+                matches.append((token, FUZZY))
+    return matches
+
+
+def score(
+    index: EntityIndex, terms: List[str], fuzzy: Set[str]
+) -> Dict[str, Tuple[float, Set[str]]]:
+    """
+    Rank the records of the index by the specified terms. Every term
+    contributes the relevance of its best matching token, weighted by
+    the field it occurs in and by how rare the token is. Records that
+    match more terms rank higher.
+
+    Args:
+        index: The index to search.
+        terms: The search terms.
+        fuzzy: The terms that are matched fuzzily if necessary.
+
+    Returns:
+        The score and the matched terms per record key.
+    """
+    total = len(index.records) or 1
+    result: Dict[str, Tuple[float, Set[str]]] = {}
+    for term in terms:
+        best: Dict[str, float] = {}
+        for token, relevance in expand(index, term, term in fuzzy):
+            keys = index.postings[token]
+            idf = math.log(1 + total / len(keys))
+            for key, weight in keys.items():
+                value = relevance * weight * idf
+                if value > best.get(key, 0):
+                    best[key] = value
+        for key, value in best.items():
+            current, matched = result.get(key, (0.0, set()))
+            result[key] = (current + value, matched | {term})
+    return {
+        key: (value * len(matched) / len(terms), matched)
+        for key, (value, matched) in result.items()
+    }
+
+
+def related(
+    idx: Dict[str, EntityIndex], kind: str, record: Dict[str, Any]
+) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Get the entities that are directly related to the specified one,
+    e.g. the filesystem a shared folder is located on or the disk
+    of a filesystem.
+    """
+    # A shared folder references the mount point configuration of its
+    # filesystem, `mntentref` is not the UUID of the filesystem. They
+    # are joined by the directory of the mount point.
+    if kind == "shares":
+        mountpoint = field_value(record, "mntent.dir")
+        return [
+            ("filesystems", fs)
+            for fs in idx["filesystems"].lookup("mountpoint", mountpoint)
+        ]
+    if kind == "filesystems":
+        devicefile = record.get("parentdevicefile") or record.get("devicefile")
+        return [
+            ("disks", disk) for disk in idx["disks"].lookup("devicefile", devicefile)
+        ] + [
+            ("shares", share)
+            for share in idx["shares"].lookup("mntent.dir", record.get("mountpoint"))
+        ]
+    if kind in ("disks", "smart"):
+        devicefile = record.get("devicefile")
+        other = "smart" if kind == "disks" else "disks"
+        return [
+            (other, device) for device in idx[other].lookup("devicefile", devicefile)
+        ] + [
+            ("filesystems", fs)
+            for fs in idx["filesystems"].lookup("parentdevicefile", devicefile)
+        ]
+    if kind == "users":
+        return [
+            ("groups", group)
+            for name in record.get("groups") or []
+            for group in idx["groups"].lookup("name", name)
+        ]
+    if kind == "groups":
+        return [
+            ("users", user)
+            for name in record.get("members") or []
+            for user in idx["users"].lookup("name", name)
+        ]
+    return []
+
+
+def propagate(
+    idx: Dict[str, EntityIndex],
+    hits: Dict[Entity, float],
+    kinds: List[str],
+) -> Dict[Entity, Tuple[float, Entity]]:
+    """
+    Pass the relevance of the best hits on to the related entities of
+    the wanted types, so that e.g. the shared folders on a failing disk
+    are found by the SMART status of the disk. The relevance is not
+    passed on beyond entities of the wanted types, e.g. from the
+    members of a group to their other groups.
+
+    Returns:
+        The score of the reached entities and the hit it was passed on
+        from.
+    """
+    result: Dict[Entity, Tuple[float, Entity]] = {}
+    seeds = sorted(
+        (item for item in hits.items() if item[0][0] not in kinds),
+        key=lambda item: item[1],
+        reverse=True,
+    )
+    for seed, value in seeds[:MAX_SEEDS]:
+        visited = {seed}
+        frontier = [seed]
+        for hop in range(1, MAX_HOPS + 1):
+            value *= DECAY
+            reached = []
+            for kind, key in frontier:
+                for other, record in related(idx, kind, idx[kind].records[key]):
+                    entity = (other, record_key(record))
+                    if entity in visited:
+                        continue
+                    visited.add(entity)
+                    if other not in kinds:
+                        reached.append(entity)
+                    elif value > result.get(entity, (0.0,))[0]:
+                        result[entity] = (value, seed)
+            frontier = reached
+    return result
+
+
+def title(idx: Dict[str, EntityIndex], entity: Entity) -> str:
+    kind, key = entity
+    record = idx[kind].records[key]
+    values = [str(record[field]) for field in TITLE_FIELDS[kind] if record.get(field)]
+    return " ".join(values) or key
+
+
+async def search_entities(
+    rpc: RPC, query: str, types: Optional[List[str]] = None, limit: int = 10
+) -> Dict[str, Any]:
+    """
+    Search the users, groups, disks, SMART devices, filesystems and
+    shared folders of a host for the specified query.
+
+    Args:
+        rpc: The RPC client of the host.
+        query: The search terms, words like `disk` or `share` restrict
+            the results to entities of that type.
+        types: The types of the wanted entities, see `INDEXES`. This
+            overrides the types named in the query.
+        limit: The maximum number of hits.
+
+    Returns:
+        A dictionary with the ranked hits. The indexes that could not be
+        loaded are left out, `failed` maps their types to the error.
+    """
+    terms, kinds = parse_query(query)
+    if types:
+        unknown = [kind for kind in types if kind not in INDEXES]
+        if unknown:
+            raise ValueError(
+                f"Unknown entity types {', '.join(unknown)}, available types are: {', '.join(INDEXES)}"
+            )
+        kinds = types
+    if not terms and not kinds:
+        raise ValueError("The query does not contain any search terms")
+    loaded = await asyncio.gather(
+        *(indexes.get(rpc, kind) for kind in INDEXES), return_exceptions=True
+    )
+    # An index that can not be loaded does not fail the search, it is
+    # searched as an empty index.
+    idx: Dict[str, EntityIndex] = {}
+    failed: Dict[str, str] = {}
+    for kind, index in zip(INDEXES, loaded):
+        if isinstance(index, Exception):
+            failed[kind] = str(index) or type(index).__name__
+            index = indexes.index(rpc, kind)
+        elif isinstance(index, BaseException):
+            raise index
+        idx[kind] = index
+    if len(failed) == len(INDEXES):
+        raise next(error for error in loaded if isinstance(error, Exception))
+    # Only terms that match nothing exactly or by prefix are matched
+    # fuzzily, that is much more expensive.
+    fuzzy = {
+        term
+        for term in terms
+        if not any(has_prefix(index, term) for index in idx.values())
+    }
+    hits: Dict[Entity, float] = {}
+    matched: Dict[Entity, Set[str]] = {}
+    for kind, index in idx.items():
+        for key, (value, terms_of_key) in score(index, terms, fuzzy).items():
+            hits[(kind, key)] = value
+            matched[(kind, key)] = terms_of_key
+    via: Dict[Entity, Entity] = {}
+    if not terms:
+        ranked = {
+            (kind, key): 0.0 for kind in kinds for key in sorted(idx[kind].records)
+        }
+    elif kinds:
+        ranked = {entity: value for entity, value in hits.items() if entity[0] in kinds}
+        for entity, (value, seed) in propagate(idx, hits, kinds).items():
+            if value > ranked.get(entity, 0):
+                ranked[entity] = value
+                via[entity] = seed
+    else:
+        ranked = hits
+    entities = sorted(ranked, key=lambda entity: (-ranked[entity], entity))
+    result = []
+    for entity in entities[:limit]:
+        hit = {
+            "type": entity[0],
+            "key": entity[1],
+            "title": title(idx, entity),
+            "score": round(ranked[entity], 3),
+            "matched": sorted(matched.get(via.get(entity, entity), ())),
+        }
+        if entity in via:
+            hit["via"] = {
+                "type": via[entity][0],
+                "key": via[entity][1],
+                "title": title(idx, via[entity]),
+            }
+        result.append(hit)
+    return {
+        "query": {"terms": terms, "types": kinds},
+        "total": len(ranked),
+        "hits": result,
+        # The age of the oldest index the hits are based on.
+        "age": max((index.meta()["age"] or 0) for index in idx.values()),
+        "failed": failed,
+    }
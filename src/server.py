@@ -18,24 +18,62 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with openmediavault. If not, see <https://www.gnu.org/licenses/>.
+import logging
 from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
 from typing import Any
 
+import anyio
 from fastmcp import FastMCP
 from mcp.types import Icon
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
 
+import deadlines
+import fastjson
+import metrics
+import tracing
 from config import config
-from rpc import rpc
+from fleet import fleet
+from health import health
+from indexes import indexes
+from jobs import jobs
+from smarthistory import smart_sampler
+from snapshots import poller
+from timeseries import sampler
+
+logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(_: FastMCP) -> AsyncIterator[Any]:
     try:
-        rpc.login(config.get("rpc.auth.username"), config.get("rpc.auth.password"))
+        # The hosts are logged in on their first RPC by default, so that
+        # a slow or unreachable host does not delay the startup.
+        await fleet.login(lazy=config.get("startup.lazy_login", True))
+        if config.get("startup.warmup.enabled", True):
+            await health.start()
+        if config.get("snapshots.enabled", True):
+            await poller.start()
+        if config.get("indexes.enabled", True):
+            await indexes.start()
+        if config.get("timeseries.enabled", True):
+            await sampler.start()
+        if config.get("smart.history.enabled", True):
+            await smart_sampler.start()
+        logger.info(f"Started in {health.mark('ready'):.3f}s")
         yield {}
     finally:
-        rpc.logout()
+        # Make sure the cleanup is not aborted if the transport is
+        # shutting down, e.g. when a stdio client disconnects.
+        with anyio.move_on_after(10, shield=True):
+            await health.stop()
+            await jobs.stop()
+            await poller.stop()
+            await indexes.stop()
+            await sampler.stop()
+            await smart_sampler.stop()
+            await fleet.logout()
 
 
 server = FastMCP(
@@ -50,4 +88,28 @@ server = FastMCP(
         ),
     ],
     lifespan=lifespan,
+    tool_serializer=fastjson.dumps_text,
 )
+
+server.add_middleware(metrics.MetricsMiddleware())
+server.add_middleware(tracing.TracingMiddleware())
+server.add_middleware(deadlines.create_middleware())
+poller.attach(server)
+
+
+@server.custom_route("/metrics", methods=["GET"])
+async def get_metrics(_: Request) -> PlainTextResponse:
+    return PlainTextResponse(
+        metrics.registry.expose(), media_type="text/plain; version=0.0.4"
+    )
+
+
+@server.custom_route("/healthz", methods=["GET"])
+async def get_healthz(_: Request) -> JSONResponse:
+    return JSONResponse(health.liveness())
+
+
+@server.custom_route("/readyz", methods=["GET"])
+async def get_readyz(_: Request) -> JSONResponse:
+    ready, details = await health.readiness()
+    return JSONResponse(details, status_code=200 if ready else 503)
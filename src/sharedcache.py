@@ -0,0 +1,436 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of openmediavault.
+#
+# @license   https://www.gnu.org/licenses/gpl.html GPL Version 3
+# @author    Volker Theile <volker.theile@openmediavault.org>
+# @copyright Copyright (c) 2025 Volker Theile
+#
+# openmediavault is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# openmediavault is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with openmediavault. If not, see <https://www.gnu.org/licenses/>.
+import asyncio
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import fastjson
+import metrics
+from config import config
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    host TEXT NOT NULL,
+    service TEXT NOT NULL,
+    expires REAL NOT NULL,
+    value BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_service ON entries (host, service);
+CREATE TABLE IF NOT EXISTS generations (
+    host TEXT NOT NULL,
+    service TEXT NOT NULL,
+    generation INTEGER NOT NULL,
+    PRIMARY KEY (host, service)
+);
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,
+    owner INTEGER NOT NULL,
+    expires REAL NOT NULL
+);
+"""
+
+
+class SharedCache:
+    """
+    A cache that is shared by the worker processes of the server, so
+    that every response is fetched from openmediavault once and not
+    once per worker. The entries are stored in a SQLite database in
+    WAL mode that is memory mapped by all workers, by default on a
+    tmpfs, so that it never touches a disk.
+
+    Besides the entries, the generations of the services are shared,
+    see `RPC.generation`, so that a mutating RPC in one worker drops
+    the cached responses of all workers. Leases make sure that only one
+    worker fetches a missing entry while the others wait for it.
+
+    The database is only accessed by a dedicated thread per process,
+    the coroutines of the cache, e.g. `aget`, hand their work over to
+    it, so that a worker waiting for the lock of the database does not
+    block the event loop. The work is done in the order it was handed
+    over, e.g. an entry that is stored before a service is invalidated
+    is dropped by the invalidation.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        mmap_size: int = 256 * 1024 * 1024,
+        busy_timeout: float = 5.0,
+        poll_interval: float = 0.01,
+        max_poll_interval: float = 0.25,
+        generations_interval: float = 0.5,
+    ):
+        self.path = path
+        self.mmap_size = mmap_size
+        self.busy_timeout = busy_timeout
+        # The interval in seconds to check for the entry of a lease
+        # holder, it backs off up to the maximum.
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max(max_poll_interval, poll_interval)
+        # The seconds the generations of a host are taken from memory
+        # before they are read from the database again.
+        self.generations_interval = generations_interval
+        self._db: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+        # The generations per host and when they were read.
+        self._generations: Dict[str, Tuple[float, Dict[str, int]]] = {}
+        self._refreshing: Set[str] = set()
+        self._pruned = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.fetches = 0
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        # A connection must not be used by another process, e.g. after
+        # a fork, so every process opens its own one.
+        if self._db is None or self._pid != os.getpid():
+            db = sqlite3.connect(
+                self.path,
+                timeout=self.busy_timeout,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            db.execute("PRAGMA journal_mode=WAL")
+            # It is a cache, losing the last transactions on a crash of
+            # the machine does not matter.
+            db.execute("PRAGMA synchronous=OFF")
+            db.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            db.executescript(SCHEMA)
+            self._db, self._pid = db, os.getpid()
+        return self._db
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        # Threads do not survive a fork, so every process starts its own.
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(1, thread_name_prefix="shared-cache")
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, fn, *args
+        )
+
+    def _submit(self, fn: Callable[..., Any], *args: Any) -> None:
+        # Nobody waits for the result, but errors must not get lost.
+        def done(future: Future) -> None:
+            if future.exception() is not None:
+                logger.warning(f"Shared cache: {future.exception()}")
+
+        self.executor.submit(fn, *args).add_done_callback(done)
+
+    def reset(self) -> None:
+        """
+        Delete the database, e.g. before the workers are started, so
+        that they do not pick up the entries of a previous run.
+        """
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    os.unlink(self.path + suffix)
+                except FileNotFoundError:
+                    pass
+
+    def get(self, key: str) -> Tuple[bool, Any, float]:
+        """
+        Look up the specified key.
+
+        Returns:
+            A tuple of a flag that tells whether the key was found, the
+            cached value and its remaining time-to-live in seconds.
+        """
+        with self._lock:
+            row = self.db.execute(
+                "SELECT expires, value FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+        now = time.time()
+        if row is None or row[0] <= now:
+            self.misses += 1
+            return False, None, 0.0
+        self.hits += 1
+        return True, fastjson.loads(row[1]), row[0] - now
+
+    async def aget(self, key: str) -> Tuple[bool, Any, float]:
+        return await self._run(self.get, key)
+
+    def items(self, prefix: str) -> List[Tuple[str, Any]]:
+        """
+        Get the keys and values of the entries whose keys start with
+        the specified prefix.
+        """
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT key, value FROM entries WHERE key >= ? AND key < ? AND expires > ?",
+                (prefix, prefix + "\uffff", time.time()),
+            ).fetchall()
+        return [(key, fastjson.loads(value)) for key, value in rows]
+
+    async def aitems(self, prefix: str) -> List[Tuple[str, Any]]:
+        return await self._run(self.items, prefix)
+
+    def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: float,
+        host: str = "",
+        service: str = "",
+        generation: Optional[int] = None,
+    ) -> None:
+        """
+        Store the value for the given number of seconds. The host and
+        service tell which entries a mutating RPC drops, see
+        `invalidate`. If a generation is given, the value is only stored
+        if the service has not been invalidated since, i.e. it is still
+        the sum of the generations of the service and of `*`.
+        """
+        now = time.time()
+        data = fastjson.dumps(value)
+        with self._lock:
+            if generation is None:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                    (key, host, service, now + ttl, data),
+                )
+            else:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO entries SELECT ?, ?, ?, ?, ?"
+                    " WHERE (SELECT COALESCE(SUM(generation), 0) FROM generations"
+                    " WHERE host = ? AND service IN (?, '*')) = ?",
+                    (key, host, service, now + ttl, data, host, service, generation),
+                )
+            if now - self._pruned > 60:
+                self._pruned = now
+                self.db.execute("DELETE FROM entries WHERE expires <= ?", (now,))
+
+    def aset(
+        self,
+        key: str,
+        value: Any,
+        ttl: float,
+        host: str = "",
+        service: str = "",
+        generation: Optional[int] = None,
+    ) -> None:
+        """
+        Store the value in the background, see `set`.
+        """
+        self._submit(self.set, key, value, ttl, host, service, generation)
+
+    def invalidate(self, host: str, services: Optional[List[str]]) -> None:
+        """
+        Drop the entries of the given services of the host and increase
+        their generations. `None` drops all entries of the host.
+        """
+        names = ["*"] if services is None else services
+        with self._lock, self.db:
+            self.db.execute("BEGIN IMMEDIATE")
+            if services is None:
+                self.db.execute("DELETE FROM entries WHERE host = ?", (host,))
+            else:
+                self.db.executemany(
+                    "DELETE FROM entries WHERE host = ? AND service = ?",
+                    [(host, name) for name in names],
+                )
+            self.db.executemany(
+                "INSERT INTO generations VALUES (?, ?, 1) ON CONFLICT (host, service)"
+                " DO UPDATE SET generation = generation + 1",
+                [(host, name) for name in names],
+            )
+        self._read_generations(host)
+
+    async def ainvalidate(self, host: str, services: Optional[List[str]]) -> None:
+        await self._run(self.invalidate, host, services)
+
+    def _read_generations(self, host: str) -> Dict[str, int]:
+        try:
+            with self._lock:
+                generations = dict(
+                    self.db.execute(
+                        "SELECT service, generation FROM generations WHERE host = ?",
+                        (host,),
+                    ).fetchall()
+                )
+            self._generations[host] = (time.monotonic(), generations)
+            return generations
+        finally:
+            self._refreshing.discard(host)
+
+    def generations(self, host: str) -> Dict[str, int]:
+        """
+        Get the generations of the services of a host. They are taken
+        from memory, they are read from the database in the background
+        once they are older than `generations_interval`, so they lag
+        behind the invalidations of the other workers by that long.
+        """
+        checked, generations = self._generations.get(host, (None, {}))
+        if checked is None or time.monotonic() - checked > self.generations_interval:
+            if checked is None and not self._running_loop():
+                return self._read_generations(host)
+            if host not in self._refreshing:
+                self._refreshing.add(host)
+                self._submit(self._read_generations, host)
+        return generations
+
+    @staticmethod
+    def _running_loop() -> bool:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        return True
+
+    def acquire(self, key: str, ttl: float) -> bool:
+        """
+        Try to get the lease of the specified key. A lease whose holder
+        did not release it in time, e.g. because it crashed, expires.
+
+        Returns:
+            `True` if this process holds the lease now.
+        """
+        now = time.time()
+        with self._lock, self.db:
+            self.db.execute("BEGIN IMMEDIATE")
+            self.db.execute(
+                "DELETE FROM leases WHERE key = ? AND expires <= ?", (key, now)
+            )
+            cursor = self.db.execute(
+                "INSERT OR IGNORE INTO leases VALUES (?, ?, ?)",
+                (key, os.getpid(), now + ttl),
+            )
+            return cursor.rowcount == 1
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            self.db.execute(
+                "DELETE FROM leases WHERE key = ? AND owner = ?", (key, os.getpid())
+            )
+
+    async def once(
+        self,
+        key: str,
+        fetch: Callable[[], Awaitable[Any]],
+        ttl: float = 0,
+        timeout: float = 30.0,
+        host: str = "",
+        service: str = "",
+        generation: Optional[int] = None,
+    ) -> Any:
+        """
+        Get the entry of the specified key, or fetch it if it is
+        missing. Only one process fetches an entry at a time, the others
+        wait until it appears or the lease of the fetching process
+        expires, checking with an exponential backoff. If the fetch
+        fails, the next waiting process tries.
+
+        Args:
+            key: The key of the entry.
+            fetch: The function that fetches the value.
+            ttl: The time-to-live of the fetched value in seconds. If
+                it is 0, the value is not stored, `fetch` is expected
+                to do that on its own.
+            timeout: The time in seconds the lease is held at most.
+            host: The host of the entry, see `set`.
+            service: The service of the entry, see `set`.
+            generation: The generation of the service before the fetch,
+                the value is not stored if it has changed, see `set`.
+        """
+        delay = self.poll_interval
+        waited = False
+        while True:
+            found, value, _ = await self.aget(key)
+            if found:
+                return value
+            if await self._run(self.acquire, key, timeout):
+                break
+            if not waited:
+                waited = True
+                self.waits += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_poll_interval)
+        try:
+            self.fetches += 1
+            value = await fetch()
+            if ttl > 0:
+                self.aset(key, value, ttl, host, service, generation)
+            return value
+        finally:
+            self._submit(self.release, key)
+
+    def collect_metrics(self) -> List[metrics.Metric]:
+        lookups = metrics.Counter(
+            "omv_mcp_shared_cache_total",
+            "Number of shared cache lookups, fetches and lookups that waited "
+            "for another worker.",
+            ["event"],
+        )
+        for event in ("hits", "misses", "fetches", "waits"):
+            lookups.inc(event, amount=getattr(self, event))
+        return [lookups]
+
+
+def shared_cache_path() -> str:
+    path = config.get("shared_cache.path")
+    if not path:
+        directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+        path = os.path.join(directory, "omv-mcp-{port}.sqlite")
+    return path.format(port=config.get("server.port", 8511))
+
+
+def create_shared_cache() -> Optional[SharedCache]:
+    enabled = config.get("shared_cache.enabled", "auto")
+    if enabled == "auto":
+        enabled = int(config.get("server.workers", 1)) > 1 and config.get(
+            "server.transport"
+        ) in ("http", "streamable-http")
+    if not enabled:
+        return None
+    return SharedCache(
+        shared_cache_path(),
+        mmap_size=int(config.get("shared_cache.mmap_size", 256 * 1024 * 1024)),
+        max_poll_interval=float(config.get("shared_cache.max_poll_interval", 0.25)),
+        generations_interval=float(
+            config.get("shared_cache.generations_interval", 0.5)
+        ),
+    )
+
+
+shared_cache = create_shared_cache()
+if shared_cache is not None:
+    metrics.registry.add_collector(shared_cache.collect_metrics)
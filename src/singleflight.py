@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of openmediavault.
+#
+# @license   https://www.gnu.org/licenses/gpl.html GPL Version 3
+# @author    Volker Theile <volker.theile@openmediavault.org>
+# @copyright Copyright (c) 2025 Volker Theile
+#
+# openmediavault is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# openmediavault is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with openmediavault. If not, see <https://www.gnu.org/licenses/>.
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Protocol
+
+
+class Joinable(Protocol):
+    """
+    State of a call that is merged with the state of the callers that
+    join it, e.g. its priority.
+    """
+
+    def join(self, other: Any) -> None: ...
+
+
+class _Call:
+    __slots__ = ("task", "waiters", "state")
+
+    def __init__(self, task: asyncio.Future, state: Optional[Joinable]):
+        self.task = task
+        self.waiters = 0
+        self.state = state
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key, so that only one of
+    them is executed and all callers share its result or exception.
+    The call is cancelled when all of its callers are gone, e.g. because
+    their MCP requests were cancelled or their deadlines passed.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self.shared = 0
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(
+        self,
+        key: Hashable,
+        fn: Callable[[], Awaitable[Any]],
+        state: Optional[Joinable] = None,
+    ) -> Any:
+        """
+        Execute `fn`, or join the call with the same key that is in
+        flight.
+
+        Args:
+            key: The key of the call.
+            fn: The function that executes the call.
+            state: The state of the caller. If the caller joins a call,
+                it is passed to the `join` method of the state of the
+                caller that started it.
+        """
+        call = self._calls.get(key)
+        if call is None:
+            # Run the call in its own task, so that a cancelled caller
+            # does not abort the call for all the other waiters.
+            call = _Call(asyncio.ensure_future(fn()), state)
+            self._calls[key] = call
+            call.task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.shared += 1
+            if call.state is not None and state is not None:
+                call.state.join(state)
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Nobody is interested in the result anymore. Later
+                # callers start a new call instead of joining this one.
+                self._drop(key, call.task)
+                call.task.cancel()
+
+    def _drop(self, key: Hashable, task: asyncio.Future) -> None:
+        call = self._calls.get(key)
+        if call is not None and call.task is task:
+            del self._calls[key]
+
+    def _forget(self, key: Hashable, task: asyncio.Future) -> None:
+        self._drop(key, task)
+        # Mark the exception as retrieved in case all waiters are gone.
+        if not task.cancelled():
+            task.exception()
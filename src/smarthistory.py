@@ -0,0 +1,574 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of openmediavault.
+#
+# @license   https://www.gnu.org/licenses/gpl.html GPL Version 3
+# @author    Volker Theile <volker.theile@openmediavault.org>
+# @copyright Copyright (c) 2025 Volker Theile
+#
+# openmediavault is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# openmediavault is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with openmediavault. If not, see <https://www.gnu.org/licenses/>.
+import asyncio
+import collections
+import logging
+import math
+import re
+import time
+import weakref
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Dict, List, Optional, Tuple
+
+import metrics
+import scheduler
+from config import config
+from fleet import fleet
+from rpc import RPC
+from utils import gather_limited, lazy_import
+
+# Imported on first use, it takes longer to import than the whole server
+# needs to start otherwise.
+numpy = lazy_import("numpy")
+
+logger = logging.getLogger(__name__)
+
+# The recorded SMART attributes and their IDs, the first one that a
+# disk reports is used, e.g. `Airflow_Temperature_Cel` if a disk has
+# no `Temperature_Celsius`.
+ATTRIBUTES: Dict[str, Tuple[int, ...]] = {
+    "reallocated_sectors": (5,),
+    "pending_sectors": (197,),
+    "uncorrectable_sectors": (198,),
+    "crc_errors": (199,),
+    "temperature": (194, 190),
+    "power_on_hours": (9,),
+}
+
+# The attributes that count defects, any growth is an anomaly.
+COUNTERS = (
+    "reallocated_sectors",
+    "pending_sectors",
+    "uncorrectable_sectors",
+    "crc_errors",
+)
+# The attributes whose value is an anomaly as soon as it is not 0.
+NONZERO = ("pending_sectors", "uncorrectable_sectors")
+# The attributes that are compared with the peer disks.
+COMPARED = COUNTERS + ("temperature",)
+# The minimum number of disks to compare with each other.
+MIN_PEERS = 3
+# The minimum standard deviation of the peer disks, see `zscores`.
+MIN_STD = 1.0
+
+_RAW_VALUE_RE = re.compile(r"\s*(\d+(?:\.\d+)?)")
+
+
+def parse_raw_value(value: Any) -> float:
+    """
+    Parse the raw value of a SMART attribute. smartctl adds details to
+    some of them, e.g. `35 (Min/Max 21/45)` or `12345h+05m+10.123s`,
+    only the leading number is used.
+
+    Returns:
+        The value or NaN if it is not a number.
+    """
+    if isinstance(value, bool):
+        return math.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _RAW_VALUE_RE.match(str(value or ""))
+    return float(match.group(1)) if match else math.nan
+
+
+def extract(attributes: Any) -> Dict[str, float]:
+    """
+    Get the recorded attributes from the response of `Smart.getAttributes`.
+    """
+    if isinstance(attributes, dict):
+        attributes = attributes.get("data", [])
+    by_id = {}
+    for attribute in attributes or []:
+        try:
+            by_id[int(attribute.get("id"))] = attribute
+        except (TypeError, ValueError):
+            continue
+    result = {}
+    for name, ids in ATTRIBUTES.items():
+        value = math.nan
+        for id in ids:
+            if id in by_id:
+                value = parse_raw_value(by_id[id].get("rawvalue"))
+                break
+        result[name] = value
+    return result
+
+
+def in_standby(device: Dict[str, Any], state: Dict[str, Any]) -> bool:
+    """
+    Tell whether a disk of the SMART device list is in standby. rpc.php
+    does not report the power mode, but the temperature of a disk is
+    only known while it is spinning, a disk without it is considered
+    to be in standby, reading its attributes would spin it up. Some
+    disks never report a temperature, e.g. behind USB bridges, so only
+    disks that reported one before are considered.
+
+    Args:
+        device: The disk of the SMART device list.
+        state: The recorded state of the disk, it remembers whether
+            the disk has reported a temperature.
+    """
+    if not math.isnan(parse_raw_value(device.get("temperature"))):
+        state["has_temperature"] = True
+        return False
+    return state.get("has_temperature", False)
+
+
+def _isoformat(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+class ColumnStore:
+    """
+    A fixed-size table of samples stored column by column, i.e. the
+    timestamps, the device IDs and every attribute have their own
+    preallocated array. The oldest sample is overwritten once the
+    table is full.
+    """
+
+    def __init__(self, columns: List[str], capacity: int):
+        self.capacity = capacity
+        self.times = array("d", bytes(8 * capacity))
+        self.devices = array("i", bytes(4 * capacity))
+        self.columns = {name: array("d", bytes(8 * capacity)) for name in columns}
+        self.names: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self.head = 0
+        self.size = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self.capacity * (12 + 8 * len(self.columns))
+
+    def device_id(self, name: str) -> int:
+        if name not in self._ids:
+            self._ids[name] = len(self.names)
+            self.names.append(name)
+        return self._ids[name]
+
+    def append(self, timestamp: float, device: str, values: Dict[str, float]) -> None:
+        self.times[self.head] = timestamp
+        self.devices[self.head] = self.device_id(device)
+        for name, column in self.columns.items():
+            column[self.head] = values.get(name, math.nan)
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def _ordered(self, column: array) -> array:
+        if self.size < self.capacity:
+            return column[: self.size]
+        return column[self.head :] + column[: self.head]
+
+    def select(self, since: float) -> Tuple[array, array, Dict[str, array]]:
+        """
+        Get copies of the samples since the specified time in
+        chronological order.
+
+        Returns:
+            The timestamps, the device IDs and the attribute columns.
+        """
+        times = self._ordered(self.times)
+        i = bisect_left(times, since)
+        return (
+            times[i:],
+            self._ordered(self.devices)[i:],
+            {name: self._ordered(column)[i:] for name, column in self.columns.items()},
+        )
+
+
+def device_trends(
+    times: array, devices: array, values: array, count: int
+) -> Tuple[List[int], List[float], List[float]]:
+    """
+    Calculate the latest value and the least-squares slope of one
+    attribute for all devices at once. The slope is derived from the
+    per-device sums of the samples, so every sample is visited once.
+    NaN values are ignored.
+
+    Args:
+        times: The timestamps of the samples.
+        devices: The device IDs of the samples.
+        values: The attribute values of the samples.
+        count: The number of devices.
+
+    Returns:
+        The number of samples, the latest value and the slope per second
+        of every device, NaN if unknown.
+    """
+    if numpy is not None:
+        t = numpy.frombuffer(times, dtype=numpy.float64)
+        d = numpy.frombuffer(devices, dtype=numpy.int32)
+        x = numpy.frombuffer(values, dtype=numpy.float64)
+        valid = ~numpy.isnan(x)
+        t, d, x = t[valid], d[valid], x[valid]
+        t = t - (t[-1] if len(t) else 0.0)
+        n = numpy.bincount(d, minlength=count).astype(numpy.float64)
+        st = numpy.bincount(d, t, minlength=count)
+        sx = numpy.bincount(d, x, minlength=count)
+        stt = numpy.bincount(d, t * t, minlength=count)
+        stx = numpy.bincount(d, t * x, minlength=count)
+        last = numpy.full(count, -1)
+        numpy.maximum.at(last, d, numpy.arange(len(d)))
+        latest = numpy.where(last >= 0, x[last] if len(x) else numpy.nan, numpy.nan)
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            denominator = n * stt - st * st
+            slope = numpy.where(
+                denominator > 0, (n * stx - st * sx) / denominator, numpy.nan
+            )
+        return n.astype(int).tolist(), latest.tolist(), slope.tolist()
+    n = [0] * count
+    st, sx, stt, stx = ([0.0] * count for _ in range(4))
+    latest = [math.nan] * count
+    offset = times[-1] if len(times) else 0.0
+    for timestamp, device, value in zip(times, devices, values):
+        if math.isnan(value):
+            continue
+        t = timestamp - offset
+        n[device] += 1
+        st[device] += t
+        sx[device] += value
+        stt[device] += t * t
+        stx[device] += t * value
+        latest[device] = value
+    slope = []
+    for i in range(count):
+        denominator = n[i] * stt[i] - st[i] * st[i]
+        slope.append(
+            (n[i] * stx[i] - st[i] * sx[i]) / denominator
+            if denominator > 0
+            else math.nan
+        )
+    return n, latest, slope
+
+
+def zscores(values: List[float]) -> List[float]:
+    """
+    Calculate the z-score of every value against the other values, so
+    that a single deviating disk does not shift the mean and standard
+    deviation it is compared with. The standard deviation is at least
+    `MIN_STD`, the attributes are integer counts or degrees, so a disk
+    with a few CRC errors stands out if all of its peers have none.
+    NaN values are ignored.
+    """
+    if numpy is not None:
+        data = numpy.asarray(values, dtype=numpy.float64)
+        valid = ~numpy.isnan(data)
+        count = numpy.count_nonzero(valid)
+        if count < MIN_PEERS:
+            return [math.nan] * len(values)
+        total, squares = data[valid].sum(), (data[valid] ** 2).sum()
+        mean = (total - data) / (count - 1)
+        variance = (squares - data**2) / (count - 1) - mean**2
+        std = numpy.maximum(numpy.sqrt(numpy.maximum(variance, 0)), MIN_STD)
+        return ((data - mean) / std).tolist()
+    known = [value for value in values if not math.isnan(value)]
+    count = len(known)
+    if count < MIN_PEERS:
+        return [math.nan] * len(values)
+    total, squares = sum(known), sum(value * value for value in known)
+    result = []
+    for value in values:
+        if math.isnan(value):
+            result.append(math.nan)
+            continue
+        mean = (total - value) / (count - 1)
+        variance = (squares - value * value) / (count - 1) - mean * mean
+        std = max(math.sqrt(max(variance, 0)), MIN_STD)
+        result.append((value - mean) / std)
+    return result
+
+
+def _round(value: float) -> Optional[float]:
+    return None if math.isnan(value) else round(value, 3)
+
+
+class SmartHistory:
+    """
+    The recorded SMART attributes of the disks of a host.
+    """
+
+    def __init__(self, capacity: int):
+        self.store = ColumnStore(list(ATTRIBUTES), capacity)
+        # The latest entry of the SMART device list and the sampling
+        # state of every disk.
+        self.devices: Dict[str, Dict[str, Any]] = {}
+
+    def analyze(self, window: float, threshold: float) -> List[Dict[str, Any]]:
+        """
+        Detect anomalies of all disks within the specified window: defect
+        counters that grow or are not 0, and values that deviate from
+        the peer disks of the same model by more than `threshold`
+        standard deviations. If there are not enough disks of the same
+        model, all disks are the peers.
+
+        Returns:
+            The analysis of every disk, the ones with the most anomalies
+            first.
+        """
+        times, devices, columns = self.store.select(time.time() - window)
+        count = len(self.store.names)
+        trends = {
+            name: device_trends(times, devices, column, count)
+            for name, column in columns.items()
+        }
+        # Group the disks by model to compare them with their peers.
+        models: Dict[str, List[int]] = {}
+        for i, name in enumerate(self.store.names):
+            model = self.devices.get(name, {}).get("model") or ""
+            models.setdefault(model, []).append(i)
+        latest = {name: trends[name][1] for name in COMPARED}
+        overall = {name: zscores(latest[name]) for name in COMPARED}
+        scores = {name: [math.nan] * count for name in COMPARED}
+        peers = ["all"] * count
+        for model, group in models.items():
+            if model == "" or len(group) < MIN_PEERS:
+                for name in COMPARED:
+                    for i in group:
+                        scores[name][i] = overall[name][i]
+                continue
+            for name in COMPARED:
+                group_scores = zscores([latest[name][i] for i in group])
+                for i, score in zip(group, group_scores):
+                    scores[name][i] = score
+            for i in group:
+                peers[i] = "model"
+        result = []
+        for i, device in enumerate(self.store.names):
+            state = self.devices.get(device, {})
+            samples = max(trends[name][0][i] for name in ATTRIBUTES)
+            values = {name: _round(trends[name][1][i]) for name in ATTRIBUTES}
+            growth = {name: _round(trends[name][2][i] * 86400) for name in ATTRIBUTES}
+            anomalies = []
+            for name in COUNTERS:
+                if (growth[name] or 0) > 0:
+                    anomalies.append(
+                        {
+                            "attribute": name,
+                            "kind": "growing",
+                            "detail": f"grows by {growth[name]} per day",
+                        }
+                    )
+            for name in NONZERO:
+                if (values[name] or 0) > 0:
+                    anomalies.append(
+                        {
+                            "attribute": name,
+                            "kind": "nonzero",
+                            "detail": f"{values[name]:g} sectors",
+                        }
+                    )
+            for name in COMPARED:
+                score = scores[name][i]
+                if not math.isnan(score) and score > threshold:
+                    anomalies.append(
+                        {
+                            "attribute": name,
+                            "kind": "outlier",
+                            "detail": f"z-score {score:.2f} against the {'disks of the same model' if peers[i] == 'model' else 'other disks'}",
+                        }
+                    )
+            result.append(
+                {
+                    "devicefile": device,
+                    "model": state.get("model"),
+                    "serialnumber": state.get("serialnumber"),
+                    "overallstatus": state.get("overallstatus"),
+                    "standby": state.get("standby", False),
+                    "last_sampled": None
+                    if state.get("sampled") is None
+                    else _isoformat(state["sampled"]),
+                    "samples": samples,
+                    "latest": values,
+                    "growth_per_day": growth,
+                    "zscores": {name: _round(scores[name][i]) for name in COMPARED},
+                    "peers": peers[i],
+                    "anomalies": anomalies,
+                }
+            )
+        return sorted(
+            result, key=lambda item: (-len(item["anomalies"]), item["devicefile"])
+        )
+
+    def history(self, device: str, window: float) -> Dict[str, Any]:
+        times, devices, columns = self.store.select(time.time() - window)
+        if device not in self.store.names:
+            raise ValueError(f"No SMART attributes of '{device}' have been recorded")
+        id = self.store.device_id(device)
+        rows = [
+            [_isoformat(times[i])] + [_round(columns[name][i]) for name in ATTRIBUTES]
+            for i in range(len(times))
+            if devices[i] == id
+        ]
+        return {
+            "devicefile": device,
+            "columns": ["time"] + list(ATTRIBUTES),
+            "rows": rows,
+        }
+
+
+class SmartSampler:
+    """
+    Record the SMART attributes of the disks of every host in the
+    background. Disks in standby are skipped, so that they are not spun
+    up just to be sampled, see `in_standby`.
+    """
+
+    def __init__(
+        self,
+        interval: float = 3600,
+        capacity: int = 50000,
+        skip_standby: bool = True,
+        concurrency: int = 4,
+    ):
+        self.interval = interval
+        self.capacity = capacity
+        self.skip_standby = skip_standby
+        self.concurrency = concurrency
+        self.skipped: Dict[str, int] = collections.defaultdict(int)
+        self._histories: weakref.WeakKeyDictionary[RPC, SmartHistory] = (
+            weakref.WeakKeyDictionary()
+        )
+        self._task: Optional[asyncio.Task] = None
+
+    def history(self, rpc: RPC) -> SmartHistory:
+        if rpc not in self._histories:
+            self._histories[rpc] = SmartHistory(self.capacity)
+        return self._histories[rpc]
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._poll(), name="smart-history")
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def sample(self, rpc: RPC) -> int:
+        """
+        Record the SMART attributes of all disks of a host that are not
+        in standby.
+
+        Returns:
+            The number of sampled disks.
+        """
+        history = self.history(rpc)
+        resp = await rpc.arequest("Smart", "getList", {"start": 0, "limit": -1})
+        devices = resp.get("data", []) if isinstance(resp, dict) else resp
+        awake = []
+        for device in devices or []:
+            state = history.devices.setdefault(device["devicefile"], {})
+            state.update(
+                {
+                    field: device.get(field)
+                    for field in ("model", "serialnumber", "overallstatus")
+                }
+            )
+            state["standby"] = in_standby(device, state) and self.skip_standby
+            if state["standby"]:
+                self.skipped[rpc.name] += 1
+                logger.debug(f"Skipping {device['devicefile']}, it is in standby")
+            else:
+                awake.append(device)
+
+        def fetch(device: Dict[str, Any]) -> Awaitable[Any]:
+            def call() -> Awaitable[Any]:
+                return rpc.arequest(
+                    "Smart", "getAttributes", {"devicefile": device["devicefile"]}
+                )
+
+            if rpc.shared is None:
+                return call()
+            # The workers sample the same disks, the attributes are
+            # read once and shared for half an interval.
+            return rpc.shared.once(
+                f"smart:{rpc.name}:{device['devicefile']}", call, self.interval / 2
+            )
+
+        results = await gather_limited(awake, fetch, self.concurrency)
+        now = time.time()
+        sampled = 0
+        for device, result in zip(awake, results):
+            state = history.devices[device["devicefile"]]
+            if isinstance(result, Exception):
+                state["error"] = str(result)
+                logger.warning(
+                    f"Failed to read the SMART attributes of {device['devicefile']}: {result}"
+                )
+                continue
+            values = extract(result)
+            # NVMe devices have no attributes, but report their temperature.
+            if math.isnan(values["temperature"]):
+                values["temperature"] = parse_raw_value(device.get("temperature"))
+            history.store.append(now, device["devicefile"], values)
+            state["sampled"], state["error"] = now, None
+            sampled += 1
+        return sampled
+
+    async def _poll(self) -> None:
+        with scheduler.priority("background"):
+            while True:
+                started = time.monotonic()
+                for name in fleet.names:
+                    try:
+                        await self.sample(fleet.get(name))
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        logger.warning(
+                            f"Failed to sample the SMART attributes of host '{name}': {e}"
+                        )
+                await asyncio.sleep(
+                    max(self.interval - (time.monotonic() - started), 0)
+                )
+
+    def collect_metrics(self) -> List[metrics.Metric]:
+        samples = metrics.Gauge(
+            "omv_mcp_smart_history_samples",
+            "Number of recorded SMART attribute samples.",
+            ["host"],
+        )
+        skipped = metrics.Counter(
+            "omv_mcp_smart_standby_skipped_total",
+            "Number of times a disk was not sampled because it is in standby.",
+            ["host"],
+        )
+        for name in fleet.names:
+            history = self._histories.get(fleet.get(name))
+            samples.inc(name, amount=0 if history is None else history.store.size)
+            skipped.inc(name, amount=self.skipped.get(name, 0))
+        return [samples, skipped]
+
+
+smart_sampler = SmartSampler(
+    interval=float(config.get("smart.history.interval", 3600)),
+    capacity=int(config.get("smart.history.capacity", 50000)),
+    skip_standby=bool(config.get("smart.history.skip_standby", True)),
+    concurrency=int(config.get("smart.concurrency", 4)),
+)
+metrics.registry.add_collector(smart_sampler.collect_metrics)
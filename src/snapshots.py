@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of openmediavault.
+#
+# @license   https://www.gnu.org/licenses/gpl.html GPL Version 3
+# @author    Volker Theile <volker.theile@openmediavault.org>
+# @copyright Copyright (c) 2025 Volker Theile
+#
+# openmediavault is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# openmediavault is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with openmediavault. If not, see <https://www.gnu.org/licenses/>.
+import asyncio
+import logging
+import time
+import weakref
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastmcp import FastMCP
+from mcp.server.session import ServerSession
+from pydantic import AnyUrl
+
+import scheduler
+from sharedcache import SharedCache, shared_cache
+from utils import content_hash
+
+logger = logging.getLogger(__name__)
+
+
+class Snapshot:
+    def __init__(self, fetch: Callable[[], Awaitable[Any]], interval: float):
+        self.fetch = fetch
+        self.interval = interval
+        self.data: Any = None
+        self.digest: Optional[str] = None
+        self.updated: Optional[float] = None
+        self.changed: Optional[float] = None
+        self.error: Optional[str] = None
+        self.lock = asyncio.Lock()
+
+    def meta(self) -> Dict[str, Any]:
+        age = None if self.updated is None else time.time() - self.updated
+        return {
+            "updated": None
+            if self.updated is None
+            else datetime.fromtimestamp(self.updated, timezone.utc).isoformat(),
+            "age": None if age is None else round(age, 3),
+            "interval": self.interval,
+            "stale": age is None or age > 2 * self.interval,
+            "version": self.digest,
+            "error": self.error,
+        }
+
+
+class SnapshotPoller:
+    """
+    Refresh the registered snapshots in the background and serve them
+    from memory. Subscribed clients are notified via MCP
+    `notifications/resources/updated` whenever the content of a
+    snapshot actually changes.
+    """
+
+    def __init__(self, shared: Optional[SharedCache] = None):
+        self._shared = shared
+        self._snapshots: Dict[str, Snapshot] = {}
+        self._subscribers: Dict[str, weakref.WeakSet] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def register(
+        self, uri: str, fetch: Callable[[], Awaitable[Any]], interval: float
+    ) -> None:
+        self._snapshots[uri] = Snapshot(fetch, interval)
+
+    @property
+    def running(self) -> bool:
+        return len(self._tasks) > 0
+
+    async def start(self) -> None:
+        for uri, snapshot in self._snapshots.items():
+            if snapshot.interval > 0 and uri not in self._tasks:
+                self._tasks[uri] = asyncio.create_task(
+                    self._poll(uri), name=f"snapshot:{uri}"
+                )
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def get(self, uri: str) -> Any:
+        """
+        Get the content of the snapshot with the staleness information
+        attached. If the snapshot has not been fetched yet, or nobody
+        refreshes it in the background, it is refreshed first.
+        """
+        snapshot = self._snapshots[uri]
+        if snapshot.updated is None or uri not in self._tasks:
+            await self.refresh(uri)
+        if isinstance(snapshot.data, dict):
+            return snapshot.data | {"snapshot": snapshot.meta()}
+        return {"data": snapshot.data, "snapshot": snapshot.meta()}
+
+    async def refresh(self, uri: str) -> bool:
+        """
+        Fetch the content of the snapshot and notify the subscribers
+        if it has changed.
+
+        Returns:
+            `True` if the content has changed, otherwise `False`.
+        """
+        snapshot = self._snapshots[uri]
+        async with snapshot.lock:
+            try:
+                if self._shared is not None and snapshot.interval > 0:
+                    # Every worker polls the snapshot, but only one of
+                    # them fetches it per interval.
+                    data = await self._shared.once(
+                        f"snapshot:{uri}", snapshot.fetch, snapshot.interval
+                    )
+                else:
+                    data = await snapshot.fetch()
+            except Exception as e:
+                snapshot.error = str(e)
+                if snapshot.data is None:
+                    raise
+                logger.warning(f"Failed to refresh snapshot {uri}: {e}")
+                return False
+            digest = content_hash(data)
+            now = time.time()
+            changed = digest != snapshot.digest
+            snapshot.data, snapshot.updated, snapshot.error = data, now, None
+            if changed:
+                snapshot.digest, snapshot.changed = digest, now
+        if changed:
+            await self._notify(uri)
+        return changed
+
+    async def _poll(self, uri: str) -> None:
+        with scheduler.priority("background"):
+            snapshot = self._snapshots[uri]
+            while True:
+                try:
+                    await self.refresh(uri)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"Failed to refresh snapshot {uri}: {e}")
+                await asyncio.sleep(snapshot.interval)
+
+    def subscribe(self, uri: str, session: ServerSession) -> None:
+        self._subscribers.setdefault(uri, weakref.WeakSet()).add(session)
+
+    def unsubscribe(self, uri: str, session: ServerSession) -> None:
+        self._subscribers.get(uri, weakref.WeakSet()).discard(session)
+
+    async def _notify(self, uri: str) -> None:
+        for session in list(self._subscribers.get(uri, ())):
+            try:
+                await session.send_resource_updated(AnyUrl(uri))
+            except Exception as e:
+                logger.debug(f"Failed to notify subscriber about {uri}: {e}")
+                self.unsubscribe(uri, session)
+
+    def attach(self, server: FastMCP) -> None:
+        """
+        Handle the MCP `resources/subscribe` and `resources/unsubscribe`
+        requests of the specified server.
+        """
+        mcp_server = server._mcp_server
+
+        @mcp_server.subscribe_resource()
+        async def _subscribe(uri: AnyUrl) -> None:
+            self.subscribe(str(uri), mcp_server.request_context.session)
+
+        @mcp_server.unsubscribe_resource()
+        async def _unsubscribe(uri: AnyUrl) -> None:
+            self.unsubscribe(str(uri), mcp_server.request_context.session)
+
+        # The MCP SDK does not announce the subscription capability on
+        # its own, even if the handlers are registered.
+        get_capabilities = mcp_server.get_capabilities
+
+        def _get_capabilities(*args, **kwargs):
+            capabilities = get_capabilities(*args, **kwargs)
+            if capabilities.resources is not None:
+                capabilities.resources.subscribe = True
+            return capabilities
+
+        mcp_server.get_capabilities = _get_capabilities
+
+
+poller = SnapshotPoller(shared_cache)
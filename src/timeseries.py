@@ -0,0 +1,495 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of openmediavault.
+#
+# @license   https://www.gnu.org/licenses/gpl.html GPL Version 3
+# @author    Volker Theile <volker.theile@openmediavault.org>
+# @copyright Copyright (c) 2025 Volker Theile
+#
+# openmediavault is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# openmediavault is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with openmediavault. If not, see <https://www.gnu.org/licenses/>.
+import asyncio
+import logging
+import math
+import time
+import weakref
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import metrics
+import scheduler
+from config import config
+from fleet import fleet
+from rpc import RPC
+from utils import lazy_import
+
+# Imported on first use, it takes longer to import than the whole server
+# needs to start otherwise.
+numpy = lazy_import("numpy")
+
+logger = logging.getLogger(__name__)
+
+# The downsampling tiers, their resolution in seconds and the default
+# number of points they keep: a day of minutes, 30 days of hours and
+# two years of days.
+TIERS: Dict[str, Tuple[float, int]] = {
+    "1m": (60, 1440),
+    "1h": (3600, 720),
+    "1d": (86400, 730),
+}
+
+# The percentiles reported by the trends.
+PERCENTILES = (50, 90, 95, 99)
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def _isoformat(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+class RingBuffer:
+    """
+    A fixed-size ring of timestamps and values. The points are stored
+    in two preallocated arrays of doubles, the oldest point is
+    overwritten once the buffer is full.
+    """
+
+    __slots__ = ("times", "values", "head", "size")
+
+    def __init__(self, capacity: int):
+        self.times = array("d", bytes(8 * capacity))
+        self.values = array("d", bytes(8 * capacity))
+        self.head = 0
+        self.size = 0
+
+    @property
+    def capacity(self) -> int:
+        return len(self.times)
+
+    def append(self, timestamp: float, value: float) -> None:
+        self.times[self.head] = timestamp
+        self.values[self.head] = value
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def arrays(self) -> Tuple[array, array]:
+        """
+        Get copies of the timestamps and values in chronological order.
+        """
+        if self.size < self.capacity:
+            return self.times[: self.size], self.values[: self.size]
+        head = self.head
+        return (
+            self.times[head:] + self.times[:head],
+            self.values[head:] + self.values[:head],
+        )
+
+
+class Tier:
+    """
+    Downsample the values of a series into buckets of the specified
+    resolution. A bucket is stored as the mean of its values once the
+    first value of the next bucket arrives.
+    """
+
+    __slots__ = ("name", "resolution", "buffer", "bucket", "sum", "count")
+
+    def __init__(self, name: str, resolution: float, capacity: int):
+        self.name = name
+        self.resolution = resolution
+        self.buffer = RingBuffer(capacity)
+        self.bucket: Optional[int] = None
+        self.sum = 0.0
+        self.count = 0
+
+    def add(self, timestamp: float, value: float) -> None:
+        bucket = int(timestamp // self.resolution)
+        if bucket != self.bucket and self.count > 0:
+            self.buffer.append(self.bucket * self.resolution, self.sum / self.count)
+            self.sum, self.count = 0.0, 0
+        self.bucket = bucket
+        self.sum += value
+        self.count += 1
+
+    def points(self, since: float) -> Tuple[array, array]:
+        """
+        Get the points since the specified time, including the mean of
+        the current, incomplete bucket.
+        """
+        times, values = self.buffer.arrays()
+        if self.count > 0:
+            times.append(self.bucket * self.resolution)
+            values.append(self.sum / self.count)
+        i = bisect_left(times, since)
+        return times[i:], values[i:]
+
+
+class Series:
+    """
+    A time series that is downsampled into all tiers at once, so its
+    memory usage is fixed no matter how long it is recorded.
+    """
+
+    __slots__ = ("tiers", "labels", "updated", "latest")
+
+    def __init__(self, tiers: Dict[str, Tuple[float, int]], labels: Dict[str, Any]):
+        self.tiers = [
+            Tier(name, resolution, capacity)
+            for name, (resolution, capacity) in tiers.items()
+        ]
+        self.labels = labels
+        self.updated: Optional[float] = None
+        self.latest: Optional[float] = None
+
+    def add(self, timestamp: float, value: float) -> None:
+        for tier in self.tiers:
+            tier.add(timestamp, value)
+        self.updated, self.latest = timestamp, value
+
+    def points(self, window: float) -> Tuple[str, array, array]:
+        """
+        Get the points of the last `window` seconds from the tier that
+        covers the longest period of it. If several tiers cover the
+        same period, the finest one is used, e.g. the minutes of the
+        last day if the server has not been running any longer.
+
+        Returns:
+            The name of the tier, the timestamps and the values.
+        """
+        since = time.time() - window
+        result = None
+        best = -1.0
+        for tier in self.tiers:
+            times, values = tier.points(since)
+            covered = times[-1] - times[0] if len(times) > 0 else -1.0
+            if covered > best:
+                result, best = (tier.name, times, values), covered
+        return result
+
+
+def percentiles(values: array) -> Dict[str, float]:
+    if numpy is not None:
+        data = numpy.frombuffer(values, dtype=numpy.float64)
+        return dict(
+            zip(
+                (f"p{p}" for p in PERCENTILES),
+                numpy.percentile(data, PERCENTILES).tolist(),
+            )
+        )
+    data = sorted(values)
+    result = {}
+    for p in PERCENTILES:
+        # Linear interpolation between the closest ranks like NumPy.
+        rank = (len(data) - 1) * p / 100
+        lower = math.floor(rank)
+        upper = min(lower + 1, len(data) - 1)
+        result[f"p{p}"] = data[lower] + (data[upper] - data[lower]) * (rank - lower)
+    return result
+
+
+def linear_fit(times: array, values: array) -> Tuple[float, float]:
+    """
+    Fit a line through the points by the method of least squares.
+
+    Returns:
+        The slope per second and the value of the line at the time of
+        the last point.
+    """
+    if len(times) < 2:
+        return 0.0, values[-1]
+    if numpy is not None:
+        t = numpy.frombuffer(times, dtype=numpy.float64)
+        v = numpy.frombuffer(values, dtype=numpy.float64)
+        t = t - t[-1]
+        t_mean, v_mean = t.mean(), v.mean()
+        variance = numpy.dot(t - t_mean, t - t_mean)
+        if variance == 0:
+            return 0.0, float(v[-1])
+        slope = float(numpy.dot(t - t_mean, v - v_mean) / variance)
+        return slope, float(v_mean - slope * t_mean)
+    t = [x - times[-1] for x in times]
+    n = len(t)
+    t_mean, v_mean = sum(t) / n, sum(values) / n
+    variance = sum((x - t_mean) ** 2 for x in t)
+    if variance == 0:
+        return 0.0, values[-1]
+    slope = sum((x - t_mean) * (y - v_mean) for x, y in zip(t, values)) / variance
+    return slope, v_mean - slope * t_mean
+
+
+def summarize(tier: str, times: array, values: array) -> Dict[str, Any]:
+    if len(values) == 0:
+        return {"tier": tier, "points": 0}
+    slope, _ = linear_fit(times, values)
+    return {
+        "tier": tier,
+        "points": len(values),
+        "since": _isoformat(times[0]),
+        "latest": values[-1],
+        "min": min(values),
+        "max": max(values),
+        "mean": sum(values) / len(values),
+        **percentiles(values),
+        "change": values[-1] - values[0],
+        "slope_per_hour": slope * 3600,
+    }
+
+
+class TimeSeriesStore:
+    """
+    Keep the recorded time series of every host. The number of series
+    per host is limited, the least recently updated series is dropped
+    first, e.g. the one of a filesystem that has been removed.
+    """
+
+    def __init__(
+        self,
+        tiers: Optional[Dict[str, Tuple[float, int]]] = None,
+        max_series: int = 1024,
+    ):
+        self.tiers = tiers or TIERS
+        self.max_series = max_series
+        self._series: weakref.WeakKeyDictionary[RPC, OrderedDict[str, Series]] = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def add(
+        self,
+        rpc: RPC,
+        name: str,
+        timestamp: float,
+        value: Any,
+        labels: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        value = _number(value)
+        if value is None:
+            return
+        series = self._series.setdefault(rpc, OrderedDict())
+        if name not in series:
+            series[name] = Series(self.tiers, labels or {})
+            while len(series) > self.max_series:
+                series.popitem(last=False)
+        elif labels:
+            series[name].labels = labels
+        series.move_to_end(name)
+        series[name].add(timestamp, value)
+
+    def series(self, rpc: RPC, prefix: str = "") -> Dict[str, Series]:
+        return {
+            name: series
+            for name, series in self._series.get(rpc, {}).items()
+            if name.startswith(prefix)
+        }
+
+    def trends(
+        self, rpc: RPC, names: Optional[List[str]] = None, window: float = 86400
+    ) -> Dict[str, Any]:
+        """
+        Summarize the recorded series of a host over the specified
+        window, e.g. the mean, the percentiles and the slope.
+
+        Args:
+            rpc: The RPC client of the host.
+            names: The names of the series or their prefix, e.g. `load`
+                or `filesystem`. Defaults to the system metrics.
+            window: The period to summarize in seconds.
+
+        Returns:
+            A dictionary with the summary of every series.
+        """
+        recorded = self._series.get(rpc, {})
+        selected = [
+            name
+            for name in recorded
+            if (names is None and not name.startswith("filesystem."))
+            or (names is not None and any(name.startswith(n) for n in names))
+        ]
+        result = {}
+        for name in sorted(selected):
+            series = recorded[name]
+            result[name] = summarize(*series.points(window))
+            if series.labels:
+                result[name]["labels"] = series.labels
+        return {"window": window, "metrics": result}
+
+    def forecast(self, rpc: RPC, window: float = 7 * 86400) -> List[Dict[str, Any]]:
+        """
+        Extrapolate the usage of every filesystem of a host linearly
+        from its fill rate within the specified window.
+
+        Returns:
+            The forecast per filesystem, the ones that are filling up
+            the fastest first.
+        """
+        result = []
+        for name, series in self.series(rpc, "filesystem.").items():
+            if not name.endswith(".used"):
+                continue
+            tier, times, values = series.points(window)
+            if len(values) == 0:
+                continue
+            slope, _ = linear_fit(times, values)
+            size = _number(series.labels.get("size"))
+            used = values[-1]
+            seconds = None
+            if size is not None and slope > 0:
+                seconds = max(size - used, 0) / slope
+            result.append(
+                {
+                    "uuid": series.labels.get("uuid"),
+                    "label": series.labels.get("label"),
+                    "devicefile": series.labels.get("devicefile"),
+                    "mountpoint": series.labels.get("mountpoint"),
+                    "size": size,
+                    "used": used,
+                    "percentage": None if not size else round(used * 100 / size, 2),
+                    "fill_rate_per_day": slope * 86400,
+                    "days_until_full": None
+                    if seconds is None
+                    else round(seconds / 86400, 2),
+                    "full_at": None
+                    if seconds is None
+                    else _isoformat(time.time() + seconds),
+                    "tier": tier,
+                    "points": len(values),
+                    "since": _isoformat(times[0]),
+                }
+            )
+        return sorted(
+            result,
+            key=lambda item: (
+                item["days_until_full"] is None,
+                item["days_until_full"] or 0,
+            ),
+        )
+
+    def collect_metrics(self) -> List[metrics.Metric]:
+        size = metrics.Gauge(
+            "omv_mcp_timeseries", "Number of recorded time series.", ["host"]
+        )
+        nbytes = metrics.Gauge(
+            "omv_mcp_timeseries_bytes",
+            "Memory allocated by the ring buffers of the time series.",
+            ["host"],
+        )
+        per_series = sum(16 * capacity for _, capacity in self.tiers.values())
+        for name in fleet.names:
+            count = len(self._series.get(fleet.get(name), {}))
+            size.inc(name, amount=count)
+            nbytes.inc(name, amount=count * per_series)
+        return [size, nbytes]
+
+
+class Sampler:
+    """
+    Record the CPU, memory and load of every host and the usage of
+    their filesystems in the background.
+    """
+
+    def __init__(self, store: TimeSeriesStore, interval: float = 60):
+        self.store = store
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._poll(), name="timeseries")
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def sample(self, rpc: RPC) -> None:
+        async def fetch() -> List[Any]:
+            return await asyncio.gather(
+                rpc.arequest("System", "getInformation"),
+                rpc.arequest("FileSystemMgmt", "getList", {"start": 0, "limit": -1}),
+            )
+
+        if rpc.shared is None:
+            info, filesystems = await fetch()
+        else:
+            # The workers take the samples of the first one of them.
+            info, filesystems = await rpc.shared.once(
+                f"sample:{rpc.name}", fetch, self.interval / 2
+            )
+        now = time.time()
+        add = self.store.add
+        add(rpc, "cpu.utilization", now, info.get("cpuUtilization"))
+        add(rpc, "memory.used", now, info.get("memUsed"))
+        total, used = _number(info.get("memTotal")), _number(info.get("memUsed"))
+        if total and used is not None:
+            add(rpc, "memory.percentage", now, used * 100 / total)
+        for period, value in (info.get("loadAverage") or {}).items():
+            add(rpc, f"load.{period}", now, value)
+        if isinstance(filesystems, dict):
+            filesystems = filesystems.get("data", [])
+        for fs in filesystems or []:
+            key = fs.get("uuid") or fs.get("devicefile")
+            if not key or not fs.get("mounted", True):
+                continue
+            labels = {
+                field: fs.get(field)
+                for field in ("uuid", "label", "devicefile", "mountpoint", "size")
+            }
+            add(rpc, f"filesystem.{key}.used", now, fs.get("used"), labels)
+            add(rpc, f"filesystem.{key}.percentage", now, fs.get("percentage"), labels)
+
+    async def _poll(self) -> None:
+        with scheduler.priority("background"):
+            while True:
+                started = time.monotonic()
+                for name in fleet.names:
+                    try:
+                        await self.sample(fleet.get(name))
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        logger.warning(f"Failed to sample host '{name}': {e}")
+                await asyncio.sleep(
+                    max(self.interval - (time.monotonic() - started), 0)
+                )
+
+
+def _tiers() -> Dict[str, Tuple[float, int]]:
+    retention = config.get("timeseries.retention", {}) or {}
+    tiers = {
+        name: (resolution, int(retention.get(name, capacity)))
+        for name, (resolution, capacity) in TIERS.items()
+    }
+    return {name: tier for name, tier in tiers.items() if tier[1] > 0}
+
+
+timeseries = TimeSeriesStore(
+    tiers=_tiers(), max_series=int(config.get("timeseries.max_series", 1024))
+)
+sampler = Sampler(timeseries, interval=float(config.get("timeseries.interval", 60)))
+metrics.registry.add_collector(timeseries.collect_metrics)
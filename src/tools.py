@@ -18,18 +18,72 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with openmediavault. If not, see <https://www.gnu.org/licenses/>.
-from typing import Any, Dict, List, Optional
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Literal, Optional, Set, Union
 
-from rpc import rpc
+from fastmcp import Context
+
+import deadlines
+import scheduler
+from config import config
+from fleet import HostSelector, fleet
+from indexes import indexes
+from jobs import jobs
+from listing import format_size, query_list
+from search import search_entities
 from server import server
+from smarthistory import smart_sampler
+from timeseries import sampler, timeseries
+from utils import gather_limited
+
+# The columns of the list tools in `table` output mode if no fields
+# are requested. They cover what is needed to identify and assess an
+# entry, the remaining fields can be requested explicitly.
+TABLE_COLUMNS: Dict[str, List[str]] = {
+    "list_disks": [
+        "devicefile",
+        "model",
+        "vendor",
+        "serialnumber",
+        "size",
+        "israid",
+        "isroot",
+    ],
+    "list_filesystems": [
+        "devicefile",
+        "label",
+        "type",
+        "mountpoint",
+        "size",
+        "used",
+        "available",
+        "percentage",
+        "mounted",
+    ],
+    "list_smart": [
+        "devicefile",
+        "model",
+        "serialnumber",
+        "temperature",
+        "overallstatus",
+        "monitor",
+    ],
+    "list_users": ["name", "uid", "gid", "comment", "email", "groups"],
+    "list_groups": ["name", "gid", "members", "comment", "system"],
+    "list_shared_folders": ["uuid", "name", "reldirpath", "mntentref", "comment"],
+}
 
 
 @server.tool(annotations={"openWorldHint": True})
-def reboot() -> Dict[str, Any]:
+async def reboot(host: Optional[str] = None) -> Dict[str, Any]:
     """
     A tool that reboots the system.
+
+    Args:
+        host: The name of the host, defaults to the default host.
     """
-    rpc.request("System", "reboot")
+    rpc = fleet.get(host)
+    await rpc.arequest("System", "reboot")
     return {
         "success": True,
         "message": "The system will be rebooted.",
@@ -37,11 +91,15 @@ def reboot() -> Dict[str, Any]:
 
 
 @server.tool(annotations={"openWorldHint": True})
-def shutdown() -> Dict[str, Any]:
+async def shutdown(host: Optional[str] = None) -> Dict[str, Any]:
     """
     A tool that shuts down the system.
+
+    Args:
+        host: The name of the host, defaults to the default host.
     """
-    rpc.request("System", "shutdown")
+    rpc = fleet.get(host)
+    await rpc.arequest("System", "shutdown")
     return {
         "success": True,
         "message": "The system will be shut down.",
@@ -49,169 +107,668 @@ def shutdown() -> Dict[str, Any]:
 
 
 @server.tool(annotations={"openWorldHint": True})
-def standby() -> Dict[str, Any]:
+async def standby(host: Optional[str] = None) -> Dict[str, Any]:
     """
     A tool that puts the system into standby mode.
+
+    Args:
+        host: The name of the host, defaults to the default host.
     """
-    rpc.request("System", "standby")
+    rpc = fleet.get(host)
+    await rpc.arequest("System", "standby")
     return {
         "success": True,
         "message": "The system will go into standby mode.",
     }
 
 
+@server.tool(annotations={"readOnlyHint": True}, tags=["fleet"])
+async def list_hosts() -> Dict[str, Any]:
+    """
+    List the openmediavault hosts this server gives access to. The
+    names can be used to select the host(s) in the other tools.
+
+    Returns:
+        A dictionary containing the name of the default host and the
+        name and URL of each host.
+    """
+    return {"default": fleet.default, "hosts": fleet.describe()}
+
+
 @server.tool(annotations={"openWorldHint": True}, tags=["system", "diagnostics"])
-def get_system_information() -> Dict[str, Any]:
+async def get_system_information(host: HostSelector = None) -> Dict[str, Any]:
     """
     Get system information, e.g. hostname, CPU model, CPU usage,
     memory usage, load average, date and time, version, uptime, etc.
 
+    Args:
+        host: The name of the host to query, a list of host names or `*`
+            to query all hosts concurrently. Defaults to the default host.
+
     Returns:
          A dictionary containing the system information.
     """
-    return rpc.request("System", "getInformation")
+    return await fleet.run(host, lambda rpc: rpc.arequest("System", "getInformation"))
+
+
+@server.tool(annotations={"readOnlyHint": True}, tags=["system", "diagnostics"])
+async def get_metric_trends(
+    metrics: Optional[List[str]] = None,
+    hours: float = 24,
+    host: HostSelector = None,
+) -> Dict[str, Any]:
+    """
+    Get the trends of the CPU utilization, memory usage and load that
+    are sampled in the background, e.g. the mean, the percentiles and
+    the slope per hour. Unlike `get_system_information` this tells how
+    the values developed over time.
+
+    Args:
+        metrics: The names of the metrics or their prefixes, e.g.
+            `cpu.utilization`, `memory`, `load.5min` or `filesystem` for
+            the usage of all filesystems. Defaults to the system metrics.
+        hours: The period to summarize. The minutes of the last day,
+            the hours of the last 30 days and the days of the last two
+            years are kept.
+        host: The name of the host to query, a list of host names or `*`
+            to query all hosts concurrently. Defaults to the default host.
+
+    Returns:
+        A dictionary containing the summary of every metric.
+    """
+
+    async def trends(rpc) -> Dict[str, Any]:
+        return timeseries.trends(rpc, metrics, hours * 3600) | {
+            "interval": sampler.interval if sampler.running else None
+        }
+
+    return await fleet.run(host, trends)
+
+
+@server.tool(
+    annotations={"readOnlyHint": True}, tags=["system", "storage", "filesystem"]
+)
+async def forecast_filesystems(
+    days: float = 7, human_readable: bool = False, host: HostSelector = None
+) -> Dict[str, Any]:
+    """
+    Forecast when the filesystems will be full. The fill rate is derived
+    from the usage that is sampled in the background by a linear fit,
+    so the forecast gets more reliable the longer the server is running.
+
+    Args:
+        days: The period the fill rate is derived from.
+        human_readable: Convert sizes in bytes into human-readable sizes
+            like `3.64 TiB`.
+        host: The name of the host to query, a list of host names or `*`
+            to query all hosts concurrently. Defaults to the default host.
+
+    Returns:
+        A dictionary containing the forecast per filesystem, the ones that
+        will be full the soonest first. `days_until_full` is `null` if the
+        usage does not grow.
+    """
+
+    async def forecast(rpc) -> Dict[str, Any]:
+        data = timeseries.forecast(rpc, days * 86400)
+        if human_readable:
+            for item in data:
+                item["size"] = format_size(item["size"])
+                item["used"] = format_size(item["used"])
+                item["fill_rate_per_day"] = (
+                    f"{format_size(item['fill_rate_per_day'])}/day"
+                )
+        return {"total": len(data), "data": data}
+
+    return await fleet.run(host, forecast)
 
 
 @server.tool(
     annotations={"openWorldHint": True},
     tags=["system", "storage", "disk", "HDD", "SSD", "NVMe"],
 )
-def list_disks() -> Dict[str, Any]:
+async def list_disks(
+    start: int = 0,
+    limit: Optional[int] = None,
+    sort: Optional[str] = None,
+    filter: Optional[Dict[str, Any]] = None,
+    fields: Optional[List[str]] = None,
+    if_changed_since: Optional[str] = None,
+    output: Literal["records", "table"] = "records",
+    human_readable: bool = False,
+    host: HostSelector = None,
+) -> Dict[str, Any]:
     """
     List all available disks in the system.
 
+    Args:
+        start: The index of the first disk to return.
+        limit: The maximum number of disks to return. Returns all
+            disks if not set.
+        sort: The field to sort by, e.g. `devicefile`. Prefix the field
+            with `-` to sort in descending order.
+        filter: Return only the disks whose fields match the given
+            values, e.g. `{"model": "Seagate"}`. Strings match case-insensitively
+            as substring, lists match if they contain the value.
+        fields: The fields to return for each disk, e.g.
+            `["devicefile", "model", "size"]`. Returns all fields if not set.
+        if_changed_since: The version of a previous result of the same
+            query. If nothing has changed since then, only `unchanged` is
+            returned, otherwise the `delta` of added, removed and modified
+            entries.
+        output: `records` returns the entries as they are, `table` returns
+            the column names once and a row of values per entry, which is
+            much more compact. Unless `fields` are given, the table contains
+            the most relevant columns only.
+        human_readable: Convert sizes in bytes into human-readable sizes
+            like `3.64 TiB` in `table` output mode.
+        host: The name of the host to query, a list of host names or `*`
+            to query all hosts concurrently. Defaults to the default host.
+
     Returns:
         A dictionary containing the list of all available disks.
     """
-    return rpc.request("DiskMgmt", "getList", {"start": 0, "limit": -1})
+    return await fleet.run(
+        host,
+        lambda rpc: query_list(
+            rpc,
+            "DiskMgmt",
+            "getList",
+            start,
+            limit,
+            sort,
+            filter,
+            fields,
+            if_changed_since=if_changed_since,
+            output=output,
+            columns=TABLE_COLUMNS["list_disks"],
+            human_readable=human_readable,
+        ),
+    )
 
 
 @server.tool(
     annotations={"openWorldHint": True}, tags=["system", "storage", "filesystem"]
 )
-def list_filesystems() -> Dict[str, Any]:
+async def list_filesystems(
+    start: int = 0,
+    limit: Optional[int] = None,
+    sort: Optional[str] = None,
+    filter: Optional[Dict[str, Any]] = None,
+    fields: Optional[List[str]] = None,
+    if_changed_since: Optional[str] = None,
+    output: Literal["records", "table"] = "records",
+    human_readable: bool = False,
+    host: HostSelector = None,
+) -> Dict[str, Any]:
     """
     List all available filesystems in the system.
 
+    Args:
+        start: The index of the first filesystem to return.
+        limit: The maximum number of filesystems to return. Returns all
+            filesystems if not set.
+        sort: The field to sort by, e.g. `-percentage`. Prefix the field
+            with `-` to sort in descending order.
+        filter: Return only the filesystems whose fields match the given
+            values, e.g. `{"type": "ext4"}`. Strings match case-insensitively
+            as substring, lists match if they contain the value.
+        fields: The fields to return for each filesystem, e.g.
+            `["devicefile", "mountpoint", "percentage"]`. Returns all fields if not set.
+        if_changed_since: The version of a previous result of the same
+            query. If nothing has changed since then, only `unchanged` is
+            returned, otherwise the `delta` of added, removed and modified
+            entries.
+        output: `records` returns the entries as they are, `table` returns
+            the column names once and a row of values per entry, which is
+            much more compact. Unless `fields` are given, the table contains
+            the most relevant columns only.
+        human_readable: Convert sizes in bytes into human-readable sizes
+            like `3.64 TiB` in `table` output mode.
+        host: The name of the host to query, a list of host names or `*`
+            to query all hosts concurrently. Defaults to the default host.
+
     Returns:
         A dictionary containing the list of all available filesystems.
     """
-    return rpc.request("FileSystemMgmt", "getList", {"start": 0, "limit": -1})
+    return await fleet.run(
+        host,
+        lambda rpc: query_list(
+            rpc,
+            "FileSystemMgmt",
+            "getList",
+            start,
+            limit,
+            sort,
+            filter,
+            fields,
+            if_changed_since=if_changed_since,
+            output=output,
+            columns=TABLE_COLUMNS["list_filesystems"],
+            human_readable=human_readable,
+        ),
+    )
 
 
 @server.tool(
     annotations={"openWorldHint": True}, tags=["system", "storage", "disk", "SMART"]
 )
-def list_smart() -> Dict[str, Any]:
+async def list_smart(
+    start: int = 0,
+    limit: Optional[int] = None,
+    sort: Optional[str] = None,
+    filter: Optional[Dict[str, Any]] = None,
+    fields: Optional[List[str]] = None,
+    if_changed_since: Optional[str] = None,
+    output: Literal["records", "table"] = "records",
+    human_readable: bool = False,
+    host: HostSelector = None,
+) -> Dict[str, Any]:
     """
     List the SMART information and status of all available disks in
     the system.
 
+    Args:
+        start: The index of the first disk to return.
+        limit: The maximum number of disks to return. Returns all
+            disks if not set.
+        sort: The field to sort by, e.g. `devicefile`. Prefix the field
+            with `-` to sort in descending order.
+        filter: Return only the disks whose fields match the given
+            values, e.g. `{"overallstatus": "BAD_STATUS"}`. Strings match case-insensitively
+            as substring, lists match if they contain the value.
+        fields: The fields to return for each disk, e.g.
+            `["devicefile", "model", "temperature"]`. Returns all fields if not set.
+        if_changed_since: The version of a previous result of the same
+            query. If nothing has changed since then, only `unchanged` is
+            returned, otherwise the `delta` of added, removed and modified
+            entries.
+        output: `records` returns the entries as they are, `table` returns
+            the column names once and a row of values per entry, which is
+            much more compact. Unless `fields` are given, the table contains
+            the most relevant columns only.
+        human_readable: Convert sizes in bytes into human-readable sizes
+            like `3.64 TiB` in `table` output mode.
+        host: The name of the host to query, a list of host names or `*`
+            to query all hosts concurrently. Defaults to the default host.
+
     Returns:
         A dictionary containing the list of all available disks and their
         SMART status and information.
     """
-    return rpc.request("Smart", "getList", {"start": 0, "limit": -1})
+    return await fleet.run(
+        host,
+        lambda rpc: query_list(
+            rpc,
+            "Smart",
+            "getList",
+            start,
+            limit,
+            sort,
+            filter,
+            fields,
+            if_changed_since=if_changed_since,
+            output=output,
+            columns=TABLE_COLUMNS["list_smart"],
+            human_readable=human_readable,
+        ),
+    )
 
 
 @server.tool(
     annotations={"openWorldHint": True}, tags=["system", "storage", "disk", "SMART"]
 )
-def get_smart_identity(device_file: str) -> Dict[str, Any]:
+async def get_smart_identity(
+    device_file: str, host: HostSelector = None
+) -> Dict[str, Any]:
     """
     Get the SMART information of the specified disk.
 
     Args:
         device_file: The device file of the disk.
+        host: The name of the host to query, a list of host names or `*`
+            to query all hosts concurrently. Defaults to the default host.
 
     Returns:
         A dictionary containing the SMART information.
     """
-    return rpc.request("Smart", "getInformation", {"devicefile": device_file})
+    return await fleet.run(
+        host,
+        lambda rpc: rpc.arequest(
+            "Smart", "getInformation", {"devicefile": device_file}
+        ),
+    )
+
+
+@server.tool(
+    annotations={"openWorldHint": True}, tags=["system", "storage", "disk", "SMART"]
+)
+async def get_smart_identities(
+    ctx: Context,
+    device_files: Union[List[str], str] = "all",
+    concurrency: Optional[int] = None,
+    host: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Get the SMART information of multiple disks at once. The disks are
+    queried concurrently, which is much faster than getting the SMART
+    information of each disk separately.
+
+    Args:
+        device_files: The list of device files of the disks, or `all`
+            to query all disks that support SMART.
+        concurrency: The maximum number of disks that are queried at
+            the same time.
+        host: The name of the host, defaults to the default host.
+
+    Returns:
+        A dictionary containing the number of succeeded and failed
+        queries and the SMART information or error of each disk.
+    """
+    rpc = fleet.get(host)
+    if isinstance(device_files, str):
+        if device_files == "all":
+            resp = await rpc.arequest("Smart", "getList", {"start": 0, "limit": -1})
+            device_files = [disk["devicefile"] for disk in resp.get("data", [])]
+        else:
+            device_files = [device_files]
+    if concurrency is None:
+        concurrency = config.get("smart.concurrency", 4)
+
+    async def on_done(done: int, device_file: str, result: Any) -> None:
+        await ctx.report_progress(
+            done, len(device_files), f"Queried SMART information of {device_file}"
+        )
+
+    results = await gather_limited(
+        device_files,
+        lambda device_file: rpc.arequest(
+            "Smart", "getInformation", {"devicefile": device_file}
+        ),
+        concurrency,
+        on_done,
+    )
+
+    devices = []
+    for device_file, result in zip(device_files, results):
+        if isinstance(result, Exception):
+            devices.append(
+                {"devicefile": device_file, "success": False, "error": str(result)}
+            )
+        else:
+            devices.append({"devicefile": device_file, "success": True, "data": result})
+    failed = sum(1 for device in devices if not device["success"])
+    return {
+        "total": len(devices),
+        "succeeded": len(devices) - failed,
+        "failed": failed,
+        "devices": devices,
+    }
+
+
+@server.tool(
+    annotations={"readOnlyHint": True}, tags=["system", "storage", "disk", "SMART"]
+)
+async def analyze_smart(
+    days: float = 30, threshold: float = 3.0, host: HostSelector = None
+) -> Dict[str, Any]:
+    """
+    Detect anomalies in the SMART attributes of all disks that are
+    recorded in the background: growing reallocated, pending or
+    uncorrectable sectors and CRC errors, pending or uncorrectable
+    sectors at all, and values that deviate from the disks of the same
+    model, e.g. a much higher temperature. Disks in standby are not
+    sampled to let them sleep, `standby` tells which disks were skipped
+    the last time.
+
+    Args:
+        days: The period to analyze.
+        threshold: The z-score above which a value deviates from the
+            peer disks.
+        host: The name of the host to query, a list of host names or `*`
+            to query all hosts concurrently. Defaults to the default host.
+
+    Returns:
+        A dictionary containing the latest values, the growth per day, the
+        z-scores and the anomalies of every disk, the disks with the most
+        anomalies first.
+    """
+
+    async def analyze(rpc) -> Dict[str, Any]:
+        history = smart_sampler.history(rpc)
+        data = history.analyze(days * 86400, threshold)
+        sampled = {item["devicefile"] for item in data}
+        return {
+            "total": len(data),
+            "anomalous": sum(1 for item in data if item["anomalies"]),
+            "data": data,
+            "not_sampled": sorted(set(history.devices) - sampled),
+            "interval": smart_sampler.interval if smart_sampler.running else None,
+        }
+
+    return await fleet.run(host, analyze)
+
+
+@server.tool(
+    annotations={"readOnlyHint": True}, tags=["system", "storage", "disk", "SMART"]
+)
+async def get_smart_history(
+    devicefile: str, days: float = 7, host: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Get the recorded SMART attributes of a disk over time, e.g. to see
+    when its reallocated sectors started to grow.
+
+    Args:
+        devicefile: The device file of the disk, e.g. `/dev/sda`.
+        days: The period to get.
+        host: The name of the host, defaults to the default host.
+
+    Returns:
+        A dictionary containing the column names and a row per sample.
+    """
+    return smart_sampler.history(fleet.get(host)).history(devicefile, days * 86400)
 
 
 @server.tool(
     annotations={"openWorldHint": True}, tags=["system", "user management", "user"]
 )
-def list_users() -> Dict[str, Any]:
+async def list_users(
+    start: int = 0,
+    limit: Optional[int] = None,
+    sort: Optional[str] = None,
+    filter: Optional[Dict[str, Any]] = None,
+    fields: Optional[List[str]] = None,
+    if_changed_since: Optional[str] = None,
+    output: Literal["records", "table"] = "records",
+    human_readable: bool = False,
+    host: HostSelector = None,
+) -> Dict[str, Any]:
     """
     List ist of user accounts of the system, including their names, UIDs,
     GIDs, comments, directories, shells, groups, and other details.
 
+    Args:
+        start: The index of the first user account to return.
+        limit: The maximum number of user accounts to return. Returns all
+            user accounts if not set.
+        sort: The field to sort by, e.g. `name`. Prefix the field
+            with `-` to sort in descending order.
+        filter: Return only the user accounts whose fields match the given
+            values, e.g. `{"groups": "users"}`. Strings match case-insensitively
+            as substring, lists match if they contain the value.
+        fields: The fields to return for each user account, e.g.
+            `["name", "uid", "email"]`. Returns all fields if not set.
+        if_changed_since: The version of a previous result of the same
+            query. If nothing has changed since then, only `unchanged` is
+            returned, otherwise the `delta` of added, removed and modified
+            entries.
+        output: `records` returns the entries as they are, `table` returns
+            the column names once and a row of values per entry, which is
+            much more compact. Unless `fields` are given, the table contains
+            the most relevant columns only.
+        human_readable: Convert sizes in bytes into human-readable sizes
+            like `3.64 TiB` in `table` output mode.
+        host: The name of the host to query, a list of host names or `*`
+            to query all hosts concurrently. Defaults to the default host.
+
     Returns:
         A dictionary containing the list of all user accounts.
     """
-    return rpc.request("UserMgmt", "getUserList", {"start": 0, "limit": -1})
+    return await fleet.run(
+        host,
+        lambda rpc: query_list(
+            rpc,
+            "UserMgmt",
+            "getUserList",
+            start,
+            limit,
+            sort,
+            filter,
+            fields,
+            if_changed_since=if_changed_since,
+            output=output,
+            columns=TABLE_COLUMNS["list_users"],
+            human_readable=human_readable,
+        ),
+    )
 
 
 @server.tool(
     annotations={"openWorldHint": True}, tags=["system", "user management", "user"]
 )
-def get_user(name: str) -> Dict[str, Any]:
+async def get_user(name: str, host: HostSelector = None) -> Dict[str, Any]:
     """
     Get detailed information about a user account of the system based on
     their name.
 
+    Args:
+        host: The name of the host to query, a list of host names or `*`
+            to query all hosts concurrently. Defaults to the default host.
+
     Returns:
         A dictionary containing the detailed user account information.
     """
-    return rpc.request("UserMgmt", "getUser", {"name": name})
+    return await fleet.run(
+        host, lambda rpc: rpc.arequest("UserMgmt", "getUser", {"name": name})
+    )
 
 
 @server.tool(
     annotations={"openWorldHint": True, "destructiveHint": True},
     tags=["system", "user management", "user"],
 )
-def delete_user(name: str) -> Dict[str, Any]:
+async def delete_user(name: str, host: Optional[str] = None) -> Dict[str, Any]:
     """
     Delete a user account of the system based on their name.
 
+    Args:
+        host: The name of the host, defaults to the default host.
+
     Returns:
         A dictionary containing the detailed account information of
         the deleted user to confirm the deletion.
     """
+    rpc = fleet.get(host)
     return {
         "success": True,
         "message": f"User {name} deleted successfully.",
-        "data": rpc.request("UserMgmt", "deleteUser", {"name": name}),
+        "data": await rpc.arequest("UserMgmt", "deleteUser", {"name": name}),
     }
 
 
 @server.tool(
     annotations={"openWorldHint": True}, tags=["system", "user management", "group"]
 )
-def list_groups() -> Dict[str, Any]:
+async def list_groups(
+    start: int = 0,
+    limit: Optional[int] = None,
+    sort: Optional[str] = None,
+    filter: Optional[Dict[str, Any]] = None,
+    fields: Optional[List[str]] = None,
+    if_changed_since: Optional[str] = None,
+    output: Literal["records", "table"] = "records",
+    human_readable: bool = False,
+    host: HostSelector = None,
+) -> Dict[str, Any]:
     """
     List all group accounts of the system.
 
+    Args:
+        start: The index of the first group account to return.
+        limit: The maximum number of group accounts to return. Returns all
+            group accounts if not set.
+        sort: The field to sort by, e.g. `name`. Prefix the field
+            with `-` to sort in descending order.
+        filter: Return only the group accounts whose fields match the given
+            values, e.g. `{"system": false}`. Strings match case-insensitively
+            as substring, lists match if they contain the value.
+        fields: The fields to return for each group account, e.g.
+            `["name", "gid", "members"]`. Returns all fields if not set.
+        if_changed_since: The version of a previous result of the same
+            query. If nothing has changed since then, only `unchanged` is
+            returned, otherwise the `delta` of added, removed and modified
+            entries.
+        output: `records` returns the entries as they are, `table` returns
+            the column names once and a row of values per entry, which is
+            much more compact. Unless `fields` are given, the table contains
+            the most relevant columns only.
+        human_readable: Convert sizes in bytes into human-readable sizes
+            like `3.64 TiB` in `table` output mode.
+        host: The name of the host to query, a list of host names or `*`
+            to query all hosts concurrently. Defaults to the default host.
+
     Returns:
         A dictionary containing the list of all group accounts of the system.
     """
-    return rpc.request("UserMgmt", "getGroupList", {"start": 0, "limit": -1})
+    return await fleet.run(
+        host,
+        lambda rpc: query_list(
+            rpc,
+            "UserMgmt",
+            "getGroupList",
+            start,
+            limit,
+            sort,
+            filter,
+            fields,
+            if_changed_since=if_changed_since,
+            output=output,
+            columns=TABLE_COLUMNS["list_groups"],
+            human_readable=human_readable,
+        ),
+    )
 
 
 @server.tool(
     annotations={"openWorldHint": True}, tags=["system", "user management", "group"]
 )
-def get_group(name: str) -> Dict[str, Any]:
+async def get_group(name: str, host: HostSelector = None) -> Dict[str, Any]:
     """
     Get detailed information about a group account of the system based on
     their name.
 
+    Args:
+        host: The name of the host to query, a list of host names or `*`
+            to query all hosts concurrently. Defaults to the default host.
+
     Returns:
         A dictionary containing the detailed group account information.
     """
-    return rpc.request("UserMgmt", "getGroup", {"name": name})
+    return await fleet.run(
+        host, lambda rpc: rpc.arequest("UserMgmt", "getGroup", {"name": name})
+    )
 
 
 @server.tool(
     annotations={"openWorldHint": True}, tags=["system", "user management", "group"]
 )
-def create_group(
+async def create_group(
     name: str,
     gid: Optional[int] = None,
     members: Optional[List[str]] = None,
     comment: Optional[str] = None,
+    host: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     Create a new group account. The name is required, other parameters like
@@ -222,11 +779,13 @@ def create_group(
         gid: The group ID.
         members: The list of members to be added to the group.
         comment: The comment for the group.
+        host: The name of the host, defaults to the default host.
 
     Returns:
         A dictionary containing the detailed account information of
         the created group.
     """
+    rpc = fleet.get(host)
     params: Dict[str, Any] = {
         "name": name,
         "members": [],
@@ -243,7 +802,7 @@ def create_group(
     return {
         "success": True,
         "message": f"Group {name} created successfully.",
-        "data": rpc.request("UserMgmt", "setGroup", params),
+        "data": await rpc.arequest("UserMgmt", "setGroup", params),
     }
 
 
@@ -251,10 +810,11 @@ def create_group(
     annotations={"openWorldHint": True, "destructiveHint": True},
     tags=["system", "user management", "group"],
 )
-def update_group(
+async def update_group(
     name: str,
     members: Optional[List[str]] = None,
     comment: Optional[str] = None,
+    host: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     Update an existing group account. The name is required, other parameters like the
@@ -264,20 +824,34 @@ def update_group(
         name: The name of the group.
         members: The list of members of the group.
         comment: The comment for the group.
+        host: The name of the host, defaults to the default host.
 
     Returns:
         A dictionary containing the detailed account information of
         the updated group.
     """
-
+    rpc = fleet.get(host)
     try:
-        group: Dict[str, Any] = rpc.request("UserMgmt", "getGroup", {"name": name})
+        # The group is written back as a whole, so it must not be taken
+        # from the cache, that would undo changes made in the meantime.
+        group: Dict[str, Any] = await rpc.arequest(
+            "UserMgmt", "getGroup", {"name": name}, use_cache=False
+        )
+    except (
+        deadlines.DeadlineExceeded,
+        scheduler.OverloadedError,
+        scheduler.CircuitOpenError,
+    ):
+        # The group might exist, the RPC was not sent or aborted.
+        raise
     except Exception:
         return {
             "success": False,
             "message": f"Group {name} does not exist.",
         }
 
+    # The response might be shared with the RPC cache, so don't modify it.
+    group = dict(group)
     if isinstance(members, list) and len(members) > 0:
         group["members"] = members
     if isinstance(comment, str) and len(comment) > 0:
@@ -286,7 +860,7 @@ def update_group(
     return {
         "success": True,
         "message": f"Group {name} updated successfully.",
-        "data": rpc.request("UserMgmt", "setGroup", group),
+        "data": await rpc.arequest("UserMgmt", "setGroup", group),
     }
 
 
@@ -294,32 +868,672 @@ def update_group(
     annotations={"openWorldHint": True, "destructiveHint": True},
     tags=["system", "user management", "group"],
 )
-def delete_group(name: str) -> Dict[str, Any]:
+async def delete_group(name: str, host: Optional[str] = None) -> Dict[str, Any]:
     """
     Delete a group account of the system based on their name.
 
+    Args:
+        host: The name of the host, defaults to the default host.
+
     Returns:
         A dictionary containing the detailed account information of
         the deleted group to confirm the deletion.
     """
+    rpc = fleet.get(host)
     return {
         "success": True,
         "message": f"Group {name} deleted successfully.",
-        "data": rpc.request("UserMgmt", "deleteGroup", {"name": name}),
+        "data": await rpc.arequest("UserMgmt", "deleteGroup", {"name": name}),
+    }
+
+
+async def _run_bulk(
+    ctx: Context,
+    items: List[Dict[str, Any]],
+    errors: List[Optional[str]],
+    apply: Callable[[Dict[str, Any]], Awaitable[Any]],
+    dry_run: bool,
+    concurrency: Optional[int],
+) -> Dict[str, Any]:
+    """
+    Apply the valid items with bounded concurrency and build the
+    per-item report. Items with a validation error are not applied.
+    In dry-run mode nothing is applied at all.
+    """
+    if concurrency is None:
+        concurrency = config.get("bulk.concurrency", 4)
+    valid = [i for i, error in enumerate(errors) if error is None]
+
+    async def on_done(done: int, index: int, result: Any) -> None:
+        await ctx.report_progress(
+            done, len(valid), f"Processed {items[index].get('name')}"
+        )
+
+    results: List[Any] = [None] * len(items)
+    if not dry_run:
+        # The RPCs of a bulk operation give way to interactive ones.
+        with scheduler.priority("bulk"):
+            applied = await gather_limited(
+                valid, lambda index: apply(items[index]), concurrency, on_done
+            )
+        for index, result in zip(valid, applied):
+            results[index] = result
+
+    report = []
+    for index, (item, error, result) in enumerate(zip(items, errors, results)):
+        entry: Dict[str, Any] = {
+            "index": index,
+            **{key: item[key] for key in ("action", "name") if key in item},
+        }
+        if error is None and isinstance(result, Exception):
+            error = str(result)
+        if error is not None:
+            entry |= {"success": False, "error": error}
+        else:
+            entry |= {"success": True}
+            if not dry_run:
+                entry["data"] = result
+        report.append(entry)
+    failed = sum(1 for entry in report if not entry["success"])
+    return {
+        "dry_run": dry_run,
+        "total": len(report),
+        "succeeded": len(report) - failed,
+        "failed": failed,
+        "results": report,
     }
 
 
+def _duplicates(names: List[Any]) -> Set[str]:
+    counts = Counter(name for name in names if isinstance(name, str))
+    return {name for name, count in counts.items() if count > 1}
+
+
+@server.tool(
+    annotations={"openWorldHint": True, "destructiveHint": True},
+    tags=["system", "user management", "group"],
+)
+async def bulk_groups(
+    ctx: Context,
+    operations: List[Dict[str, Any]],
+    dry_run: bool = False,
+    concurrency: Optional[int] = None,
+    host: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Create, update and delete many group accounts at once. All operations
+    are validated against a single snapshot of the existing groups first,
+    then the valid ones are applied concurrently. This is much faster
+    than calling `create_group`, `update_group` or `delete_group` for
+    each group.
+
+    Args:
+        operations: The list of operations. Each operation is a dictionary
+            with the `action` (`create`, `update` or `delete`) and the
+            `name` of the group. `create` and `update` accept the optional
+            `members` and `comment`, `create` also accepts the `gid`, e.g.
+            `[{"action": "create", "name": "devs", "members": ["alice"]}]`.
+            Like `update_group`, `update` keeps the current members if
+            `members` is missing or empty. Each group may only occur once.
+        dry_run: Only validate the operations without applying them.
+        concurrency: The maximum number of operations that are applied
+            at the same time.
+        host: The name of the host, defaults to the default host.
+
+    Returns:
+        A dictionary containing the number of succeeded and failed
+        operations and the result or error of each operation.
+    """
+    rpc = fleet.get(host)
+    resp = await rpc.arequest(
+        "UserMgmt", "getGroupList", {"start": 0, "limit": -1}, use_cache=False
+    )
+    groups = {group["name"]: group for group in resp.get("data", [])}
+    gids = {group.get("gid") for group in groups.values()}
+
+    users = None
+    if any(op.get("members") for op in operations if isinstance(op, dict)):
+        resp = await rpc.arequest(
+            "UserMgmt",
+            "getUserList",
+            {"start": 0, "limit": -1},
+            transform=lambda user: {"name": user.get("name")},
+        )
+        users = {user["name"] for user in resp.get("data", [])}
+
+    items = [op if isinstance(op, dict) else {} for op in operations]
+    duplicates = _duplicates([item.get("name") for item in items])
+
+    def validate(item: Dict[str, Any]) -> Optional[str]:
+        action, name = item.get("action"), item.get("name")
+        members, comment, gid = (
+            item.get("members"),
+            item.get("comment"),
+            item.get("gid"),
+        )
+        if action not in ("create", "update", "delete"):
+            return f"Unknown action {action!r}, use create, update or delete."
+        if not isinstance(name, str) or not name:
+            return "The group name is missing."
+        if name in duplicates:
+            return f"Group {name} occurs more than once."
+        if action == "create" and name in groups:
+            return f"Group {name} already exists."
+        if action != "create" and name not in groups:
+            return f"Group {name} does not exist."
+        if action == "create" and gid is not None:
+            if not isinstance(gid, int) or isinstance(gid, bool):
+                return "The GID must be an integer."
+            if gid in gids:
+                return f"The GID {gid} is already used."
+        if members is not None:
+            if action == "delete":
+                return "Members can not be set when deleting a group."
+            if not isinstance(members, list) or not all(
+                isinstance(member, str) for member in members
+            ):
+                return "The members must be a list of user names."
+            unknown = [member for member in members if member not in users]
+            if unknown:
+                return f"Unknown users: {', '.join(unknown)}."
+        if comment is not None and not isinstance(comment, str):
+            return "The comment must be a string."
+        return None
+
+    async def apply(item: Dict[str, Any]) -> Any:
+        name = item["name"]
+        if item["action"] == "delete":
+            return await rpc.arequest("UserMgmt", "deleteGroup", {"name": name})
+        if item["action"] == "create":
+            params: Dict[str, Any] = {"name": name, "members": [], "comment": ""}
+            if item.get("gid") is not None:
+                params["gid"] = item["gid"]
+        else:
+            # The snapshot is shared with the RPC cache, so don't modify it.
+            params = dict(groups[name])
+        # An empty list keeps the members, like in `update_group`.
+        if item.get("members"):
+            params["members"] = item["members"]
+        if item.get("comment") is not None:
+            params["comment"] = item["comment"]
+        return await rpc.arequest("UserMgmt", "setGroup", params)
+
+    return await _run_bulk(
+        ctx, items, [validate(item) for item in items], apply, dry_run, concurrency
+    )
+
+
+@server.tool(
+    annotations={"openWorldHint": True, "destructiveHint": True},
+    tags=["system", "user management", "user"],
+)
+async def bulk_delete_users(
+    ctx: Context,
+    names: List[str],
+    dry_run: bool = False,
+    concurrency: Optional[int] = None,
+    host: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Delete many user accounts at once. All names are validated against
+    a single snapshot of the existing users first, then the users are
+    deleted concurrently.
+
+    Args:
+        names: The names of the users to delete.
+        dry_run: Only validate the names without deleting the users.
+        concurrency: The maximum number of users that are deleted at
+            the same time.
+        host: The name of the host, defaults to the default host.
+
+    Returns:
+        A dictionary containing the number of succeeded and failed
+        deletions and the result or error of each user.
+    """
+    rpc = fleet.get(host)
+    resp = await rpc.arequest(
+        "UserMgmt",
+        "getUserList",
+        {"start": 0, "limit": -1},
+        transform=lambda user: {"name": user.get("name")},
+    )
+    users = {user["name"] for user in resp.get("data", [])}
+    items = [{"name": name} for name in names]
+    duplicates = _duplicates(names)
+
+    def validate(name: Any) -> Optional[str]:
+        if not isinstance(name, str) or not name:
+            return "The user name is missing."
+        if name in duplicates:
+            return f"User {name} occurs more than once."
+        if name not in users:
+            return f"User {name} does not exist."
+        return None
+
+    return await _run_bulk(
+        ctx,
+        items,
+        [validate(name) for name in names],
+        lambda item: rpc.arequest("UserMgmt", "deleteUser", {"name": item["name"]}),
+        dry_run,
+        concurrency,
+    )
+
+
 @server.tool(
     annotations={"openWorldHint": True}, tags=["system", "storage", "shared folder"]
 )
-def list_shared_folders() -> Dict[str, Any]:
+async def list_shared_folders(
+    start: int = 0,
+    limit: Optional[int] = None,
+    sort: Optional[str] = None,
+    filter: Optional[Dict[str, Any]] = None,
+    fields: Optional[List[str]] = None,
+    if_changed_since: Optional[str] = None,
+    output: Literal["records", "table"] = "records",
+    human_readable: bool = False,
+    host: HostSelector = None,
+) -> Dict[str, Any]:
     """
     List all configured shared folders.
 
+    Args:
+        start: The index of the first shared folder to return.
+        limit: The maximum number of shared folders to return. Returns all
+            shared folders if not set.
+        sort: The field to sort by, e.g. `name`. Prefix the field
+            with `-` to sort in descending order.
+        filter: Return only the shared folders whose fields match the given
+            values, e.g. `{"name": "media"}`. Strings match case-insensitively
+            as substring, lists match if they contain the value.
+        fields: The fields to return for each shared folder, e.g.
+            `["name", "reldirpath", "mntentref"]`. Returns all fields if not set.
+        if_changed_since: The version of a previous result of the same
+            query. If nothing has changed since then, only `unchanged` is
+            returned, otherwise the `delta` of added, removed and modified
+            entries.
+        output: `records` returns the entries as they are, `table` returns
+            the column names once and a row of values per entry, which is
+            much more compact. Unless `fields` are given, the table contains
+            the most relevant columns only.
+        human_readable: Convert sizes in bytes into human-readable sizes
+            like `3.64 TiB` in `table` output mode.
+        host: The name of the host to query, a list of host names or `*`
+            to query all hosts concurrently. Defaults to the default host.
+
     Returns:
         A dictionary containing the list of all shared folders.
     """
-    return rpc.request("ShareMgmt", "getList", {"start": 0, "limit": -1})
+    return await fleet.run(
+        host,
+        lambda rpc: query_list(
+            rpc,
+            "ShareMgmt",
+            "getList",
+            start,
+            limit,
+            sort,
+            filter,
+            fields,
+            if_changed_since=if_changed_since,
+            output=output,
+            columns=TABLE_COLUMNS["list_shared_folders"],
+            human_readable=human_readable,
+        ),
+    )
+
+
+@server.tool(
+    annotations={"openWorldHint": True}, tags=["system", "user management", "user"]
+)
+async def lookup_user(
+    name: Optional[str] = None,
+    uid: Optional[int] = None,
+    email: Optional[str] = None,
+    host: HostSelector = None,
+) -> Dict[str, Any]:
+    """
+    Look up user accounts by name, UID or email address. The answer
+    comes from an in-memory index and is much faster than listing the
+    users, `index` tells how old the index is. Values are compared
+    case-insensitively, all given values must match.
+
+    Args:
+        name: The name of the user.
+        uid: The UID of the user.
+        email: The email address of the user.
+        host: The name of the host to query, a list of host names or `*`
+            to query all hosts concurrently. Defaults to the default host.
+
+    Returns:
+        A dictionary containing the matching user accounts.
+    """
+    return await fleet.run(
+        host,
+        lambda rpc: indexes.lookup(
+            rpc, "users", {"name": name, "uid": uid, "email": email}
+        ),
+    )
+
+
+@server.tool(
+    annotations={"openWorldHint": True}, tags=["system", "user management", "group"]
+)
+async def lookup_group(
+    name: Optional[str] = None, gid: Optional[int] = None, host: HostSelector = None
+) -> Dict[str, Any]:
+    """
+    Look up groups by name or GID. The answer comes from an in-memory
+    index and is much faster than listing the groups, `index` tells
+    how old the index is.
+
+    Args:
+        name: The name of the group.
+        gid: The GID of the group.
+        host: The name of the host to query, a list of host names or `*`
+            to query all hosts concurrently. Defaults to the default host.
+
+    Returns:
+        A dictionary containing the matching groups.
+    """
+    return await fleet.run(
+        host, lambda rpc: indexes.lookup(rpc, "groups", {"name": name, "gid": gid})
+    )
+
+
+@server.tool(
+    annotations={"openWorldHint": True},
+    tags=["system", "storage", "disk", "HDD", "SSD", "NVMe"],
+)
+async def lookup_disk(
+    devicefile: Optional[str] = None,
+    serialnumber: Optional[str] = None,
+    wwn: Optional[str] = None,
+    model: Optional[str] = None,
+    host: HostSelector = None,
+) -> Dict[str, Any]:
+    """
+    Look up disks by device file, serial number, WWN or model. The
+    answer comes from an in-memory index and is much faster than
+    listing the disks, `index` tells how old the index is. The SMART
+    summary of a disk, e.g. its overall status and temperature, is
+    included as `smart` if the disk is monitored.
+
+    Args:
+        devicefile: The device file of the disk, e.g. `/dev/sda`.
+        serialnumber: The serial number of the disk.
+        wwn: The World Wide Name of the disk.
+        model: The model of the disk, this may match several disks.
+        host: The name of the host to query, a list of host names or `*`
+            to query all hosts concurrently. Defaults to the default host.
+
+    Returns:
+        A dictionary containing the matching disks.
+    """
+
+    async def lookup(rpc) -> Dict[str, Any]:
+        result = await indexes.lookup(
+            rpc,
+            "disks",
+            {
+                "devicefile": devicefile,
+                "serialnumber": serialnumber,
+                "wwn": wwn,
+                "model": model,
+            },
+        )
+        smart = await indexes.get(rpc, "smart")
+        data = []
+        for disk in result["data"]:
+            devices = smart.lookup("devicefile", disk.get("devicefile"))
+            data.append(disk | {"smart": devices[0]} if devices else disk)
+        return result | {"data": data}
+
+    return await fleet.run(host, lookup)
+
+
+@server.tool(
+    annotations={"openWorldHint": True}, tags=["system", "storage", "filesystem"]
+)
+async def lookup_filesystem(
+    uuid: Optional[str] = None,
+    label: Optional[str] = None,
+    mountpoint: Optional[str] = None,
+    devicefile: Optional[str] = None,
+    host: HostSelector = None,
+) -> Dict[str, Any]:
+    """
+    Look up filesystems by UUID, label, mount point or device file. The
+    answer comes from an in-memory index and is much faster than
+    listing the filesystems, `index` tells how old the index is.
+
+    Args:
+        uuid: The UUID of the filesystem.
+        label: The label of the filesystem.
+        mountpoint: The mount point, e.g. `/srv/dev-disk-by-uuid-...`.
+        devicefile: The device file of the filesystem or its parent
+            device, e.g. `/dev/sda1` or `/dev/sda`.
+        host: The name of the host to query, a list of host names or `*`
+            to query all hosts concurrently. Defaults to the default host.
+
+    Returns:
+        A dictionary containing the matching filesystems.
+    """
+
+    async def lookup(rpc) -> Dict[str, Any]:
+        fields = {"uuid": uuid, "label": label, "mountpoint": mountpoint}
+        if devicefile is None:
+            return await indexes.lookup(rpc, "filesystems", fields)
+        # The device file may be the one of the partition or the disk.
+        result = await indexes.lookup(
+            rpc, "filesystems", fields | {"devicefile": devicefile}
+        )
+        if result["total"] == 0:
+            result = await indexes.lookup(
+                rpc, "filesystems", fields | {"parentdevicefile": devicefile}
+            )
+        return result
+
+    return await fleet.run(host, lookup)
+
+
+@server.tool(
+    annotations={"openWorldHint": True}, tags=["system", "storage", "shared folder"]
+)
+async def lookup_shared_folder(
+    name: Optional[str] = None,
+    uuid: Optional[str] = None,
+    mntentref: Optional[str] = None,
+    host: HostSelector = None,
+) -> Dict[str, Any]:
+    """
+    Look up shared folders by name, UUID or the UUID of the filesystem
+    mount they are located on. The answer comes from an in-memory index
+    and is much faster than listing the shared folders, `index` tells
+    how old the index is.
+
+    Args:
+        name: The name of the shared folder.
+        uuid: The UUID of the shared folder.
+        mntentref: The UUID of the mount point configuration of the
+            filesystem, this may match several shared folders.
+        host: The name of the host to query, a list of host names or `*`
+            to query all hosts concurrently. Defaults to the default host.
+
+    Returns:
+        A dictionary containing the matching shared folders.
+    """
+    return await fleet.run(
+        host,
+        lambda rpc: indexes.lookup(
+            rpc, "shares", {"name": name, "uuid": uuid, "mntentref": mntentref}
+        ),
+    )
+
+
+@server.tool(annotations={"openWorldHint": True}, tags=["system", "search"])
+async def search(
+    query: str,
+    types: Optional[
+        List[Literal["users", "groups", "disks", "smart", "filesystems", "shares"]]
+    ] = None,
+    limit: int = 10,
+    host: HostSelector = None,
+) -> Dict[str, Any]:
+    """
+    Search users, groups, disks, SMART devices, filesystems and shared
+    folders at once, e.g. "which share lives on the failing Seagate
+    disk". Terms match by prefix and tolerate typos. Words like `user`,
+    `disk`, `filesystem` or `share` restrict the hits to that type,
+    then related entities are found too, e.g. the shared folders on
+    a disk whose SMART status is bad, `via` tells the entity that
+    matched. Use the lookup and list tools to get the full records.
+
+    Args:
+        query: The search terms.
+        types: Restrict the hits to these entity types, this overrides
+            the types named in the query.
+        limit: The maximum number of hits.
+        host: The name of the host to query, a list of host names or `*`
+            to query all hosts concurrently. Defaults to the default host.
+
+    Returns:
+        A dictionary containing the ranked hits with the type, key and
+        title of the entities, and the entity types that could not be
+        searched as `failed`.
+    """
+    return await fleet.run(host, lambda rpc: search_entities(rpc, query, types, limit))
+
+
+async def _follow_job(
+    ctx: Context, id: str, since: int, wait: float
+) -> Optional[Dict[str, Any]]:
+    """
+    Wait for a job and stream its new output to the client as progress
+    notifications, the progress is the offset of the next output.
+    """
+
+    async def on_output(view: Dict[str, Any]) -> None:
+        await ctx.report_progress(view["next"], None, view["output"])
+
+    return await jobs.wait(id, since, deadlines.clamp(max(wait, 0)), on_output)
+
+
+@server.tool(
+    annotations={"openWorldHint": True, "destructiveHint": True},
+    tags=["system", "jobs"],
+)
+async def start_job(
+    ctx: Context,
+    operation: Literal["apt_update", "apt_upgrade", "create_filesystem"],
+    params: Optional[Dict[str, Any]] = None,
+    wait: float = 0,
+    host: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Start a long-running operation as a background job, e.g. updating
+    the package index or creating a filesystem. The job keeps running after
+    the call returned, use `get_job` to follow its output and state.
+
+    Args:
+        operation: The operation, `apt_update` (update the package
+            index), `apt_upgrade` (install package updates) or
+            `create_filesystem`.
+        params: The parameters of the operation. `apt_upgrade` requires
+            the `packages` to upgrade. `create_filesystem` requires the
+            `devicefile` and the filesystem `type`, e.g. `ext4`, and
+            accepts a `label`.
+        wait: The number of seconds to wait for the job to finish, its
+            output is streamed as progress notifications meanwhile.
+        host: The name of the host, defaults to the default host.
+
+    Returns:
+        A dictionary containing the ID and state of the job and the
+        output received so far.
+    """
+    rpc = fleet.get(host)
+    try:
+        job = await jobs.start(rpc, operation, params or {})
+    except ValueError as e:
+        return {"success": False, "message": str(e)}
+    return {
+        "success": True,
+        "message": f"Job {job.id} started.",
+        "data": await _follow_job(ctx, job.id, 0, wait),
+    }
+
+
+@server.tool(annotations={"readOnlyHint": True}, tags=["system", "jobs"])
+async def get_job(
+    ctx: Context, id: str, since: int = 0, wait: float = 0
+) -> Dict[str, Any]:
+    """
+    Get the state and output of a background job. The output can be
+    read incrementally: pass the `next` offset of the previous call as
+    `since` to get only the new output. Only the tail of the output is
+    kept, `truncated` tells whether older output is gone.
+
+    Args:
+        id: The ID of the job.
+        since: The offset of the output to start at.
+        wait: The number of seconds to wait for the job to finish, new
+            output is streamed as progress notifications meanwhile.
+
+    Returns:
+        A dictionary containing the state of the job, the error of a
+        failed job and the output since the given offset.
+    """
+    result = await _follow_job(ctx, id, since, wait)
+    if result is None:
+        return {"success": False, "message": f"Job {id} does not exist."}
+    return {"success": True, "data": result}
+
+
+@server.tool(annotations={"readOnlyHint": True}, tags=["system", "jobs"])
+async def list_jobs(
+    state: Optional[Literal["running", "succeeded", "failed", "cancelled"]] = None,
+) -> Dict[str, Any]:
+    """
+    List the background jobs that are running or finished recently.
+
+    Args:
+        state: Only list the jobs in this state.
+
+    Returns:
+        A dictionary containing the jobs without their output, `size`
+        is the number of output characters.
+    """
+    records = [
+        {key: value for key, value in record.items() if key != "output"}
+        for record in await jobs.records()
+        if state is None or record["state"] == state
+    ]
+    return {"total": len(records), "data": records}
+
+
+@server.tool(
+    annotations={"openWorldHint": True, "destructiveHint": True},
+    tags=["system", "jobs"],
+)
+async def cancel_job(id: str) -> Dict[str, Any]:
+    """
+    Stop the background process of a running job.
+
+    Args:
+        id: The ID of the job.
+
+    Returns:
+        A dictionary telling whether the job was cancelled.
+    """
+    record = await jobs.cancel(id)
+    if record is None:
+        return {"success": False, "message": f"Job {id} does not exist."}
+    if record["state"] != "running":
+        return {
+            "success": False,
+            "message": f"Job {id} is not running anymore, its state is {record['state']}.",
+        }
+    return {"success": True, "message": f"Job {id} is being cancelled."}
 
 
 # @server.tool(annotations={"openWorldHint": True}, tags=["system", "storage", "shared folder"])
@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of openmediavault.
+#
+# @license   https://www.gnu.org/licenses/gpl.html GPL Version 3
+# @author    Volker Theile <volker.theile@openmediavault.org>
+# @copyright Copyright (c) 2025 Volker Theile
+#
+# openmediavault is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# openmediavault is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with openmediavault. If not, see <https://www.gnu.org/licenses/>.
+import asyncio
+import atexit
+import cProfile
+import io
+import json
+import logging
+import logging.handlers
+import os
+import pstats
+import queue
+import random
+import re
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional
+
+from fastmcp.server.middleware import CallNext, Middleware, MiddlewareContext
+
+from config import config
+
+logger = logging.getLogger("trace")
+
+_current: ContextVar[Optional["Span"]] = ContextVar("span", default=None)
+
+
+class Redactor:
+    """
+    Mask the values of sensitive keys in nested data. The pattern of the
+    sensitive keys is compiled once and the decision is remembered per
+    key, so redacting is a lookup per key.
+    """
+
+    MASK = "*****"
+
+    def __init__(self, keys: Iterable[str]):
+        self._pattern = re.compile(
+            "|".join(re.escape(key) for key in keys), re.IGNORECASE
+        )
+        self._decisions: Dict[str, bool] = {}
+
+    def is_sensitive(self, key: str) -> bool:
+        decision = self._decisions.get(key)
+        if decision is None:
+            decision = self._pattern.fullmatch(str(key)) is not None
+            if len(self._decisions) < 4096:
+                self._decisions[key] = decision
+        return decision
+
+    def __call__(self, data: Any) -> Any:
+        if isinstance(data, dict):
+            return {
+                key: self.MASK if self.is_sensitive(key) else self(value)
+                for key, value in data.items()
+            }
+        if isinstance(data, (list, tuple)):
+            return [self(value) for value in data]
+        return data
+
+
+redact = Redactor(
+    config.get("tracing.redact", ["password", "pwd", "passwd", "secret", "token"])
+)
+
+# The fraction of the traces whose events are logged at the INFO level.
+# The events of slow calls are always logged.
+SAMPLE_RATE = float(config.get("tracing.sample_rate", 1.0))
+
+
+class Span:
+    """
+    A unit of work, e.g. an MCP tool call or an RPC. Spans that are
+    opened while another span is active become its children, all
+    spans of a tool invocation share the trace ID of its root span.
+    """
+
+    __slots__ = (
+        "name",
+        "span_id",
+        "parent_id",
+        "trace_id",
+        "attrs",
+        "start",
+        "duration",
+        "error",
+        "slow",
+        "sampled",
+    )
+
+    def __init__(self, name: str, parent: Optional["Span"], attrs: Dict[str, Any]):
+        self.name = name
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else self.span_id
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+        self.slow = False
+        # Whether the INFO events of the trace are logged, it is decided
+        # once per trace.
+        self.sampled = (
+            parent.sampled
+            if parent
+            else SAMPLE_RATE >= 1 or random.random() < SAMPLE_RATE
+        )
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+
+class TraceEvent:
+    """
+    The message of a trace log record. It is only formatted, and the
+    attributes are only redacted, if a handler actually emits it.
+    """
+
+    __slots__ = ("span",)
+
+    def __init__(self, span: Span):
+        self.span = span
+
+    def __str__(self) -> str:
+        span = self.span
+        event = {
+            "span": span.name,
+            "trace_id": span.trace_id,
+            "span_id": span.span_id,
+            "parent_id": span.parent_id,
+            "duration_ms": round((span.duration or 0) * 1000, 3),
+            "status": "error" if span.error else "ok",
+            **redact(span.attrs),
+        }
+        if span.error:
+            event["error"] = span.error
+        if span.slow:
+            event["slow"] = True
+        return json.dumps(event, default=str)
+
+
+def current() -> Optional[Span]:
+    """
+    Get the active span of the current context.
+    """
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Span]:
+    """
+    Open a span that ends when the block is left. A trace event is
+    logged at the end of the span if the `trace` logger is enabled and
+    the trace is sampled, or if the span is slow.
+
+    Args:
+        name: The name of the span, e.g. `rpc` or `tool`.
+        attrs: The attributes of the span. They are redacted when the
+            event is formatted.
+
+    Returns:
+        The span, attributes can be added while it is active.
+    """
+    s = Span(name, _current.get(), attrs)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        s.duration = time.perf_counter() - s.start
+        level = logging.WARNING if s.slow else logging.INFO
+        if (s.slow or s.sampled) and logger.isEnabledFor(level):
+            logger.log(level, TraceEvent(s))
+
+
+def _await_stack(task: asyncio.Task) -> List[str]:
+    # `Task.get_stack()` only returns the outermost frame of a suspended
+    # coroutine, so follow the chain of awaited coroutines instead.
+    lines = []
+    coro = task.get_coro()
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is not None:
+            lines.append(
+                f"{frame.f_code.co_filename}:{frame.f_lineno} in {frame.f_code.co_name}"
+            )
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return lines
+
+
+class SlowCallProfiler:
+    """
+    Capture where the time goes for calls that exceed a threshold. When
+    a call is still running after the threshold, a snapshot of its
+    await stack is attached to its span. A sampled fraction of the calls
+    is additionally run under cProfile, the profile is only kept if the
+    call turns out to be slow. cProfile profiles the whole thread, so the
+    profile also contains the other tasks of the event loop that ran
+    while the call was active.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.0,
+        sample_rate: float = 0.0,
+        top: int = 25,
+        directory: Optional[str] = None,
+    ):
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.top = top
+        self.directory = directory
+        # cProfile can not be nested, so only one call is profiled at
+        # a time.
+        self._profiling = False
+
+    @asynccontextmanager
+    async def watch(self, s: Span) -> AsyncIterator[None]:
+        if self.threshold <= 0:
+            yield
+            return
+
+        task = asyncio.current_task()
+        timer = asyncio.get_running_loop().call_later(
+            self.threshold, self._snapshot, s, task
+        )
+        profiler = None
+        if (
+            not self._profiling
+            and self.sample_rate > 0
+            and random.random() < self.sample_rate
+        ):
+            self._profiling = True
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            yield
+        finally:
+            timer.cancel()
+            if profiler is not None:
+                profiler.disable()
+                self._profiling = False
+                if time.perf_counter() - s.start >= self.threshold:
+                    self._dump(s, profiler)
+
+    @staticmethod
+    def _snapshot(s: Span, task: Optional[asyncio.Task]) -> None:
+        s.slow = True
+        if task is not None and not task.done():
+            s.set(stack=_await_stack(task))
+
+    def _dump(self, s: Span, profiler: cProfile.Profile) -> None:
+        s.slow = True
+        out = io.StringIO()
+        stats = pstats.Stats(profiler, stream=out)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+        s.set(profile=out.getvalue())
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            stats.dump_stats(os.path.join(self.directory, f"{s.trace_id}.prof"))
+
+
+profiler = SlowCallProfiler(
+    threshold=config.get("tracing.slow_threshold", 5.0),
+    sample_rate=config.get("tracing.profile.sample_rate", 0.0),
+    top=config.get("tracing.profile.top", 25),
+    directory=config.get("tracing.profile.directory"),
+)
+
+
+class TracingMiddleware(Middleware):
+    """
+    Open the root span of every MCP tool call and resource read, the
+    RPCs that are executed on their behalf become its children.
+    """
+
+    async def on_call_tool(self, context: MiddlewareContext, call_next: CallNext):
+        with span("tool", tool=context.message.name) as s:
+            async with profiler.watch(s):
+                return await call_next(context)
+
+    async def on_read_resource(self, context: MiddlewareContext, call_next: CallNext):
+        with span("resource", uri=str(context.message.uri)) as s:
+            async with profiler.watch(s):
+                return await call_next(context)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    # The records are consumed by a thread of this process, so they do
+    # not need to be formatted and pickled beforehand. This keeps the
+    # formatting of the messages off the event loop.
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging(level: int = logging.INFO, fmt: Optional[str] = None) -> None:
+    """
+    Configure the root logger to hand the log records over to a
+    background thread via a queue, so that logging never blocks the
+    event loop on I/O.
+
+    Args:
+        level: The level of the root logger.
+        fmt: The format of the log messages.
+    """
+    handler = logging.StreamHandler()
+    handler.setFormatter(
+        logging.Formatter(fmt or "%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    )
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        log_queue, handler, respect_handler_level=True
+    )
+    root = logging.getLogger()
+    root.handlers = [_QueueHandler(log_queue)]
+    root.setLevel(level)
+    logger.setLevel(config.get("tracing.level", "WARNING"))
+    listener.start()
+    atexit.register(listener.stop)
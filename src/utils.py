@@ -18,7 +18,13 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with openmediavault. If not, see <https://www.gnu.org/licenses/>.
+import asyncio
+import hashlib
+import importlib.util
 import random
+import sys
+from types import ModuleType
+from typing import Any, Awaitable, Callable, Iterable, List, Optional
 
 
 def obfuscate(data: dict, sensitive_keys: list):
@@ -36,3 +42,67 @@ def obfuscate(data: dict, sensitive_keys: list):
             else:
                 result[key] = value
     return result
+
+
+def lazy_import(name: str) -> Optional[ModuleType]:
+    """
+    Import an optional module on its first use, so that heavy modules
+    like `numpy` do not slow down the startup.
+
+    Returns:
+        The module, or `None` if it is not installed.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        return None
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+async def gather_limited(
+    items: Iterable[Any],
+    fn: Callable[[Any], Awaitable[Any]],
+    concurrency: int,
+    on_done: Optional[Callable[[int, Any, Any], Awaitable[None]]] = None,
+) -> List[Any]:
+    """
+    Call `fn` for every item with at most `concurrency` calls running
+    at the same time. Exceptions are returned in place of the result.
+    The optional `on_done` callback is awaited with the number of the
+    finished calls, the item and its result after each call.
+    """
+    semaphore = asyncio.Semaphore(max(int(concurrency), 1))
+    done = 0
+
+    async def run(item: Any) -> Any:
+        nonlocal done
+        async with semaphore:
+            try:
+                result = await fn(item)
+            except Exception as e:
+                result = e
+        done += 1
+        if on_done is not None:
+            await on_done(done, item, result)
+        return result
+
+    return await asyncio.gather(*(run(item) for item in items))
+
+
+def content_hash(data: Any) -> str:
+    """
+    Get a stable hash of JSON serializable data. The hash does not
+    depend on the order of the keys of dictionaries.
+    """
+    # Imported here, `fastjson` depends on the configuration which in
+    # turn depends on this module.
+    import fastjson
+
+    return hashlib.blake2b(
+        fastjson.dumps(data, sort_keys=True), digest_size=16
+    ).hexdigest()
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of openmediavault.
+#
+# @license   https://www.gnu.org/licenses/gpl.html GPL Version 3
+# @author    Volker Theile <volker.theile@openmediavault.org>
+# @copyright Copyright (c) 2025 Volker Theile
+#
+# openmediavault is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# any later version.
+#
+# openmediavault is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with openmediavault. If not, see <https://www.gnu.org/licenses/>.
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import config
+from utils import content_hash
+
+# The fields that identify a record, in order of preference.
+KEY_FIELDS = ("uuid", "name", "devicefile", "canonicaldevicefile")
+
+
+def record_key(record: Any) -> str:
+    if isinstance(record, dict):
+        for field in KEY_FIELDS:
+            if record.get(field) not in (None, ""):
+                return str(record[field])
+    return content_hash(record)
+
+
+def diff(old: List[Any], new: List[Any]) -> Dict[str, Any]:
+    """
+    Compare two lists of records by their keys, see `record_key`.
+
+    Returns:
+        A dictionary with the added and modified records and the keys
+        of the removed records.
+    """
+    old_records = {record_key(record): record for record in old}
+    new_records = {record_key(record): record for record in new}
+    return {
+        "added": [
+            record for key, record in new_records.items() if key not in old_records
+        ],
+        "removed": [key for key in old_records if key not in new_records],
+        "modified": [
+            record
+            for key, record in new_records.items()
+            if key in old_records and record != old_records[key]
+        ],
+    }
+
+
+class VersionStore:
+    """
+    Remember the records of the most recently returned list versions,
+    so that later requests can be answered with a delta.
+    """
+
+    def __init__(self, maxsize: int = 64):
+        self._maxsize = maxsize
+        # The hash of the query and the records per version.
+        self._versions: OrderedDict[str, Tuple[str, List[Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, version: str, scope: str = "") -> Optional[List[Any]]:
+        """
+        Get the records of a version, `None` if it is unknown or belongs
+        to another query.
+        """
+        with self._lock:
+            entry = self._versions.get(version)
+            if entry is None or entry[0] != scope:
+                return None
+            self._versions.move_to_end(version)
+            return entry[1]
+
+    def put(self, version: str, records: List[Any], scope: str = "") -> None:
+        with self._lock:
+            self._versions[version] = (scope, records)
+            self._versions.move_to_end(version)
+            while len(self._versions) > self._maxsize:
+                self._versions.popitem(last=False)
+
+    def apply(
+        self,
+        result: Dict[str, Any],
+        if_changed_since: Optional[str] = None,
+        query: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Attach the content version to a list result. If the client
+        already knows the version `if_changed_since`, only report that
+        nothing has changed, or the delta between both versions if that
+        version is still known.
+
+        The version covers the query the result belongs to, e.g. the
+        host, the RPC and its parameters, so that a version of another
+        host or list is never taken as the base of a delta.
+        """
+        records = result.get("data") or []
+        scope = content_hash(query)
+        version = content_hash({"scope": scope, "result": result})
+        self.put(version, records, scope)
+        if if_changed_since is None:
+            return result | {"version": version}
+        if if_changed_since == version:
+            return {"version": version, "unchanged": True, "total": result["total"]}
+        old = self.get(if_changed_since, scope)
+        if old is None:
+            return result | {"version": version}
+        return {
+            "version": version,
+            "unchanged": False,
+            "total": result["total"],
+            "delta": diff(old, records),
+        }
+
+
+versions = VersionStore(int(config.get("versions.maxsize", 64)))